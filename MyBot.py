@@ -1,53 +1,84 @@
 import hlt
 import logging
 import time
+import tracer
+import replay
 
 from pathfinder import Pathfinder
 from info import Info
 from angularai import AI
+from precompute import IdleWorker
+from scheduler import TurnScheduler
 
 
 class HaliteBot:
-    def __init__(self):
+    def __init__(self, idle_precompute=False, transport=None, record_to=None, collision_processes=0):
         bot_name = "Swarming"
-        self.game = hlt.Game(bot_name)
+        if record_to is not None:
+            transport = replay.RecordingTransport(transport or hlt.networking.Transport(), replay.Recorder(record_to))
+        self.game = hlt.Game(bot_name, transport)
         logging.info("Starting bot {}".format(bot_name))
 
-        self.pathfinder = Pathfinder()
+        self.pathfinder = Pathfinder(processes=collision_processes)
+        # The engine is still waiting for our name, so the route graph doesn't cost the first turn anything
+        self.pathfinder.planet_graph(self.game.map)
         self.info = Info()
         self.ai = AI(self.info, self.pathfinder)
+        self.scheduler = TurnScheduler()
 
         self.game_map = None
 
-    def run(self, debug=False, setup_debug=False):
-        while True:
-            logging.info('---TURN {}---'.format(self.info.turn+1))
+        # Work done while the engine simulates the turn, see precompute.py
+        self.idle_worker = IdleWorker() if idle_precompute else None
 
-            if not debug:
-                self.ai.pre_update_actions()
-                self.game_map = self.game.update_map()
-                if setup_debug:
-                    import pickle
-                    pickle.dump(self, open("objects/game_map-{}.p".format(self.info.turn+1), "wb"))
-
-            self.ai.post_update_actions(self.game_map)
-            self.start_turn_timer()
-            self.info.update_info(self.game_map)
-            self.ai.update_actions()
-            self.pathfinder.resolve_collisions(self.game_map)
-            self.log_all_commands()
-
-            self.log_turn_time_info()
+    def run(self):
+        try:
+            while True:
+                self.play_turn()
+        except Exception:
+            logging.exception('Bot crashed')
+            tracer.flush(wait=True)
+            raise
+
+    def play_turn(self):
+        logging.info('---TURN {}---'.format(self.info.turn+1))
+
+        self.ai.pre_update_actions()
+        self.game_map = self.game.update_map()
+        self.collect_idle_work()
+
+        self.scheduler.start()
+        self.ai.post_update_actions(self.game_map)
+        self.start_turn_timer()
+        self.info.update_info(self.game_map)
+        self.ai.update_actions(self.scheduler)
+        self.pathfinder.resolve_collisions(self.game_map, self.scheduler)
+        self.log_all_commands()
+
+        self.log_turn_time_info()
 
     def log_all_commands(self):
         command_queue = []
         for ship in self.game_map.get_me().all_ships():
             command = ship.get_event()
-            if command and command is not None:
-                command_queue += command
+            if command:
+                command_queue.append(command)
         logging.info(command_queue)
         self.game.send_command_queue(command_queue)
 
+        if self.idle_worker is not None:
+            deferred = self.pathfinder.deferred_flow_fields()
+            if deferred is not None:
+                self.idle_worker.submit('flow_fields', *deferred)
+            self.idle_worker.start()
+
+    def collect_idle_work(self):
+        if self.idle_worker is None:
+            return
+        results = self.idle_worker.collect()
+        if 'flow_fields' in results:
+            self.pathfinder.add_flow_fields(results['flow_fields'], self.game_map)
+
     def start_turn_timer(self):
         self.total0 = time.time()
 
@@ -67,27 +98,24 @@ class HaliteBot:
         if self.info.turn > 10:
             if total_turn_time > self.longest_turn:
                 self.longest_turn = total_turn_time
+        tracer.end_turn(total_turn_time)
         logging.info('Total turn time: {}'.format(total_turn_time))
         logging.info('Longest turn time: {}'.format(self.longest_turn))
+        if self.scheduler.skipped:
+            logging.info('Skipped phases: {}'.format(self.scheduler.skipped))
 
 if __name__ == "__main__":
-    setup_debug = False
-    debug = False
+    setup_debug = False     # Record the game to replay_file
+    debug = False           # Replay replay_file up to turn
+    idle_precompute = False
+    collision_processes = 0     # Processes to resolve large groups of colliding ships in, 0 for none
+    replay_file = 'Swarming.replay'
     turn = 116
 
-    if setup_debug and not debug:
-        import shutil
-        import os
-        try:
-            shutil.rmtree('/Users/skippy/Programming/halite2/objects')
-        except:
-            pass
-        os.mkdir('objects')
-
     if not debug:
-        bot = HaliteBot()
-        bot.run(debug=debug, setup_debug=setup_debug)
+        bot = HaliteBot(idle_precompute=idle_precompute, record_to=replay_file if setup_debug else None,
+                        collision_processes=collision_processes)
+        bot.run()
     else:
-        import pickle
-        game_map = pickle.load(open("objects/game_map-{}.p".format(turn), "rb"))
-        game_map.run(True)
+        bot, mismatched_turns = replay.replay(
+            replay_file, lambda transport: HaliteBot(idle_precompute=idle_precompute, transport=transport), turn)
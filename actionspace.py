@@ -0,0 +1,118 @@
+"""
+Every thrust the engine accepts, checked at once.
+
+The engine only takes integer magnitudes and integer angles, so a ship has 7 * 360 moving thrusts plus standing
+still. Their velocities are tabulated when the module is loaded. ThrustEvaluator tests all of them against the
+planets, the map edges and the moves already given to our other ships in one NumPy pass, instead of trying
+angles one at a time through the collision map.
+"""
+import math
+
+import numpy as np
+
+import hlt
+
+
+def _thrust_table():
+    """
+    :return: The magnitude, angle, vel_x and vel_y of every thrust, fastest first and standing still last. The
+        velocities are worked out the same way Ship.thrust does, so they are the values a chosen thrust gives
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    thrusts = [(magnitude, angle) for magnitude in range(hlt.constants.MAX_SPEED, 0, -1) for angle in range(360)]
+    thrusts.append((0, 0))
+    magnitudes, angles = zip(*thrusts)
+    vel_x = [magnitude * math.cos(math.radians(angle)) for magnitude, angle in thrusts]
+    vel_y = [magnitude * math.sin(math.radians(angle)) for magnitude, angle in thrusts]
+    return np.array(magnitudes), np.array(angles), np.array(vel_x), np.array(vel_y)
+
+
+#: Magnitude, angle and velocity of every thrust the engine accepts, row by row
+THRUST_MAGNITUDES, THRUST_ANGLES, THRUST_VEL_X, THRUST_VEL_Y = _thrust_table()
+
+
+class ThrustEvaluator:
+    """
+    Picks the collision-free thrust for a ship that ends nearest to where it wants to be.
+
+    A thrust collides with an entity when the centres come within the sum of the radii at some point in the
+    turn, the same test the collision map makes. Our other ships are taken to move as they are thrusting now,
+    enemy ships and planets to stay put (the collision map ignores enemy ships altogether, so they are left out).
+    """
+
+    def __init__(self, game_map):
+        """
+        :param hlt.game_map.Map game_map: The map of this turn
+        """
+        self.game_map = game_map
+        self.max_ship_radius = max(game_map.snapshot.ship_radius.max(initial=0.0), hlt.constants.SHIP_RADIUS)
+
+    def obstacles(self, ship):
+        """
+        :param hlt.entity.Ship ship: The ship to be thrust
+        :return: x, y, vel_x, vel_y and the collision distance of every entity the ship could hit this turn,
+            apart from any it is already touching
+        :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        game_map = self.game_map
+        reach = 2 * hlt.constants.MAX_SPEED + ship.radius + self.max_ship_radius
+        ships, _ = game_map.neighbours.within(ship.x, ship.y, reach, kind=hlt.entity.Ship,
+                                              owners=[game_map.get_me().id], exclude=ship)
+        planets = [planet for planet in game_map.planets_near(ship, hlt.constants.MAX_SPEED + ship.radius)
+                   if planet.health > 0]
+
+        x = np.array([other.x for other in ships] + [planet.x for planet in planets])
+        y = np.array([other.y for other in ships] + [planet.y for planet in planets])
+        vel_x = np.array([other.vel_x for other in ships] + [0.0] * len(planets))
+        vel_y = np.array([other.vel_y for other in ships] + [0.0] * len(planets))
+        collision_distance = np.array([ship.radius + other.radius for other in ships] +
+                                      [ship.radius + planet.radius for planet in planets])
+
+        # Entities already touching the ship can't be helped by any thrust, so they don't rule any out, and
+        # entities further than a full speed thrust plus their own movement can't be reached
+        gap = np.sqrt((x - ship.x) ** 2 + (y - ship.y) ** 2) - collision_distance
+        keep = (gap > 0) & (gap <= hlt.constants.MAX_SPEED + np.sqrt(vel_x ** 2 + vel_y ** 2))
+        return x[keep], y[keep], vel_x[keep], vel_y[keep], collision_distance[keep]
+
+    def safe_thrusts(self, ship):
+        """
+        :param hlt.entity.Ship ship: The ship to be thrust
+        :return: Whether each thrust of the table is free of collisions and keeps the ship on the map
+        :rtype: numpy.ndarray
+        """
+        final_x = ship.x + THRUST_VEL_X
+        final_y = ship.y + THRUST_VEL_Y
+        safe = (final_x >= 0) & (final_y >= 0) & (final_x < self.game_map.width) & (final_y < self.game_map.height)
+
+        x, y, vel_x, vel_y, collision_distance = self.obstacles(ship)
+        if len(x):
+            # The squared distance between the centres is a t^2 + 2 b t + c over the turn (t in [0, 1]), one
+            # thrust per row and one obstacle per column. c > 0 since touching obstacles were left out, so there
+            # is a collision only if they close in (b < 0) and the minimum, at t = -b / a or at the end of the
+            # turn, is within the collision distance
+            dx = ship.x - x
+            dy = ship.y - y
+            dvx = THRUST_VEL_X[:, None] - vel_x
+            dvy = THRUST_VEL_Y[:, None] - vel_y
+            a = dvx * dvx + dvy * dvy
+            b = dx * dvx + dy * dvy
+            c = dx * dx + dy * dy - collision_distance * collision_distance
+            hit = (b < 0) & np.where(a + b <= 0, a + 2 * b + c <= 0, b * b >= a * c)
+            safe &= ~hit.any(axis=1)
+        return safe
+
+    def best_thrust(self, ship, goal_x, goal_y):
+        """
+        :param hlt.entity.Ship ship: The ship to be thrust
+        :param float goal_x: x-coordinate of where the ship wants to end the turn
+        :param float goal_y: y-coordinate of where the ship wants to end the turn
+        :return: The (magnitude, angle) of the safe thrust ending nearest the goal, faster thrusts first on a
+            tie. None if every thrust collides, including standing still
+        :rtype: (int, int)
+        """
+        safe = self.safe_thrusts(ship)
+        if not safe.any():
+            return None
+        miss = (ship.x + THRUST_VEL_X - goal_x) ** 2 + (ship.y + THRUST_VEL_Y - goal_y) ** 2
+        best = int(np.argmin(np.where(safe, miss, np.inf)))
+        return int(THRUST_MAGNITUDES[best]), int(THRUST_ANGLES[best])
@@ -1,11 +1,14 @@
 import math
-import logging
 import hlt
+import tracer
 
 from squadron import Squadron
+from scheduler import unlimited
 
 SAFE_DISTANCE = 100
 
+trace = tracer.get_tracer('ai')
+
 class AI:
     def __init__(self, info, pathfinder):
         self.info = info
@@ -40,10 +43,13 @@ class AI:
         self.defend_against = []
         self.ship_commands = []
 
-        self.mark_squadrons_as_assigned()
         self.update_squadrons_positions()
 
-    def update_actions(self):
+    def update_actions(self, scheduler=None):
+        # The rush and docked ships are always handled, the rest is skipped in order if the turn runs long
+        scheduler = scheduler or unlimited()
+        self.planet_to_attack = None
+
         self.priorities_planets()
         self.check_for_rush()
         self.rush()
@@ -51,13 +57,13 @@ class AI:
             if self.check_for_losing():
                 return
             self.assign_existing_to_dock()
-            self.assign_existing_defenders()
-            self.assign_new_defenders()
-            self.assign_existing_miners()
-            self.assign_new_miners()
+            scheduler.run('assign_existing_defenders', self.assign_existing_defenders)
+            scheduler.run('assign_new_defenders', self.assign_new_defenders)
+            scheduler.run('assign_existing_miners', self.assign_existing_miners)
+            scheduler.run('assign_new_miners', self.assign_new_miners)
             if self.determine_attack_numbers():
-                self.assign_existing_attackers()
-                self.assign_new_attackers()
+                scheduler.run('assign_existing_attackers', self.assign_existing_attackers)
+                scheduler.run('assign_new_attackers', self.assign_new_attackers)
 
     def priorities_planets(self):
         DOCK_COUNT_MULTI = 0.7
@@ -145,17 +151,17 @@ class AI:
         # If one of the planets is owned by the enemy, determine the strength of attack
 
     def assign_existing_to_dock(self):
-        logging.info('Ships that are currently docked continue to be docked')
+        trace.info('Ships that are currently docked continue to be docked')
         for ship in self.game_map.get_me().all_ships():
             if ship.docking_status != ship.DockingStatus.UNDOCKED:
                 self.current_actions['s{}'.format(ship.id)] = ['docked']
 
-                logging.info('Ship {}: Remaining Docked'.format(ship.id))
+                trace.info('Ship {}: Remaining Docked', ship.id)
 
     def assign_existing_defenders(self):
         # Defend planet
         # If the ship was defending before, tell it to keep defending
-        logging.info('Ships that were defending before continue to defend')
+        trace.info('Ships that were defending before continue to defend')
         self.defend_against = []
         for ship in self.game_map.get_me().all_ships():
             if self.previous_action(ship.id) == 'defending' and not ship.in_squadron:
@@ -167,12 +173,10 @@ class AI:
 
                     self.set_attack(ship, enemy_ship)
 
-                    logging.info('Ship {}: Continuing to Defend Against Enemy Ship id: {} '.format(
-                        ship.id,
-                        enemy_ship.id))
+                    trace.info('Ship {}: Continuing to Defend Against Enemy Ship id: {} ', ship.id, enemy_ship.id)
 
     def assign_new_defenders(self):
-        logging.info('Ships that are required to defend, closest defend')
+        trace.info('Ships that are required to defend, closest defend')
         for planet in self.info.our_planets:
             for ship in planet.all_docked_ships():
                 for ship_data in self.info.all_ship_data:
@@ -196,14 +200,13 @@ class AI:
 
                                         self.set_attack(our_ship, ship_data['closest_enemy_ships'][i])
 
-                                        logging.info('Ship {}: Defending Against Enemy Ship id: {} '.format(
-                                            our_ship.id,
-                                            ship_data['closest_enemy_ships'][i].id))
+                                        trace.info('Ship {}: Defending Against Enemy Ship id: {} ',
+                                                   our_ship.id, ship_data['closest_enemy_ships'][i].id)
 
     def assign_existing_miners(self):
         # Mine existing planet
         # If the ship was mining before, tell it to keep mining
-        logging.info('Ships that were mining before continue to mine')
+        trace.info('Ships that were mining before continue to mine')
         for ship in self.game_map.get_me().all_ships():
             if not self.current_action(ship.id):
                 if self.previous_action(ship.id) == 'mining':
@@ -214,14 +217,12 @@ class AI:
                         continue
 
                     if planet.num_docking_spots > (self.get_inbound_miners(planet.id) + len(planet.all_docked_ships())):
-                        logging.info('Ship {}: Continuing to Mine Planet id: {} '.format(
-                            ship.id,
-                            planet.id))
+                        trace.info('Ship {}: Continuing to Mine Planet id: {} ', ship.id, planet.id)
 
                         self.set_mine(ship, planet)
 
     def assign_new_miners(self):
-        logging.info('Heading to priority planets')
+        trace.info('Heading to priority planets')
         self.planet_to_attack = None
 
         for planet_data in self.strategic_planets:
@@ -248,9 +249,7 @@ class AI:
                 if ship is None:
                     break
 
-                logging.info('Ship {}: Heading to Priority Planet id: {} '.format(
-                    ship.id,
-                    planet.id))
+                trace.info('Ship {}: Heading to Priority Planet id: {} ', ship.id, planet.id)
 
                 self.set_mine(ship, planet)
 
@@ -327,12 +326,10 @@ class AI:
                         self.attacked_ships.append(enemy_ship.id)
                         self.set_attack(our_ship, enemy_ship, attack=True, distance=our_ship.calculate_distance_between(enemy_ship)-1)
 
-                        logging.info('Ship {}: Continuing to attack Enemy Ship id: {} '.format(
-                            our_ship.id,
-                            enemy_ship.id))
+                        trace.info('Ship {}: Continuing to attack Enemy Ship id: {} ', our_ship.id, enemy_ship.id)
 
     def assign_new_attackers(self):
-        logging.info('Attack ships closest to target planet')
+        trace.info('Attack ships closest to target planet')
         level_1 = self.planet_to_attack_data['enemies_within_50'] * self.within_50 + self.within_50_additional
         level_2 = self.planet_to_attack_data['enemies_within_100'] * self.within_100 + self.within_100_additional + level_1
         level_3 = self.planet_to_attack_data['enemies_within_150'] * self.within_150 + self.within_150_additional + level_2
@@ -344,7 +341,7 @@ class AI:
         additionals_added = 0
         for i, enemy_ship in enumerate(self.planet_to_attack_data['closest_enemy_ships']):
             if unallocated_ships_index >= len(unallocated_ships):
-                logging.info('All Ships Allocated')
+                trace.info('All Ships Allocated')
                 break
 
             if i < level_1:
@@ -360,7 +357,7 @@ class AI:
                 enemy_multi = self.within_200
                 additional = self.within_200_additional
             else:
-                logging.info('It should not get here....')
+                trace.info('It should not get here....')
                 break
 
 
@@ -379,9 +376,8 @@ class AI:
 
                 self.set_attack(unallocated_ships[unallocated_ships_index], enemy_ship, attack=True, distance=unallocated_ships[unallocated_ships_index].calculate_distance_between(enemy_ship)-1)
 
-                logging.info('Ship {}: Attacking Ship id: {} '.format(
-                    unallocated_ships[unallocated_ships_index].id,
-                    enemy_ship.id))
+                trace.info('Ship {}: Attacking Ship id: {} ',
+                           unallocated_ships[unallocated_ships_index].id, enemy_ship.id)
                 unallocated_ships_index += 1
 
     def num_unalocated_ships(self):
@@ -475,16 +471,13 @@ class AI:
                             if ship_data['closest_enemy_ships'][i] not in self.defend_against:
                                 self.set_attack(our_ship, ship_data['closest_enemy_ships'][i])
 
-                                logging.info('Ship {}: Stopped Mining Defending Against Enemy Ship id: {} '.format(
-                                    our_ship.id,
-                                    ship_data['closest_enemy_ships'][i].id))
+                                trace.info('Ship {}: Stopped Mining Defending Against Enemy Ship id: {} ',
+                                           our_ship.id, ship_data['closest_enemy_ships'][i].id)
                                 return
 
 
 
-            logging.info('Ship {}: Starting to mine planet id: {} '.format(
-                our_ship.id,
-                planet.id))
+            trace.info('Ship {}: Starting to mine planet id: {} ', our_ship.id, planet.id)
 
             self.started_to_mine = True
             self.current_actions['s{}'.format(our_ship.id)] = ['mining', planet.id]
@@ -508,19 +501,13 @@ class AI:
                 return
 
     def get_closest_friendly_to_enemy_ship(self, ship_id):
-        ship_distances = []
-        for ship_data in self.info.all_ship_data:
-            if 's{}'.format(ship_data['ship_id']) not in self.current_actions:
-                for i, enemy_ship in enumerate(ship_data['closest_enemy_ships']):
-                    if ship_id == enemy_ship.id:
-                        ship_distances.append(ship_data['closest_enemy_ships_distances'][i])
-            else:
-                ship_distances.append(10000)
-
-        if min(ship_distances) == 10000:
-            return None
-
-        return self.info.all_ship_data[ship_distances.index(min(ship_distances))]['ship_id']
+        enemy_ship = self.get_ship(ship_id, enemy=True)
+        team_ships, _ = self.game_map.neighbours.nearest(enemy_ship.x, enemy_ship.y, kind=hlt.entity.Ship,
+                                                         owners=[self.info.my_id])
+        for ship in team_ships:
+            if 's{}'.format(ship.id) not in self.current_actions:
+                return ship.id
+        return None
 
     def is_enemy_mining(self):
         for enemy in self.game_map.all_players():
@@ -554,6 +541,7 @@ class AI:
                 minning_planet = self.game_map.get_planet(planet_data['planet_id'])
                 break
 
+        neighbours = self.game_map.neighbours
         distance_to_mining_planet = []
         distance_to_enemy_ships = []
         can_we_dock = False
@@ -563,19 +551,14 @@ class AI:
             if ship.can_dock(minning_planet):
                 can_we_dock = True
 
-            for enemy in self.game_map.all_players():
-                if enemy != self.game_map.get_me():
-                    for enemy_ship in enemy.all_ships():
-                        distance_to_enemy_ships.append(enemy_ship.calculate_distance_between(ship))
+            _, distances = neighbours.nearest(ship.x, ship.y, 1, hlt.entity.Ship, self.info.enemy_ids)
+            distance_to_enemy_ships += distances
 
         closest_distance_to_enemy_ships = min(distance_to_enemy_ships)
         closest_distance_to_mining_planet = min(distance_to_mining_planet)
 
-        enemy_distance_to_mining_planets = []
-        for enemy in self.game_map.all_players():
-            if enemy != self.game_map.get_me():
-                for enemy_ship in enemy.all_ships():
-                    enemy_distance_to_mining_planets.append(enemy_ship.calculate_distance_between(minning_planet))
+        _, enemy_distance_to_mining_planets = neighbours.nearest(minning_planet.x, minning_planet.y, 1,
+                                                                 hlt.entity.Ship, self.info.enemy_ids)
 
         closest_enemy_to_mining_planet = min(enemy_distance_to_mining_planets)
 
@@ -595,14 +578,14 @@ class AI:
             if self.enemy_mining:
                 enemy_started_mining_this_turn = True
 
-        logging.info('closest_enemy_to_mining_planet: {}'.format(closest_enemy_to_mining_planet))
-        logging.info('closest_distance_to_enemy_ships: {}'.format(closest_distance_to_enemy_ships))
-        logging.info('closest_distance_to_mining_planet: {}'.format(closest_distance_to_mining_planet))
-        logging.info('number_of_players: {}'.format(number_of_players))
-        logging.info('units_until_attack: {}'.format(units_until_attack))
-        logging.info('enemy_mining: {}'.format(self.enemy_mining))
-        logging.info('enemy_started_mining_this_turn: {}'.format(enemy_started_mining_this_turn))
-        logging.info('can_we_dock: {}'.format(can_we_dock))
+        trace.info('closest_enemy_to_mining_planet: {}', closest_enemy_to_mining_planet)
+        trace.info('closest_distance_to_enemy_ships: {}', closest_distance_to_enemy_ships)
+        trace.info('closest_distance_to_mining_planet: {}', closest_distance_to_mining_planet)
+        trace.info('number_of_players: {}', number_of_players)
+        trace.info('units_until_attack: {}', units_until_attack)
+        trace.info('enemy_mining: {}', self.enemy_mining)
+        trace.info('enemy_started_mining_this_turn: {}', enemy_started_mining_this_turn)
+        trace.info('can_we_dock: {}', can_we_dock)
 
         if number_of_players > 2:
             self.rush_ended = True
@@ -627,7 +610,7 @@ class AI:
         elif self.rush_state not in ['advanced-rush', 'basic-rush']:
             self.rush_state = 'defensive-dock'
 
-        logging.info("Rush State: {}".format(self.rush_state))
+        trace.info("Rush State: {}", self.rush_state)
 
     def rush(self):
         if self.rush_ended:
@@ -650,7 +633,7 @@ class AI:
                 mining_ship = ship
                 self.ships_docked = self.info.turn
                 break
-        logging.info('mining_ship: {}'.format(mining_ship))
+        trace.info('mining_ship: {}', mining_ship.id if mining_ship is not None else None)
 
         if not self.ships_docked or self.info.turn < self.ships_docked + 3:
             self.assign_existing_to_dock()
@@ -659,7 +642,7 @@ class AI:
 
         if mining_ship is None and self.info.turn > 9:
             # all our miners are dead
-            logging.info('Changed to advanced-rush')
+            trace.info('Changed to advanced-rush')
             self.rush_state = 'advanced-rush'
 
         if mining_ship is not None and self.info.turn > 9:
@@ -699,17 +682,8 @@ class AI:
     def basic_rush(self):
         ship_data = self.info.all_enemy_ships[0]
         enemy_ship = self.get_ship(ship_data['ship_id'])
-        for my_ship in self.game_map.get_me().all_ships():
-            self.pathfinder.navigate(my_ship, enemy_ship, self.game_map)
-
-    def mark_squadrons_as_assigned(self):
-        all_ships = self.game_map.get_me().all_ships()
-        for i, squadron in enumerate(self.squadrons):
-            for ship in squadron.ships:
-                if ship in all_ships:
-                    self.current_actions['s{}'.format(self.game_map.get_me().all_ships()[ship])] = ['squadron', i]
-
-
+        my_ships = self.game_map.get_me().all_ships()
+        self.pathfinder.navigate_all(my_ships, [enemy_ship] * len(my_ships), self.game_map)
 
     def check_for_losing(self):
         number_of_players = len(self.game_map.all_players())
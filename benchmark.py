@@ -0,0 +1,361 @@
+"""
+Timing harness for the bot's hot paths.
+
+Frames are generated synthetically in the same format the Halite engine sends, so the
+benchmarks can be run without the engine binary:
+
+    python benchmark.py --players 4 --ships 1000
+
+The suite times each stage of a turn over a range of game sizes, and can save the results
+as a baseline to compare later runs against:
+
+    python benchmark.py --suite --save baseline.json
+    python benchmark.py --suite --compare baseline.json
+"""
+import argparse
+import functools
+import io
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+import hlt
+from angularai import AI
+from collisionmap import CollisionMap, SweepAndPrune
+from info import Info
+from pathfinder import Pathfinder
+
+
+#: (players, ships, map width, map height) of each suite scenario
+SUITE = [
+    (4, 12, 240, 160),
+    (2, 100, 240, 160),
+    (4, 100, 288, 192),
+    (2, 500, 312, 208),
+    (4, 500, 336, 224),
+    (4, 1000, 384, 256),
+    (4, 1500, 384, 256),
+]
+#: The stages of a turn timed by the suite, in the order they run
+STAGES = ('parse', 'update_info', 'update_actions', 'resolve_collisions')
+#: A stage is reported as a regression when its p50 is this much slower than the baseline
+REGRESSION_RATIO = 1.2
+
+
+def generate_frame(num_players=4, num_ships=1000, num_planets=28, width=384, height=256, seed=0,
+                   planet_seed=None):
+    """
+    Generate a synthetic engine frame.
+
+    :param int num_players: Number of players in the game
+    :param int num_ships: Total number of ships, split evenly between the players
+    :param int num_planets: Number of planets on the map
+    :param int width: Map width
+    :param int height: Map height
+    :param int seed: Random seed, the same seed always generates the same frame
+    :param int planet_seed: Separate seed for the planets, so frames of the same game keep the same planets
+    :return: The frame as the Halite engine would send it
+    :rtype: str
+    """
+    rng = random.Random(seed)
+    planet_rng = random.Random(planet_seed) if planet_seed is not None else rng
+
+    planets = []
+    for planet_id in range(num_planets):
+        for _ in range(100):
+            radius = planet_rng.uniform(3, 12)
+            x = planet_rng.uniform(radius + 10, width - radius - 10)
+            y = planet_rng.uniform(radius + 10, height - radius - 10)
+            if all(math.hypot(x - p[1], y - p[2]) > radius + p[3] + 10 for p in planets):
+                break
+        docking_spots = max(2, int(radius / 2))
+        owner = planet_rng.randrange(num_players) if planet_rng.random() < 0.5 else None
+        planets.append([planet_id, x, y, radius, docking_spots, owner, []])
+
+    ship_id = 0
+    player_tokens = [str(num_players)]
+    for player_id in range(num_players):
+        player_ships = num_ships // num_players + (1 if player_id < num_ships % num_players else 0)
+        owned_planets = [p for p in planets if p[5] == player_id]
+        player_tokens += [str(player_id), str(player_ships)]
+        for _ in range(player_ships):
+            planet = rng.choice(owned_planets) if owned_planets else None
+            if planet is not None and len(planet[6]) < planet[4] and rng.random() < 0.3:
+                angle = rng.uniform(0, 2 * math.pi)
+                x = planet[1] + (planet[3] + 1) * math.cos(angle)
+                y = planet[2] + (planet[3] + 1) * math.sin(angle)
+                docking_status, docked_planet = hlt.entity.Ship.DockingStatus.DOCKED.value, planet[0]
+                planet[6].append(ship_id)
+            else:
+                x = rng.uniform(1, width - 1)
+                y = rng.uniform(1, height - 1)
+                docking_status, docked_planet = hlt.entity.Ship.DockingStatus.UNDOCKED.value, 0
+            player_tokens += [str(ship_id), '{:.4f}'.format(x), '{:.4f}'.format(y), str(rng.randint(1, 255)),
+                              '0.0', '0.0', str(docking_status), str(docked_planet), '0', '0']
+            ship_id += 1
+
+    planet_tokens = [str(num_planets)]
+    for planet_id, x, y, radius, docking_spots, owner, docked in planets:
+        if owner is not None and not docked:
+            owner = None
+        planet_tokens += [str(planet_id), '{:.4f}'.format(x), '{:.4f}'.format(y), str(rng.randint(500, 2000)),
+                          '{:.4f}'.format(radius), str(docking_spots), '0', '1000',
+                          '1' if owner is not None else '0', str(owner or 0), str(len(docked))]
+        planet_tokens += [str(docked_ship) for docked_ship in docked]
+
+    return ' '.join(player_tokens + planet_tokens)
+
+
+def time_parse(frame, width=384, height=256, repeat=20):
+    """
+    Time Map._parse on a single frame.
+
+    :param str frame: The engine frame to parse
+    :param int width: Map width
+    :param int height: Map height
+    :param int repeat: Number of times to parse the frame
+    :return: Parse time of each repetition in seconds
+    :rtype: list[float]
+    """
+    timings = []
+    for _ in range(repeat):
+        game_map = hlt.game_map.Map(0, width, height)
+        start = time.perf_counter()
+        game_map._parse(frame)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_transport(frame, commands, width=384, height=256, repeat=20):
+    """
+    Time one turn of engine I/O through hlt.networking.Transport, using in-memory pipes in place of the engine.
+
+    :param str frame: The engine frame to read
+    :param list[str] commands: The commands to send back
+    :param int width: Map width
+    :param int height: Map height
+    :param int repeat: Number of turns to time
+    :return: Read, parse and send times of each turn in seconds
+    :rtype: list[(float, float, float)]
+    """
+    reader = io.BytesIO((frame + '\n').encode() * repeat)
+    writer = io.BytesIO()
+    transport = hlt.networking.Transport(reader, writer)
+
+    timings = []
+    for _ in range(repeat):
+        game_map = hlt.game_map.Map(0, width, height)
+        start = time.perf_counter()
+        line = transport.read_line()
+        read = time.perf_counter()
+        game_map._parse(line)
+        parse = time.perf_counter()
+        transport.send_line(commands)
+        send = time.perf_counter()
+        timings.append((read - start, parse - read, send - parse))
+    return timings
+
+
+def time_collision_map(frame, width=384, height=256, cell_sizes=(8, 16, 32, 64), repeat=10):
+    """
+    Time building a CollisionMap and testing every one of our ships against it, with each ship moving at full
+    speed, for several cell sizes and for the sweep and prune broadphase.
+
+    :param str frame: The engine frame to use
+    :param int width: Map width
+    :param int height: Map height
+    :param tuple[int] cell_sizes: The cell sizes to time
+    :param int repeat: Number of times to build and test each map
+    :return: (build, test) times in seconds of each repetition, keyed by the name of the broadphase
+    :rtype: dict[str, list[(float, float)]]
+    """
+    game_map = hlt.game_map.Map(0, width, height)
+    game_map._parse(frame)
+    ships = game_map.get_me().all_ships()
+    for i, ship in enumerate(ships):
+        ship.thrust(hlt.constants.MAX_SPEED, (i * 37) % 360, hlt.entity.Position(ship.x, ship.y))
+
+    broadphases = [('cell size {}'.format(cell_size), functools.partial(CollisionMap, cell_size=cell_size))
+                   for cell_size in cell_sizes]
+    broadphases.append(('sweep and prune', SweepAndPrune))
+
+    timings = {}
+    for name, make_broadphase in broadphases:
+        timings[name] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            collision_map = make_broadphase(game_map)
+            built = time.perf_counter()
+            for ship in ships:
+                collision_map.test(ship)
+            tested = time.perf_counter()
+            timings[name].append((built - start, tested - built))
+    return timings
+
+
+def time_stages(num_players, num_ships, width, height, turns=5, seed=0):
+    """
+    Play synthetic frames through a fresh Info, AI and Pathfinder, timing each stage of every turn.
+
+    :param int num_players: Number of players in the game
+    :param int num_ships: Total number of ships
+    :param int width: Map width
+    :param int height: Map height
+    :param int turns: Number of turns to play
+    :param int seed: Random seed of the first frame
+    :return: Times of each stage in seconds, keyed by stage name
+    :rtype: dict[str, list[float]]
+    """
+    pathfinder = Pathfinder()
+    info = Info()
+    ai = AI(info, pathfinder)
+    if num_ships > 3 * num_players:
+        # The frames are mid-game positions, the opening rush is only written for the three starting ships
+        ai.rush_ended = True
+    game_map = hlt.game_map.Map(0, width, height)
+
+    timings = {stage: [] for stage in STAGES}
+    for turn in range(turns):
+        frame = generate_frame(num_players, num_ships, width=width, height=height, seed=seed + turn,
+                               planet_seed=seed)
+        ai.pre_update_actions()
+
+        start = time.perf_counter()
+        game_map._parse(frame)
+        parsed = time.perf_counter()
+        if game_map.static_world is None:
+            game_map.static_world = hlt.world.StaticWorld.from_map(game_map)
+            game_map.planet_index = hlt.world.PlanetIndex(game_map.static_world)
+
+        ai.post_update_actions(game_map)
+        start_info = time.perf_counter()
+        info.update_info(game_map)
+        updated_info = time.perf_counter()
+        ai.update_actions()
+        updated_actions = time.perf_counter()
+        pathfinder.resolve_collisions(game_map)
+        resolved = time.perf_counter()
+
+        for ship in game_map.get_me().all_ships():
+            ship.get_event()
+
+        timings['parse'].append(parsed - start)
+        timings['update_info'].append(updated_info - start_info)
+        timings['update_actions'].append(updated_actions - updated_info)
+        timings['resolve_collisions'].append(resolved - updated_actions)
+    return timings
+
+
+def summarise(timings):
+    """
+    :param list[float] timings: Times in seconds
+    :return: The p50, p95 and max in milliseconds
+    :rtype: dict[str, float]
+    """
+    timings = np.asarray(timings) * 1000
+    return {'p50': float(np.percentile(timings, 50)),
+            'p95': float(np.percentile(timings, 95)),
+            'max': float(timings.max())}
+
+
+def scenario_name(num_players, num_ships, width, height):
+    return '{}p-{}s-{}x{}'.format(num_players, num_ships, width, height)
+
+
+def run_suite(turns=5, scenarios=SUITE):
+    """
+    :param int turns: Number of turns to play in each scenario
+    :param list[tuple] scenarios: (players, ships, width, height) of each scenario
+    :return: Summary of each stage, keyed by scenario name then stage
+    :rtype: dict[str, dict[str, dict[str, float]]]
+    """
+    results = {}
+    for scenario in scenarios:
+        timings = time_stages(*scenario, turns=turns)
+        results[scenario_name(*scenario)] = {stage: summarise(timings[stage]) for stage in STAGES}
+    return results
+
+
+def print_suite(results, baseline=None):
+    """
+    Print the suite results, with the change in p50 from the baseline if there is one.
+
+    :param dict results: Output of run_suite
+    :param dict baseline: Output of an earlier run_suite
+    :return: Names of the stages slower than the baseline by more than REGRESSION_RATIO
+    :rtype: list[str]
+    """
+    regressions = []
+    for name, stages in results.items():
+        print(name)
+        for stage, summary in stages.items():
+            line = '  {:<20} p50 {:>9.2f}ms  p95 {:>9.2f}ms  max {:>9.2f}ms'.format(
+                stage, summary['p50'], summary['p95'], summary['max'])
+            previous = (baseline or {}).get(name, {}).get(stage)
+            if previous is not None and previous['p50'] > 0:
+                ratio = summary['p50'] / previous['p50']
+                line += '  x{:.2f} vs baseline'.format(ratio)
+                if ratio > REGRESSION_RATIO:
+                    line += ' REGRESSION'
+                    regressions.append('{} {}'.format(name, stage))
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bot hot paths on synthetic frames')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--ships', type=int, default=1000)
+    parser.add_argument('--width', type=int, default=384)
+    parser.add_argument('--height', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--collision-map', action='store_true',
+                        help='Time the CollisionMap broadphase for several cell sizes and sweep and prune')
+    parser.add_argument('--suite', action='store_true', help='Time every stage of a turn over the SUITE scenarios')
+    parser.add_argument('--turns', type=int, default=5, help='Turns played in each suite scenario')
+    parser.add_argument('--max-ships', type=int, default=None, help='Leave out suite scenarios with more ships')
+    parser.add_argument('--save', help='Save the suite results to this file as a baseline')
+    parser.add_argument('--compare', help='Compare the suite results against this baseline file')
+    args = parser.parse_args()
+
+    if args.collision_map:
+        frame = generate_frame(args.players, args.ships, width=args.width, height=args.height)
+        for name, timings in time_collision_map(frame, args.width, args.height, repeat=args.repeat).items():
+            build, test = zip(*timings)
+            print('CollisionMap {:<15}: build mean {:.2f}ms test all ships mean {:.2f}ms'.format(
+                name, sum(build) / len(build) * 1000, sum(test) / len(test) * 1000))
+        return
+
+    if args.suite:
+        scenarios = [scenario for scenario in SUITE if args.max_ships is None or scenario[1] <= args.max_ships]
+        results = run_suite(args.turns, scenarios)
+        baseline = None
+        if args.compare:
+            with open(args.compare) as baseline_file:
+                baseline = json.load(baseline_file)
+        regressions = print_suite(results, baseline)
+        if args.save:
+            with open(args.save, 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+        if regressions:
+            print('Slower than the baseline: {}'.format(', '.join(regressions)))
+        return
+
+    frame = generate_frame(args.players, args.ships, width=args.width, height=args.height)
+    timings = time_parse(frame, args.width, args.height, args.repeat)
+    print('Map._parse {} players {} ships: min {:.2f}ms mean {:.2f}ms'.format(
+        args.players, args.ships, min(timings) * 1000, sum(timings) / len(timings) * 1000))
+
+    commands = ['t {} {} {}'.format(ship_id, hlt.constants.MAX_SPEED, ship_id % 360)
+                for ship_id in range(args.ships // args.players)]
+    timings = time_transport(frame, commands, args.width, args.height, args.repeat)
+    for stage, stage_timings in zip(['read', 'parse', 'send'], zip(*timings)):
+        print('Transport {} per turn: min {:.3f}ms mean {:.3f}ms'.format(
+            stage, min(stage_timings) * 1000, sum(stage_timings) / len(stage_timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
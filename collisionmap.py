@@ -1,11 +1,116 @@
+import bisect
+import heapq
 import math
 import hlt
 import pickle
 import logging
+import numpy as np
 
 
 CELL_SIZE = 32
 
+COLLISION = 'Collision'
+DESERTION = 'Desertion'
+
+
+class Event:
+    """
+    A collision or desertion found for one of our ships in the coming turn.
+
+    Ids are (player_id, ship_id) tuples, (None, planet_id) for a planet. A desertion has the ship as both ids.
+
+    :ivar kind: COLLISION or DESERTION
+    :ivar id1: The ship the event was found for
+    :ivar id2: The entity it runs into
+    :ivar time: When in the turn it happens, from 0 to 1
+    """
+    __slots__ = ('kind', 'id1', 'id2', 'time')
+
+    def __init__(self, kind, id1, id2, time):
+        self.kind = kind
+        self.id1 = id1
+        self.id2 = id2
+        self.time = time
+
+    def key(self):
+        """
+        :return: The two ids in a fixed order, the same whichever ship the event was found for: a planet goes
+            last, otherwise the lower player id (then ship id) goes first
+        :rtype: ((int, int), (int, int))
+        """
+        id1, id2 = self.id1, self.id2
+        if id1[0] is None:
+            return id2, id1
+        if id2[0] is None:
+            return id1, id2
+        return (id1, id2) if id1 <= id2 else (id2, id1)
+
+    def swapped(self):
+        """
+        :return: The same event seen from the other entity
+        :rtype: Event
+        """
+        return Event(self.kind, self.id2, self.id1, self.time)
+
+    def __repr__(self):
+        return "{} {} {} {}".format(self.kind, self.id1, self.id2, self.time)
+
+
+class EventQueue:
+    """
+    The collisions of one pass over the collision map, each pair once and earliest first.
+
+    Pairs are found from both of their ships, so they are deduplicated on Event.key() in a set as they are
+    pushed, and kept in a heap by time so the resolver can deal with the earliest collisions first and stop
+    partway through. Events come out with their ids in key order. Desertions are dropped.
+    """
+
+    def __init__(self, events=()):
+        """
+        :param events: Events to push straight away
+        """
+        self._heap = []
+        self._keys = set()
+        self._pushed = 0
+        for event in events:
+            self.push(event)
+
+    def push(self, event):
+        """
+        :param Event event: The event to add
+        :return: Whether it was added, False for a desertion or a pair already in the queue
+        :rtype: bool
+        """
+        if event.kind != COLLISION:
+            return False
+        key = event.key()
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        if key[0] is not event.id1:
+            event = event.swapped()
+        # The push count breaks ties in time, so events at the same time come out in the order they were found
+        heapq.heappush(self._heap, (event.time, self._pushed, event))
+        self._pushed += 1
+        return True
+
+    def pop(self):
+        """
+        :return: The earliest event left
+        :rtype: Event
+        """
+        return heapq.heappop(self._heap)[2]
+
+    def drain(self):
+        """
+        :return: All of the events left, earliest first, emptying the queue
+        :rtype: list[Event]
+        """
+        return [self.pop() for _ in range(len(self._heap))]
+
+    def __len__(self):
+        return len(self._heap)
+
 
 def test_aabb_circle(rect_x, rect_y, rect_w, rect_h, circ_center, radius):
 
@@ -27,14 +132,148 @@ def test_aabb_circle(rect_x, rect_y, rect_w, rect_h, circ_center, radius):
     return (dx**2 + dy**2) <= radius**2
 
 
+def collision_time(r, ship, entity):
+    """
+    :param float r: The distance between the centres at which the two collide
+    :param ship: The moving entity (needs x, y, vel_x, vel_y)
+    :param entity: The other entity (needs x, y, vel_x, vel_y)
+    :return: Whether they come within r of each other, and the time (in turns) they first do
+    :rtype: (bool, float)
+    """
+    dx = ship.x - entity.x
+    dy = ship.y - entity.y
+    dvx = ship.vel_x - entity.vel_x
+    dvy = ship.vel_y - entity.vel_y
+
+    ## Quadratic formula
+    a = dvx**2 + dvy**2
+    b = 2 * ((dx * dvx) + (dy * dvy))
+    c = (dx**2) + (dy**2) - (r**2)
+
+    disc = b**2 - 4 * a * c
+
+    if a == 0.0:
+        if b == 0.0:
+            if c <= 0.0:
+                ## Implies r^2 >= dx^2 + dy^2 and the two are already colliding
+                return (True, 0.0)
+            return (False, 0.0)
+        t = -c / b
+        if t >= 0.0:
+            return (True, t)
+        return (False, 0.0)
+
+    elif disc == 0.0:
+        ## One solution
+        t = -b / (2 * a)
+        return (True, t)
+    elif disc > 0:
+        t1 = -b + math.sqrt(disc)
+        t2 = -b - math.sqrt(disc)
+
+        if t1 >= 0.0 and t2 >= 0.0:
+            return [True, min(t1, t2) / (2 * a)]
+        elif t1 <= 0.0 and t2 <= 0.0:
+            return [True, max(t1, t2) / (2 * a)]
+        else:
+            return [True, 0.0]
+    else:
+        return [False, 0.0]
+
+
+def collision_times(r, x1, y1, vel_x1, vel_y1, x2, y2, vel_x2, vel_y2):
+    """
+    collision_time for many pairs at once, with the same results case for case: no relative movement, a single
+    touching solution, already overlapping (time 0) and moving apart. NumPy squares by multiplying where Python
+    calls pow(), so a time can differ from collision_time's in the last bit.
+
+    :param numpy.ndarray r: The distance between the centres at which each pair collides
+    :param numpy.ndarray x1: The x-coordinate of the first entity of each pair (and likewise for the rest)
+    :return: Whether each pair comes within r, and the time (in turns) it first does
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    dx = x1 - x2
+    dy = y1 - y2
+    dvx = vel_x1 - vel_x2
+    dvy = vel_y1 - vel_y2
+
+    ## Quadratic formula
+    a = dvx**2 + dvy**2
+    b = 2 * ((dx * dvx) + (dy * dvy))
+    c = (dx**2) + (dy**2) - (r**2)
+
+    disc = b**2 - 4 * a * c
+
+    hit = np.zeros(len(a), dtype=bool)
+    time = np.zeros(len(a), dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stationary = a == 0.0
+        ## Not moving relative to each other, only colliding if already overlapping
+        parallel = stationary & (b == 0.0)
+        hit[parallel] = c[parallel] <= 0.0
+        linear = stationary & (b != 0.0)
+        t = -c[linear] / b[linear]
+        hit[linear] = t >= 0.0
+        time[linear] = np.where(t >= 0.0, t, 0.0)
+
+        ## One solution
+        touching = ~stationary & (disc == 0.0)
+        hit[touching] = True
+        time[touching] = -b[touching] / (2 * a[touching])
+
+        crossing = ~stationary & (disc > 0)
+        root = np.sqrt(disc[crossing])
+        t1 = -b[crossing] + root
+        t2 = -b[crossing] - root
+        two_a = 2 * a[crossing]
+        hit[crossing] = True
+        time[crossing] = np.where((t1 >= 0.0) & (t2 >= 0.0), np.minimum(t1, t2) / two_a,
+                                  np.where((t1 <= 0.0) & (t2 <= 0.0), np.maximum(t1, t2) / two_a, 0.0))
+
+    return hit, time
+
+
+def desertion_time(ship, width, height):
+    """
+    :param ship: A ship whose final location is off the map (needs x, y, vel_x, vel_y)
+    :param int width: Map width
+    :param int height: Map height
+    :return: The time (in turns) the ship leaves the map
+    :rtype: float
+    """
+    time = 1000000.0
+    if ship.vel_x != 0.0:
+        t1 = -ship.x / ship.vel_x
+        if (t1 < time) and (t1 >= 0):
+            time = t1
+        t2 = (width - ship.x) / ship.vel_x
+        if (t2 < time) and (t2 >= 0):
+            time = t2
+
+    if ship.vel_y != 0.0:
+        t3 = -ship.y / ship.vel_y
+        if (t3 < time) and (t3 >= 0):
+            time = t3
+        t4 = (height - ship.y) / ship.vel_y
+        if (t4 < time) and (t4 >= 0):
+            time = t4
+
+    return time
+
+
 class CollisionMap:
-    def __init__(self, game_map):
+    def __init__(self, game_map, cell_size=CELL_SIZE):
         self.game_map = game_map
+        self.cell_size = cell_size
 
-        self.width = int(math.ceil(game_map.width / CELL_SIZE))
-        self.height = int(math.ceil(game_map.height / CELL_SIZE))
+        self.width = int(math.ceil(game_map.width / cell_size))
+        self.height = int(math.ceil(game_map.height / cell_size))
 
-        self.cells = [[[] for _ in range(self.width)] for _ in range(self.height)]
+        # Each cell holds the (player_id, ship_id) pair ids of its ships, so a ship can be moved between cells in O(1)
+        self.cells = [[{} for _ in range(self.width)] for _ in range(self.height)]
+        # Ship -> (pair id, event horizon, covered cells) of every ship in the map
+        self.entries = {}
 
         self.rebuild()
 
@@ -44,67 +283,74 @@ class CollisionMap:
                 if player != self.game_map.get_me():
                     continue
             for ship in player.all_ships():
-                pair_id = [player.id, ship.id]
+                pair_id = (player.id, ship.id)
                 radius = self.event_horizon(ship)
                 self.add(ship, radius, pair_id)
 
+    def covered_cells(self, ship, radius):
+        """
+        :param ship: The centre of the circle (needs x, y)
+        :param float radius: The radius of the circle
+        :return: The (cell_x, cell_y) of every cell the circle touches, column by column
+        :rtype: list[(int, int)]
+        """
+        size = self.cell_size
+        # A cell whose edge lies exactly on the circle's bounds still touches it, hence ceil - 1 for the first
+        first_x = max(int(math.ceil((ship.x - radius) / size)) - 1, 0)
+        last_x = min(int(math.floor((ship.x + radius) / size)), self.width - 1)
+        first_y = max(int(math.ceil((ship.y - radius) / size)) - 1, 0)
+        last_y = min(int(math.floor((ship.y + radius) / size)), self.height - 1)
+
+        return [(cell_x, cell_y)
+                for cell_x in range(first_x, last_x + 1)
+                for cell_y in range(first_y, last_y + 1)
+                if test_aabb_circle(cell_x * size, cell_y * size, size, size, ship, radius)]
+
     def add(self, ship, radius, id):
-        for cell_x in range(self.width):
-            for cell_y in range(self.height):
-                if test_aabb_circle(cell_x * CELL_SIZE, cell_y * CELL_SIZE, CELL_SIZE, CELL_SIZE, ship, radius):
-                    self.cells[cell_y][cell_x].append(id)
+        cells = self.covered_cells(ship, radius)
+        for cell_x, cell_y in cells:
+            self.cells[cell_y][cell_x][id] = id
+
+        self.entries[ship] = (id, radius, cells)
+        ship.collision_map = self
+
+    def update(self, ship):
+        """
+        Move a ship to the cells its event horizon covers now, after its thrust changed. Only the cells it left or
+        entered are touched, and nothing is done if the horizon is the same size.
+
+        :param ship: A ship added to the map
+        :return: nothing
+        """
+        entry = self.entries.get(ship)
+        if entry is None:
+            return
+        id, radius, cells = entry
+        new_radius = self.event_horizon(ship)
+        if new_radius == radius:
+            return
+
+        new_cells = self.covered_cells(ship, new_radius)
+        old_cell_set = set(cells)
+        new_cell_set = set(new_cells)
+        for cell_x, cell_y in cells:
+            if (cell_x, cell_y) not in new_cell_set:
+                del self.cells[cell_y][cell_x][id]
+        for cell_x, cell_y in new_cells:
+            if (cell_x, cell_y) not in old_cell_set:
+                self.cells[cell_y][cell_x][id] = id
+
+        self.entries[ship] = (id, new_radius, new_cells)
 
     def test(self, ship):
         potential_collisions = []
-        for cell_x in range(self.width):
-            for cell_y in range(self.height):
-                radius = self.event_horizon(ship)
-                if test_aabb_circle(cell_x * CELL_SIZE, cell_y * CELL_SIZE, CELL_SIZE, CELL_SIZE, ship, radius):
-                    cell = self.cells[cell_y][cell_x]
-                    potential_collisions += cell
+        for cell_x, cell_y in self.covered_cells(ship, self.event_horizon(ship)):
+            potential_collisions += self.cells[cell_y][cell_x].values()
 
         return potential_collisions
 
     def collision_time(self, r, ship, entity):
-        dx = ship.x - entity.x
-        dy = ship.y - entity.y
-        dvx = ship.vel_x - entity.vel_x
-        dvy = ship.vel_y - entity.vel_y
-
-        ## Quadratic formula
-        a = dvx**2 + dvy**2
-        b = 2 * ((dx * dvx) + (dy * dvy))
-        c = (dx**2) + (dy**2) - (r**2)
-
-        disc = b**2 - 4 * a * c
-
-        if a == 0.0:
-            if b == 0.0:
-                if c <= 0.0:
-                    ## Implies r^2 >= dx^2 + dy^2 and the two are already colliding
-                    return (True, 0.0)
-                return (False, 0.0)
-            t = -c / b
-            if t >= 0.0:
-                return (True, t)
-            return (False, 0.0)
-
-        elif disc == 0.0:
-            ## One solution
-            t = -b / (2 * a)
-            return (True, t)
-        elif disc > 0:
-            t1 = -b + math.sqrt(disc)
-            t2 = -b - math.sqrt(disc)
-
-            if t1 >= 0.0 and t2 >= 0.0:
-                return [True, min(t1, t2) / (2 * a)]
-            elif t1 <= 0.0 and t2 <= 0.0:
-                return [True, max(t1, t2) / (2 * a)]
-            else:
-                return [True, 0.0]
-        else:
-            return [False, 0.0]
+        return collision_time(r, ship, entity)
 
     # The program currently has no need for attacks
     # def might_attack(self, distance, ship1, ship2):
@@ -115,8 +361,8 @@ class CollisionMap:
 
     def find_events(self, id1, id2, ship1, ship2):
         """
-        :param id1 [player_id, ship_id] 1
-        :param id2 [player_id, ship_id] 2
+        :param id1 (player_id, ship_id) 1
+        :param id2 (player_id, ship_id) 2
         :param ship1 ship 1
         :param ship2 ship 1
         :return: All of the unsorted events found
@@ -149,7 +395,7 @@ class CollisionMap:
             #logging.info(t)
             if t[0]:
                 if (t[1] >= 0) and (t[1] <= 1):
-                    unsorted_events.append(['Collision', id1, id2, t[1]])
+                    unsorted_events.append(Event(COLLISION, id1, id2, t[1]))
 
                 elif distance < collision_radius:
                     raise(Exception('This should never happen - the ships should already be dead'))
@@ -162,19 +408,142 @@ class CollisionMap:
         return ship.radius + ship.magnitude + weapon_radius
 
 
-def process_events(game_map, collision_map):
-    unsorted_events = []
+class SweepAndPrune(CollisionMap):
+    """
+    A CollisionMap that finds candidate pairs by sweep and prune instead of a grid. Each ship's event horizon is
+    an interval on the x axis, kept sorted by its lower end; a test bisects to the intervals that can reach the
+    ship and checks y for those. Ships don't move while collisions are resolved, only their horizons grow or
+    shrink, so after a thrust change the ship is shifted to its new place in the order rather than re-sorting.
+    """
+
+    def __init__(self, game_map):
+        self.game_map = game_map
+
+        # Lower x bound of each interval, sorted, and the (ship, pair id, event horizon) it belongs to
+        self.lower_bounds = []
+        self.intervals = []
+        # The largest horizon added, nothing starting more than twice this left of a ship's interval can reach it
+        self.max_horizon = 0
+        self.entries = {}
+
+        self.rebuild()
+
+    def add(self, ship, radius, id):
+        lower_bound = ship.x - radius
+        index = bisect.bisect_right(self.lower_bounds, lower_bound)
+        self.lower_bounds.insert(index, lower_bound)
+        self.intervals.insert(index, (ship, id, radius))
+        self.max_horizon = max(self.max_horizon, radius)
+
+        self.entries[ship] = (id, radius)
+        ship.collision_map = self
+
+    def update(self, ship):
+        """
+        Move a ship's interval to where it now belongs in the order, after its thrust changed.
+
+        :param ship: A ship added to the map
+        :return: nothing
+        """
+        entry = self.entries.get(ship)
+        if entry is None:
+            return
+        id, radius = entry
+        new_radius = self.event_horizon(ship)
+        if new_radius == radius:
+            return
+
+        index = bisect.bisect_left(self.lower_bounds, ship.x - radius)
+        while self.intervals[index][0] is not ship:
+            index += 1
+        del self.lower_bounds[index]
+        del self.intervals[index]
+        self.add(ship, new_radius, id)
+
+    def test(self, ship):
+        radius = self.event_horizon(ship)
+        first = bisect.bisect_left(self.lower_bounds, ship.x - radius - 2 * self.max_horizon)
+        last = bisect.bisect_right(self.lower_bounds, ship.x + radius)
+
+        potential_collisions = []
+        for other, id, other_radius in self.intervals[first:last]:
+            if other.x + other_radius >= ship.x - radius and abs(other.y - ship.y) <= radius + other_radius:
+                potential_collisions.append(id)
+        return potential_collisions
+
+
+def process_events(game_map, collision_map, ships=None):
+    """
+    :param game_map: The map
+    :param collision_map: The broadphase holding all of our ships
+    :param ships: The ships to find events for, all of ours if None. Collisions with ships left out are still
+        found from the side of the ships given
+    :return: All of the unsorted events found
+    :rtype: list[Event]
+    """
     player = game_map.get_me()
-    for ship in player.all_ships():
-        unsorted_events += process_event_one_ship(game_map, collision_map, ship)
+    if ships is None:
+        ships = player.all_ships()
+
+    # Every ship against its broadphase candidates, solved in one batch
+    pairs = []
+    for row, ship in enumerate(ships):
+        id1 = (player.id, ship.id)
+        for id2 in collision_map.test(ship):
+            if id1 != id2:
+                pairs.append((row, id1, id2, ship, game_map.get_player(id2[0]).get_ship(id2[1])))
+
+    ship_events = [[] for _ in ships]
+    if pairs:
+        rows, ids1, ids2, ships1, ships2 = zip(*pairs)
+        for row, event in zip(rows, find_collision_events(ids1, ids2, ships1, ships2)):
+            if event is not None:
+                ship_events[row].append(event)
+
+    unsorted_events = []
+    for ship, events in zip(ships, ship_events):
+        unsorted_events += events
+        unsorted_events += process_planet_events(game_map, collision_map, ship, (player.id, ship.id))
     return unsorted_events
 
+def find_collision_events(ids1, ids2, ships1, ships2):
+    """
+    CollisionMap.find_events for many ship pairs at once.
+
+    :param ids1: (player_id, ship_id) of the first ship of each pair
+    :param ids2: (player_id, ship_id) of the second ship of each pair
+    :param ships1: The first ship of each pair
+    :param ships2: The second ship of each pair
+    :return: The collision event of each pair, None where there isn't one
+    :rtype: list
+    """
+    def column(ships, attribute):
+        return np.array([getattr(ship, attribute) for ship in ships], dtype=np.float64)
+
+    x1, y1, vel_x1, vel_y1 = (column(ships1, name) for name in ('x', 'y', 'vel_x', 'vel_y'))
+    x2, y2, vel_x2, vel_y2 = (column(ships2, name) for name in ('x', 'y', 'vel_x', 'vel_y'))
+    radius1, radius2 = column(ships1, 'radius'), column(ships2, 'radius')
+
+    distance = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    might_collide = distance <= column(ships1, 'magnitude') + column(ships2, 'magnitude') + radius1 + radius2
+
+    collision_radius = radius1 + radius2
+    hit, time = collision_times(collision_radius, x1, y1, vel_x1, vel_y1, x2, y2, vel_x2, vel_y2)
+    hit &= might_collide
+    in_turn = (time >= 0) & (time <= 1)
+
+    if (hit & ~in_turn & (distance < collision_radius)).any():
+        raise(Exception('This should never happen - the ships should already be dead'))
+
+    return [Event(COLLISION, id1, id2, t) if found else None
+            for id1, id2, t, found in zip(ids1, ids2, time.tolist(), (hit & in_turn).tolist())]
+
 def process_event_one_ship(game_map, collision_map, ship):
     unsorted_events = []
 
     player = game_map.get_me()
 
-    id1 = [player.id, ship.id]
+    id1 = (player.id, ship.id)
     ship1 = ship
 
     potential_collisions = []
@@ -187,8 +556,14 @@ def process_event_one_ship(game_map, collision_map, ship):
         #logging.info(ship2)
         unsorted_events += collision_map.find_events(id1, id2, ship1, ship2)
 
+    unsorted_events += process_planet_events(game_map, collision_map, ship1, id1)
+    return unsorted_events
+
+def process_planet_events(game_map, collision_map, ship1, id1):
+    unsorted_events = []
+
     # Possible ship-planet collisions
-    for planet in game_map.all_planets():
+    for planet in game_map.planets_near(ship1, ship1.magnitude + ship1.radius):
         if planet.health <= 0:
             continue
         distance = ship1.calculate_distance_between(planet)
@@ -197,30 +572,14 @@ def process_event_one_ship(game_map, collision_map, ship):
             t = collision_map.collision_time(collision_radius, ship1, planet)
             if t[0]:
                 if (t[1] >= 0) and (t[1] <= 1):
-                    unsorted_events.append(['Collision', id1, [None, planet.id], t[1]])
+                    unsorted_events.append(Event(COLLISION, id1, (None, planet.id), t[1]))
                 elif distance <= collision_radius:
                     #raise(Exception('This should never happen - they should already have collided'))
                     continue
 
     final_location = ship1.get_final_location()
     if not game_map.within_bounds(final_location):
-        time = 1000000.0
-        if ship1.vel_x != 0.0:
-            t1 = -ship1.x / ship1.vel_x
-            if (t1 < time) and (t1 >= 0):
-                time = t1
-            t2 = (game_map.width - ship1.x) / ship1.vel_x
-            if (t2 < time) and (t2 >= 0):
-                time = t2
-
-        if ship1.vel_y != 0.0:
-            t3 = -ship1.y / ship1.vel_y
-            if (t3 < time) and (t3 >= 0):
-                time = t3
-            t4 = (game_map.height - ship1.y) / ship1.vel_y
-            if (t4 < time) and (t4 >= 0):
-                time = t4
-
-        unsorted_events.append(['Desertion', id1, id1, time])
+        time = desertion_time(ship1, game_map.width, game_map.height)
+        unsorted_events.append(Event(DESERTION, id1, id1, time))
 
     return unsorted_events
@@ -1,3 +1,7 @@
+import math
+
+import numpy as np
+
 from .entity import Position, Entity
 
 
@@ -38,3 +42,99 @@ def intersect_segment_circle(start, end, circle, *, fudge=0.5):
     closest_distance = Position(closest_x, closest_y).calculate_distance_between(circle)
 
     return closest_distance <= circle.radius + fudge
+
+
+def intersect_segments_circles(start_x, start_y, end_x, end_y, circle_x, circle_y, circle_radius, fudge=0.5):
+    """
+    Test many line segments against many circles at once. Gives the same answers as intersect_segment_circle
+    for each segment/circle pair.
+
+    :param numpy.ndarray start_x: The x-coordinate of the start of each segment
+    :param numpy.ndarray start_y: The y-coordinate of the start of each segment
+    :param numpy.ndarray end_x: The x-coordinate of the end of each segment
+    :param numpy.ndarray end_y: The y-coordinate of the end of each segment
+    :param numpy.ndarray circle_x: The x-coordinate of each circle's centre
+    :param numpy.ndarray circle_y: The y-coordinate of each circle's centre
+    :param numpy.ndarray circle_radius: The radius of each circle
+    :param fudge: Additional distance to leave between the segments and circles, a float or one per segment
+    :return: Boolean matrix with a row for each segment and a column for each circle, True where they intersect
+    :rtype: numpy.ndarray
+    """
+    start_x = np.asarray(start_x, dtype=np.float64)[:, np.newaxis]
+    start_y = np.asarray(start_y, dtype=np.float64)[:, np.newaxis]
+    end_x = np.asarray(end_x, dtype=np.float64)[:, np.newaxis]
+    end_y = np.asarray(end_y, dtype=np.float64)[:, np.newaxis]
+    fudge = np.asarray(fudge, dtype=np.float64)
+    if fudge.ndim:
+        fudge = fudge[:, np.newaxis]
+    reach = np.asarray(circle_radius, dtype=np.float64) + fudge
+
+    # Same parameterisation as intersect_segment_circle, kept term for term so both round the same way
+    dx = end_x - start_x
+    dy = end_y - start_y
+
+    a = dx**2 + dy**2
+    b = -2 * (start_x**2 - start_x*end_x - start_x*circle_x + end_x*circle_x +
+              start_y**2 - start_y*end_y - start_y*circle_y + end_y*circle_y)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.minimum(-b / (2 * a), 1.0)
+    closest_x = start_x + dx * t
+    closest_y = start_y + dy * t
+    closest_distance = np.sqrt((circle_x - closest_x)**2 + (circle_y - closest_y)**2)
+    intersects = (t >= 0) & (closest_distance <= reach)
+
+    # Segments that are a single point
+    point_distance = np.sqrt((circle_x - start_x)**2 + (circle_y - start_y)**2)
+    return np.where(a == 0.0, point_distance <= reach, intersects)
+
+
+def closest_approach(entity1, entity2, start=0.0, duration=1.0):
+    """
+    Find when and how close two moving entities get to each other, from start until start + duration.
+
+    :param Entity entity1: The first entity (needs x, y, vel_x, vel_y attributes)
+    :param Entity entity2: The second entity (needs x, y, vel_x, vel_y attributes)
+    :param float start: The time (in turns) to start looking from
+    :param float duration: How long (in turns) to look for
+    :return: The time of the closest approach and the distance between the centres then
+    :rtype: (float, float)
+    """
+    dx = entity1.x - entity2.x
+    dy = entity1.y - entity2.y
+    dvx = entity1.vel_x - entity2.vel_x
+    dvy = entity1.vel_y - entity2.vel_y
+
+    speed_squared = dvx**2 + dvy**2
+    if speed_squared == 0.0:
+        # Not moving relative to each other, the distance never changes
+        time = start
+    else:
+        # Vertex of the squared distance between them, kept inside the window
+        time = min(max(-(dx * dvx + dy * dvy) / speed_squared, start), start + duration)
+
+    return time, math.sqrt((dx + dvx * time)**2 + (dy + dvy * time)**2)
+
+
+def closest_approaches(x1, y1, vel_x1, vel_y1, x2, y2, vel_x2, vel_y2, start=0.0, duration=1.0):
+    """
+    closest_approach for many pairs of entities at once.
+
+    :param numpy.ndarray x1: The x-coordinate of the first entity of each pair (and likewise for the rest)
+    :param start: The time (in turns) to start looking from, a float or one per pair
+    :param float duration: How long (in turns) to look for
+    :return: The time of each pair's closest approach and the distance between the centres then
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    dx = np.asarray(x1, dtype=np.float64) - x2
+    dy = np.asarray(y1, dtype=np.float64) - y2
+    dvx = np.asarray(vel_x1, dtype=np.float64) - vel_x2
+    dvy = np.asarray(vel_y1, dtype=np.float64) - vel_y2
+    start = np.broadcast_to(np.asarray(start, dtype=np.float64), dx.shape)
+
+    speed_squared = dvx**2 + dvy**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vertex = -(dx * dvx + dy * dvy) / speed_squared
+    time = np.where(speed_squared == 0.0, start, np.clip(vertex, start, start + duration))
+
+    return time, np.sqrt((dx + dvx * time)**2 + (dy + dvy * time)**2)
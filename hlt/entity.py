@@ -8,6 +8,10 @@ from collisionmap import process_event_one_ship
 
 
 TARGET_FUDGE = 2
+#: Number of tokens describing a ship in the engine frame
+SHIP_TOKENS = 10
+#: Number of tokens describing a planet before its docked ship ids
+PLANET_TOKENS = 11
 
 
 class Entity:
@@ -25,6 +29,10 @@ class Entity:
     """
     __metaclass__ = abc.ABCMeta
 
+    # Set by the Map's GeometryCache on the ships and planets of the current turn
+    _geometry = None
+    _geometry_row = None
+
     def __init__(self, x, y, radius, health, player, entity_id):
         self.x = x
         self.y = y
@@ -42,6 +50,9 @@ class Entity:
         :return: distance
         :rtype: float
         """
+        geometry = self._geometry
+        if geometry is not None and getattr(target, '_geometry', None) is geometry:
+            return geometry.distance(self._geometry_row, target._geometry_row)
         return math.sqrt((target.x - self.x) ** 2 + (target.y - self.y) ** 2)
 
     def calculate_angle_between(self, target):
@@ -52,6 +63,9 @@ class Entity:
         :return: Angle between entities in degrees
         :rtype: float
         """
+        geometry = self._geometry
+        if geometry is not None and getattr(target, '_geometry', None) is geometry:
+            return geometry.angle(self._geometry_row, target._geometry_row)
         return math.degrees(math.atan2(target.y - self.y, target.x - self.x)) % 360
 
     def closest_point_to(self, target, min_distance=3):
@@ -102,6 +116,20 @@ class Planet(Entity):
     def __init__(self, planet_id, x, y, hp, radius, docking_spots, current,
                  remaining, owned, owner, docked_ships):
         self.id = planet_id
+        self.vel_x = 0
+        self.vel_y = 0
+        self.distance_to_target = 0
+        self.docking_planet = None
+        self.magnitude = 0
+        self.angle = 0
+        self._update(x, y, hp, radius, docking_spots, current, remaining, owned, owner, docked_ships)
+
+    def _update(self, x, y, hp, radius, docking_spots, current, remaining, owned, owner, docked_ships):
+        """
+        Refresh the planet with this turn's engine data, keeping the same object.
+
+        :return: nothing
+        """
         self.x = x
         self.y = y
         self.radius = radius
@@ -112,12 +140,6 @@ class Planet(Entity):
         self.owner = owner if bool(int(owned)) else None
         self._docked_ship_ids = docked_ships
         self._docked_ships = {}
-        self.vel_x = 0
-        self.vel_y = 0
-        self.distance_to_target = 0
-        self.docking_planet = None
-        self.magnitude = 0
-        self.angle = 0
 
     def get_docked_ship(self, ship_id):
         """
@@ -169,50 +191,62 @@ class Planet(Entity):
                 self._docked_ships[ship] = self.owner.get_ship(ship)
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, offset, existing):
         """
         Parse a single planet given tokenized input from the game environment.
 
-        :return: The planet ID, planet object, and unused tokens.
-        :rtype: (int, Planet, list[str])
+        :param list[str] tokens: The tokenized input
+        :param int offset: Index of the first token belonging to this planet
+        :param dict[int, Planet] existing: Planets from the previous turn, reused and updated in place
+        :return: The planet ID, planet object, and the offset of the next unused token.
+        :rtype: (int, Planet, int)
         """
         (plid, x, y, hp, r, docking, current, remaining,
-         owned, owner, num_docked_ships, *remainder) = tokens
+         owned, owner, num_docked_ships) = tokens[offset:offset + PLANET_TOKENS]
 
         plid = int(plid)
-        docked_ships = []
-
-        for _ in range(int(num_docked_ships)):
-            ship_id, *remainder = remainder
-            docked_ships.append(int(ship_id))
-
-        planet = Planet(int(plid),
-                        float(x), float(y),
-                        int(hp), float(r), int(docking),
-                        int(current), int(remaining),
-                        bool(int(owned)), int(owner),
-                        docked_ships)
+        offset += PLANET_TOKENS
+        end = offset + int(num_docked_ships)
+        docked_ships = [int(ship_id) for ship_id in tokens[offset:end]]
+
+        planet = existing.get(plid)
+        if planet is None:
+            planet = Planet(plid,
+                            float(x), float(y),
+                            int(hp), float(r), int(docking),
+                            int(current), int(remaining),
+                            bool(int(owned)), int(owner),
+                            docked_ships)
+        else:
+            planet._update(float(x), float(y),
+                           int(hp), float(r), int(docking),
+                           int(current), int(remaining),
+                           bool(int(owned)), int(owner),
+                           docked_ships)
 
-        return plid, planet, remainder
+        return plid, planet, end
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, offset=0, existing=None):
         """
         Parse planet data given a tokenized input.
 
         :param list[str] tokens: The tokenized input
-        :return: the populated planet dict and the unused tokens.
-        :rtype: (dict, list[str])
-        """
-        num_planets, *remainder = tokens
-        num_planets = int(num_planets)
+        :param int offset: Index of the planet count token
+        :param dict[int, Planet] existing: Planets from the previous turn, reused and updated in place
+        :return: the populated planet dict and the offset of the next unused token.
+        :rtype: (dict, int)
+        """
+        existing = existing or {}
+        num_planets = int(tokens[offset])
+        offset += 1
         planets = {}
 
         for _ in range(num_planets):
-            plid, planet, remainder = Planet._parse_single(remainder)
+            plid, planet, offset = Planet._parse_single(tokens, offset, existing)
             planets[plid] = planet
 
-        return planets, remainder
+        return planets, offset
 
 
 class Ship(Entity):
@@ -227,6 +261,8 @@ class Ship(Entity):
     :ivar DockingStatus docking_status: The docking status (UNDOCKED, DOCKED, DOCKING, UNDOCKING)
     :ivar planet: The ID of the planet the ship is docked to, if applicable.
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
+    :ivar collision_map: The CollisionMap the ship is in while collisions are being resolved, kept up to date by
+        thrust()
     """
 
     class DockingStatus(Enum):
@@ -238,10 +274,21 @@ class Ship(Entity):
     def __init__(self, player_id, ship_id, x, y, hp, vel_x, vel_y,
                  docking_status, planet, progress, cooldown):
         self.id = ship_id
+        self.radius = constants.SHIP_RADIUS
+        self.initial_target = None
+        self._update(player_id, x, y, hp, vel_x, vel_y, docking_status, planet, progress, cooldown)
+
+    def _update(self, player_id, x, y, hp, vel_x, vel_y, docking_status, planet, progress, cooldown):
+        """
+        Refresh the ship with this turn's engine data, keeping the same object. State attached to the ship
+        (initial_target) survives, the previous turn's movement and squadron membership are cleared. A squadron
+        only marks its ships in the turn it forms, as it did when ships were rebuilt every turn.
+
+        :return: nothing
+        """
         self.x = x
         self.y = y
         self.owner = player_id
-        self.radius = constants.SHIP_RADIUS
         self.health = hp
         self.docking_status = docking_status
         self.planet = planet if (docking_status is not Ship.DockingStatus.UNDOCKED) else None
@@ -254,7 +301,7 @@ class Ship(Entity):
         self.magnitude = 0
         self.angle = 0
         self.distance_to_target = 0
-        self.initial_target = None
+        self.collision_map = None
         self.in_squadron = False
 
     def __str__(self):
@@ -304,6 +351,10 @@ class Ship(Entity):
         if self._stored_magnitude != self.magnitude or self._stored_angle != self.angle:
             self.update_distance_to_target()
 
+        if self.collision_map is not None:
+            # Keep the collision broadphase in step with the new speed
+            self.collision_map.update(self)
+
     def update_distance_to_target(self):
         if isinstance(self.target, Planet) or isinstance(self.target, Ship):
             distance_to_target = self.calculate_distance_between(self.target)
@@ -401,46 +452,62 @@ class Ship(Entity):
         self.planet = planets.get(self.planet)  # If not will just reset to none
 
     @staticmethod
-    def _parse_single(player_id, tokens):
+    def _parse_single(player_id, tokens, offset, existing):
         """
         Parse a single ship given tokenized input from the game environment.
 
         :param int player_id: The id of the player who controls the ships
-        :param list[tokens]: The remaining tokens
-        :return: The ship ID, ship object, and unused tokens.
-        :rtype: int, Ship, list[str]
+        :param list[str] tokens: The tokenized input
+        :param int offset: Index of the first token belonging to this ship
+        :param dict[int, Ship] existing: The player's ships from the previous turn, reused and updated in place
+        :return: The ship ID, ship object, and the offset of the next unused token.
+        :rtype: int, Ship, int
         """
         (sid, x, y, hp, vel_x, vel_y,
-         docked, docked_planet, progress, cooldown, *remainder) = tokens
+         docked, docked_planet, progress, cooldown) = tokens[offset:offset + SHIP_TOKENS]
 
         sid = int(sid)
         docked = Ship.DockingStatus(int(docked))
 
-        ship = Ship(player_id,
-                    sid,
-                    float(x), float(y),
-                    int(hp),
-                    float(vel_x), float(vel_y),
-                    docked, int(docked_planet),
-                    int(progress), int(cooldown))
+        ship = existing.get(sid)
+        if ship is None:
+            ship = Ship(player_id,
+                        sid,
+                        float(x), float(y),
+                        int(hp),
+                        float(vel_x), float(vel_y),
+                        docked, int(docked_planet),
+                        int(progress), int(cooldown))
+        else:
+            ship._update(player_id,
+                         float(x), float(y),
+                         int(hp),
+                         float(vel_x), float(vel_y),
+                         docked, int(docked_planet),
+                         int(progress), int(cooldown))
 
-        return sid, ship, remainder
+        return sid, ship, offset + SHIP_TOKENS
 
     @staticmethod
-    def _parse(player_id, tokens):
+    def _parse(player_id, tokens, offset=0, existing=None):
         """
         Parse ship data given a tokenized input.
 
         :param int player_id: The id of the player who owns the ships
         :param list[str] tokens: The tokenized input
-        :return: The dict of Players and unused tokens.
-        :rtype: (dict, list[str])
+        :param int offset: Index of the ship count token
+        :param dict[int, Ship] existing: The player's ships from the previous turn, reused and updated in place
+        :return: The dict of Ships and the offset of the next unused token.
+        :rtype: (dict, int)
         """
+        existing = existing or {}
         ships = {}
-        num_ships, *remainder = tokens
-        for _ in range(int(num_ships)):
-            ship_id, ships[ship_id], remainder = Ship._parse_single(player_id, remainder)
-        return ships, remainder
+        num_ships = int(tokens[offset])
+        offset += 1
+        for _ in range(num_ships):
+            ship_id, ship, offset = Ship._parse_single(player_id, tokens, offset, existing)
+            ships[ship_id] = ship
+        return ships, offset
 
 
 class Position(Entity):
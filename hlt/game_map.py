@@ -1,4 +1,4 @@
-from . import collision, entity
+from . import collision, entity, geometry, neighbours, snapshot
 
 
 class Map:
@@ -8,6 +8,12 @@ class Map:
     :ivar my_id: Current player id associated with the map
     :ivar width: Map width
     :ivar height: Map height
+    :ivar snapshot: Columnar (NumPy) view of the entities parsed this turn
+    :ivar diff: The ships and planets that changed since the previous turn
+    :ivar static_world: The fixed geometry of the game, shared with the Game that owns the map
+    :ivar planet_index: Spatial index over the planets, built by the Game that owns the map
+    :ivar neighbours: Nearest-neighbour index over the ships and planets parsed this turn
+    :ivar geometry: Distances and angles between the ships and planets parsed this turn
     """
 
     def __init__(self, my_id, width, height):
@@ -21,6 +27,12 @@ class Map:
         self.height = height
         self._players = {}
         self._planets = {}
+        self.snapshot = None
+        self.diff = None
+        self.static_world = None
+        self.planet_index = None
+        self.neighbours = None
+        self.geometry = None
 
     def get_me(self):
         """
@@ -59,6 +71,33 @@ class Map:
         """
         return list(self._planets.values())
 
+    def planets_near(self, entity, distance):
+        """
+        :param entity.Entity entity: The entity to look around
+        :param float distance: How far from the entity's centre to look, planet radii are added on top
+        :return: The planets that may be within distance, a superset of the ones that are (all planets if
+            there is no planet index)
+        :rtype: list[entity.Planet]
+        """
+        if self.planet_index is None:
+            return self.all_planets()
+        return [self._planets[planet_id] for planet_id in self.planet_index.near(entity.x, entity.y, distance)
+                if planet_id in self._planets]
+
+    def planets_along(self, start, end, fudge):
+        """
+        :param entity.Entity start: The start of the segment
+        :param entity.Entity end: The end of the segment
+        :param float fudge: How far from the segment to look, planet radii are added on top
+        :return: The planets that may be within fudge of the segment, a superset of the ones that are (all
+            planets if there is no planet index)
+        :rtype: list[entity.Planet]
+        """
+        if self.planet_index is None:
+            return self.all_planets()
+        return [self._planets[planet_id] for planet_id in self.planet_index.along(start.x, start.y, end.x, end.y, fudge)
+                if planet_id in self._planets]
+
     def nearby_entities_by_distance(self, entity):
         """
         :param entity: The source entity to find distances from
@@ -86,19 +125,31 @@ class Map:
 
     def _parse(self, map_string):
         """
-        Parse the map description from the game.
+        Parse the map description from the game. Players, ships and planets that still exist are the same
+        objects as last turn, updated in place.
 
         :param map_string: The string which the Halite engine outputs
         :return: nothing
         """
         tokens = map_string.split()
 
-        self._players, tokens = Player._parse(tokens)
-        self._planets, tokens = entity.Planet._parse(tokens)
+        self._players, offset = Player._parse(tokens, 0, self._players)
+        self._planets, offset = entity.Planet._parse(tokens, offset, self._planets)
 
-        assert(len(tokens) == 0)  # There should be no remaining tokens at this point
+        assert(offset == len(tokens))  # There should be no remaining tokens at this point
         self._link()
 
+        ships = self._all_ships()
+        planets = self.all_planets()
+        previous_snapshot = self.snapshot
+        self.snapshot = snapshot.Snapshot(ships, planets)
+        self.diff = snapshot.Diff(previous_snapshot, self.snapshot)
+        self.neighbours = neighbours.NeighbourIndex(ships, planets, self.snapshot, self.width, self.height)
+        self.geometry = geometry.GeometryCache(ships + planets, self.snapshot)
+        if self.planet_index is not None:
+            self.planet_index.mark_destroyed(self.diff.destroyed_planets)
+            self.planet_index.mark_destroyed(self.snapshot.planet_ids[self.snapshot.planet_health <= 0].tolist())
+
     def _all_ships(self):
         """
         Helper function to extract all ships from all players
@@ -119,7 +170,7 @@ class Map:
         :return: The colliding entity if so, else None.
         :rtype: entity.Entity
         """
-        for celestial_object in self._all_ships() + self.all_planets():
+        for celestial_object in self._all_ships() + self.planets_near(target, target.radius + 0.1):
             if celestial_object is target:
                 continue
             d = celestial_object.calculate_distance_between(target)
@@ -138,7 +189,7 @@ class Map:
         :rtype: list[entity.Entity]
         """
         obstacles = []
-        entities = ([] if issubclass(entity.Planet, ignore) else self.all_planets()) \
+        entities = ([] if issubclass(entity.Planet, ignore) else self.planets_along(ship, target, ship.radius + 0.1)) \
             + ([] if issubclass(entity.Ship, ignore) else self._all_ships())
         for foreign_entity in entities:
             if foreign_entity == ship or foreign_entity == target:
@@ -176,37 +227,46 @@ class Player:
         return self._ships.get(ship_id)
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, offset, existing):
         """
         Parse one user given an input string from the Halite engine.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
-        :return: The parsed player id, player object, and remaining tokens
-        :rtype: (int, Player, list[str])
-        """
-        player_id, *remainder = tokens
-        player_id = int(player_id)
-        ships, remainder = entity.Ship._parse(player_id, remainder)
-        player = Player(player_id, ships)
-        return player_id, player, remainder
+        :param int offset: Index of the first token belonging to this player
+        :param dict[int, Player] existing: Players from the previous turn, reused and updated in place
+        :return: The parsed player id, player object, and the offset of the next unused token
+        :rtype: (int, Player, int)
+        """
+        player_id = int(tokens[offset])
+        player = existing.get(player_id)
+        if player is None:
+            ships, offset = entity.Ship._parse(player_id, tokens, offset + 1)
+            player = Player(player_id, ships)
+        else:
+            player._ships, offset = entity.Ship._parse(player_id, tokens, offset + 1, player._ships)
+        return player_id, player, offset
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, offset=0, existing=None):
         """
         Parse an entire user input string from the Halite engine for all users.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
-        :return: The parsed players in the form of player dict, and remaining tokens
-        :rtype: (dict, list[str])
-        """
-        num_players, *remainder = tokens
-        num_players = int(num_players)
+        :param int offset: Index of the player count token
+        :param dict[int, Player] existing: Players from the previous turn, reused and updated in place
+        :return: The parsed players in the form of player dict, and the offset of the next unused token
+        :rtype: (dict, int)
+        """
+        existing = existing or {}
+        num_players = int(tokens[offset])
+        offset += 1
         players = {}
 
         for _ in range(num_players):
-            player, players[player], remainder = Player._parse_single(remainder)
+            player_id, player, offset = Player._parse_single(tokens, offset, existing)
+            players[player_id] = player
 
-        return players, remainder
+        return players, offset
 
     def __str__(self):
         return "Player {} with ships {}".format(self.id, self.all_ships())
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class GeometryCache:
+    """
+    Distances and angles between the ships and planets of one turn, built by the Map from the snapshot each
+    time it parses a frame. Entity.calculate_distance_between and calculate_angle_between look here first when
+    both entities belong to the same turn's cache.
+
+    The same pairs come up many times a turn (each collision resolution loop checks our ships against the
+    planets again), so the first query about an entity works out its distances (or angles) to every ship and
+    planet in one NumPy pass, and later queries are list lookups. Rows are only filled in when asked for: the
+    full matrices over a few hundred ships take longer to build than the queries they would answer.
+
+    Distances are the same floats the scalar calculation gives. Angles can differ from math.atan2 in the last
+    place.
+    """
+
+    def __init__(self, entities, snapshot):
+        """
+        :param list[entity.Entity] entities: All ships then all planets, in snapshot order
+        :param snapshot.Snapshot snapshot: The snapshot of the same turn
+        """
+        self._x = np.concatenate((snapshot.ship_x, snapshot.planet_x))
+        self._y = np.concatenate((snapshot.ship_y, snapshot.planet_y))
+        self._distances = [None] * len(entities)
+        self._angles = [None] * len(entities)
+        for row, entity in enumerate(entities):
+            entity._geometry = self
+            entity._geometry_row = row
+
+    def __getstate__(self):
+        # The rows are quick to work out again and can be most of a pickled map, so they are left out
+        state = dict(self.__dict__)
+        state['_distances'] = [None] * len(self._distances)
+        state['_angles'] = [None] * len(self._angles)
+        return state
+
+    def distance(self, row, column):
+        """
+        :param int row: Geometry row of the entity measured from
+        :param int column: Geometry row of the entity measured to
+        :return: The distance between the two centres
+        :rtype: float
+        """
+        distances = self._distances[row]
+        if distances is None:
+            # Distance is symmetric, so a row already worked out for the other entity will do
+            distances = self._distances[column]
+            if distances is not None:
+                return distances[row]
+            distances = self._distances[row] = np.sqrt((self._x - self._x[row]) ** 2 +
+                                                       (self._y - self._y[row]) ** 2).tolist()
+        return distances[column]
+
+    def angle(self, row, column):
+        """
+        :param int row: Geometry row of the entity measured from
+        :param int column: Geometry row of the entity measured to
+        :return: The angle from the first centre to the second in degrees, in [0, 360)
+        :rtype: float
+        """
+        angles = self._angles[row]
+        if angles is None:
+            angles = self._angles[row] = (np.degrees(np.arctan2(self._y - self._y[row], self._x - self._x[row]))
+                                          % 360).tolist()
+        return angles[column]
@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+
+from . import entity
+
+
+#: Width and height of a NeighbourIndex grid cell
+NEIGHBOUR_CELL_SIZE = 32
+
+
+class NeighbourIndex:
+    """
+    Nearest-neighbour and within-radius queries over every ship and planet of a turn, built by the Map from the
+    snapshot each time it parses a frame.
+
+    Entity centres are bucketed in a uniform grid (the same approach as world.PlanetIndex, but rebuilt every
+    turn since ships move). A query gathers the entities in the cells around the point, filters them by type and
+    owner and sorts what is left by centre-to-centre distance. Entities at the same distance keep map order
+    (ships by player, then planets).
+    """
+
+    def __init__(self, ships, planets, snapshot, width, height, cell_size=NEIGHBOUR_CELL_SIZE):
+        """
+        :param list[entity.Ship] ships: All ships on the map, in snapshot order
+        :param list[entity.Planet] planets: All planets on the map, in snapshot order
+        :param snapshot.Snapshot snapshot: The snapshot of the same turn
+        :param int width: Map width
+        :param int height: Map height
+        :param float cell_size: Width and height of a grid cell
+        """
+        self.entities = ships + planets
+        self.cell_size = cell_size
+        self.columns = max(1, int(math.ceil(width / cell_size)))
+        self.rows = max(1, int(math.ceil(height / cell_size)))
+
+        self._x = np.concatenate((snapshot.ship_x, snapshot.planet_x))
+        self._y = np.concatenate((snapshot.ship_y, snapshot.planet_y))
+        self._owner = np.concatenate((snapshot.ship_owner, snapshot.planet_owner))
+        self._is_ship = np.arange(len(self.entities)) < len(ships)
+        self._ship_rows = snapshot.ship_rows
+        self._planet_rows = snapshot.planet_rows
+        self._planet_offset = len(ships)
+
+        columns = np.clip((self._x // cell_size).astype(np.int64), 0, self.columns - 1)
+        rows = np.clip((self._y // cell_size).astype(np.int64), 0, self.rows - 1)
+        cells = rows * self.columns + columns
+        # Entity rows grouped by cell, with each cell's group starting at _cell_start[cell]
+        self._by_cell = np.argsort(cells, kind='stable')
+        self._cell_start = np.searchsorted(cells[self._by_cell], np.arange(self.columns * self.rows + 1))
+
+    def within(self, x, y, distance, kind=None, owners=None, exclude=None):
+        """
+        :param float x: The x-coordinate of the point
+        :param float y: The y-coordinate of the point
+        :param float distance: How far from the point to look
+        :param kind: Only return entities of this class (entity.Ship or entity.Planet), None for both
+        :param owners: Only return entities owned by one of these player ids (snapshot.NO_ID for unowned planets),
+            None for any owner
+        :param exclude: An entity to leave out, usually the one the query is centred on
+        :return: The matching entities within distance of the point, nearest first, and their distances
+        :rtype: (list[entity.Entity], list[float])
+        """
+        rows = self._rows_in_cells(x - distance, y - distance, x + distance, y + distance)
+        return self._select(rows, x, y, kind, owners, exclude, distance)
+
+    def nearest(self, x, y, k=None, kind=None, owners=None, exclude=None):
+        """
+        :param float x: The x-coordinate of the point
+        :param float y: The y-coordinate of the point
+        :param int k: How many entities to return, None for all of the matching ones
+        :param kind: As for within()
+        :param owners: As for within()
+        :param exclude: As for within()
+        :return: The k matching entities nearest the point, nearest first, and their distances
+        :rtype: (list[entity.Entity], list[float])
+        """
+        if k is None:
+            return self._select(np.arange(len(self.entities)), x, y, kind, owners, exclude)
+
+        # Grow a square of cells around the point until it holds k entities nearer than the square's edge
+        column = min(max(int(x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        ring = 0
+        while True:
+            rows = self._rows_in_cell_range(column - ring, row - ring, column + ring, row + ring)
+            entities, distances = self._select(rows, x, y, kind, owners, exclude)
+            covers_map = ring >= max(self.columns, self.rows)
+            if covers_map or (len(entities) >= k and distances[k - 1] <= ring * self.cell_size):
+                return entities[:k], distances[:k]
+            ring += 1
+
+    def _rows_in_cells(self, min_x, min_y, max_x, max_y):
+        """
+        :return: The entity rows in the cells overlapping the box
+        :rtype: numpy.ndarray
+        """
+        size = self.cell_size
+        return self._rows_in_cell_range(int(min_x // size), int(min_y // size), int(max_x // size), int(max_y // size))
+
+    def _rows_in_cell_range(self, first_column, first_row, last_column, last_row):
+        """
+        :return: The entity rows in the given block of cells, clipped to the grid
+        :rtype: numpy.ndarray
+        """
+        first_column = max(first_column, 0)
+        last_column = min(last_column, self.columns - 1)
+        first_row = max(first_row, 0)
+        last_row = min(last_row, self.rows - 1)
+        if first_column > last_column or first_row > last_row:
+            return np.empty(0, dtype=np.int64)
+
+        start = self._cell_start
+        groups = [self._by_cell[start[row * self.columns + first_column]:start[row * self.columns + last_column + 1]]
+                  for row in range(first_row, last_row + 1)]
+        return np.concatenate(groups)
+
+    def _row_of(self, excluded):
+        if isinstance(excluded, entity.Planet):
+            row = self._planet_rows.get(excluded.id)
+            return None if row is None else row + self._planet_offset
+        return self._ship_rows.get(excluded.id)
+
+    def _select(self, rows, x, y, kind, owners, exclude, max_distance=None):
+        """
+        :return: The entities of the given rows that pass the filters, nearest first, and their distances
+        :rtype: (list[entity.Entity], list[float])
+        """
+        keep = np.ones(len(rows), dtype=bool)
+        if kind is entity.Ship:
+            keep &= self._is_ship[rows]
+        elif kind is entity.Planet:
+            keep &= ~self._is_ship[rows]
+        if owners is not None:
+            keep &= np.isin(self._owner[rows], list(owners))
+        excluded_row = None if exclude is None else self._row_of(exclude)
+        if excluded_row is not None:
+            keep &= rows != excluded_row
+        rows = np.sort(rows[keep])
+
+        distances = np.sqrt((self._x[rows] - x) ** 2 + (self._y[rows] - y) ** 2)
+        if max_distance is not None:
+            close = distances <= max_distance
+            rows, distances = rows[close], distances[close]
+
+        order = np.argsort(distances, kind='stable')
+        return [self.entities[row] for row in rows[order].tolist()], distances[order].tolist()
@@ -1,58 +1,79 @@
 import sys
 import logging
-import copy
 
-from . import game_map
+from . import game_map, world
 
 
-class Game:
+#: Initial size of the outgoing command buffer, grown if a turn ever needs more
+COMMAND_BUFFER_SIZE = 16384
+
+
+class Transport:
     """
-    :ivar map: Current map representation
-    :ivar initial_map: The initial version of the map before game starts
+    Line based byte transport to the Halite engine. Frames are returned as bytes (int() and float() parse bytes
+    tokens directly, so nothing is decoded) and each turn's commands are written with a single write and flush
+    from a reused buffer.
+
+    Any binary file-like objects can be passed in, e.g. io.BytesIO in place of the engine.
     """
-    @staticmethod
-    def _send_string(s):
-        """
-        Send data to the game. Call :function:`done_sending` once finished.
 
-        :param str s: String to send
-        :return: nothing
+    def __init__(self, reader=None, writer=None):
+        """
+        :param reader: Binary stream to read frames from, defaults to stdin
+        :param writer: Binary stream to write commands to, defaults to stdout
         """
-        sys.stdout.write(s)
+        self._reader = reader if reader is not None else sys.stdin.buffer
+        self._writer = writer if writer is not None else sys.stdout.buffer
+        self._buffer = bytearray(COMMAND_BUFFER_SIZE)
 
-    @staticmethod
-    def _done_sending():
+    def read_line(self):
         """
-        Finish sending commands to the game.
+        Read input from the game.
 
-        :return: nothing
+        :return: The input read from the Halite engine, without the trailing newline
+        :rtype: bytes
         """
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+        return self._reader.readline().rstrip(b'\n')
 
-    @staticmethod
-    def _get_string():
+    def send_line(self, commands):
         """
-        Read input from the game.
+        Send one line to the game made up of the given commands separated by spaces.
 
-        :return: The input read from the Halite engine
-        :rtype: str
+        :param list[str] commands: The commands to send
+        :return: nothing
         """
-        result = sys.stdin.readline().rstrip('\n')
-        return result
+        buffer = self._buffer
+        position = 0
+        for command in commands:
+            data = command.encode()
+            end = position + len(data)
+            while end >= len(buffer):
+                buffer.extend(bytes(len(buffer)))
+            buffer[position:end] = data
+            buffer[end] = 32    # ' '
+            position = end + 1
+        if position:
+            position -= 1       # Replace the last separator with the newline
+        buffer[position] = 10   # '\n'
+
+        with memoryview(buffer) as view:
+            self._writer.write(view[:position + 1])
+        self._writer.flush()
 
-    @staticmethod
-    def send_command_queue(command_queue):
+
+class Game:
+    """
+    :ivar map: Current map representation
+    :ivar static_world: The fixed geometry of the game (planets, map bounds, spawns), captured before it starts
+    """
+    def send_command_queue(self, command_queue):
         """
         Issue the given list of commands.
 
         :param list[str] command_queue: List of commands to send the Halite engine
         :return: nothing
         """
-        for command in command_queue:
-            Game._send_string(command)
-
-        Game._done_sending()
+        self._transport.send_line(command_queue)
 
     @staticmethod
     def _set_up_logging(tag, name):
@@ -67,20 +88,24 @@ class Game:
         logging.basicConfig(filename=log_file, level=logging.DEBUG, filemode='w')
         logging.info("Initialized bot {}".format(name))
 
-    def __init__(self, name):
+    def __init__(self, name, transport=None):
         """
         Initialize the bot with the given name.
 
         :param name: The name of the bot.
+        :param Transport transport: Connection to the engine, defaults to stdin/stdout
         """
         self._name = name
         self._send_name = False
-        tag = int(self._get_string())
+        self._transport = transport if transport is not None else Transport()
+        tag = int(self._transport.read_line())
         Game._set_up_logging(tag, name)
-        width, height = [int(x) for x in self._get_string().strip().split()]
+        width, height = [int(x) for x in self._transport.read_line().split()]
         self.map = game_map.Map(tag, width, height)
         self.update_map()
-        self.initial_map = copy.deepcopy(self.map)
+        self.static_world = world.StaticWorld.from_map(self.map)
+        self.map.static_world = self.static_world
+        self.map.planet_index = world.PlanetIndex(self.static_world)
         self._send_name = True
 
     def update_map(self):
@@ -91,9 +116,8 @@ class Game:
         :rtype: game_map.Map
         """
         if self._send_name:
-            self._send_string(self._name)
-            self._done_sending()
+            self._transport.send_line([self._name])
             self._send_name = False
         logging.info("---NEW TURN---")
-        self.map._parse(self._get_string())
+        self.map._parse(self._transport.read_line())
         return self.map
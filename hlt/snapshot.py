@@ -0,0 +1,143 @@
+import numpy as np
+
+
+#: Owner/planet value used in the arrays when there is none
+NO_ID = -1
+
+
+class Snapshot:
+    """
+    Struct-of-arrays view of a parsed map, rebuilt every turn alongside the Ship/Planet objects so that
+    vectorised code does not have to walk the object model attribute by attribute.
+
+    Row i of every ship_* array describes the same ship, and likewise for planet_*.
+
+    :ivar ship_ids: Ship ids
+    :ivar ship_x: Ship x-coordinates
+    :ivar ship_y: Ship y-coordinates
+    :ivar ship_radius: Ship radii
+    :ivar ship_health: Ship health
+    :ivar ship_owner: Player id owning each ship
+    :ivar ship_docking_status: DockingStatus value of each ship
+    :ivar ship_planet: Id of the planet each ship is docked to, NO_ID if undocked
+    :ivar ship_cooldown: Weapon cooldown of each ship
+    :ivar ship_rows: Dict of ship id to row
+    :ivar planet_ids: Planet ids
+    :ivar planet_x: Planet x-coordinates
+    :ivar planet_y: Planet y-coordinates
+    :ivar planet_radius: Planet radii
+    :ivar planet_health: Planet health
+    :ivar planet_owner: Player id owning each planet, NO_ID if unowned
+    :ivar planet_docking_spots: Max number of ships that can dock at each planet
+    :ivar planet_rows: Dict of planet id to row
+    """
+
+    def __init__(self, ships, planets):
+        """
+        :param list[entity.Ship] ships: All ships on the map
+        :param list[entity.Planet] planets: All planets on the map
+        """
+        count = len(ships)
+        self.ship_ids = np.fromiter((ship.id for ship in ships), dtype=np.int32, count=count)
+        self.ship_x = np.fromiter((ship.x for ship in ships), dtype=np.float64, count=count)
+        self.ship_y = np.fromiter((ship.y for ship in ships), dtype=np.float64, count=count)
+        self.ship_radius = np.fromiter((ship.radius for ship in ships), dtype=np.float64, count=count)
+        self.ship_health = np.fromiter((ship.health for ship in ships), dtype=np.int32, count=count)
+        self.ship_owner = np.fromiter((_id_of(ship.owner) for ship in ships), dtype=np.int32, count=count)
+        self.ship_docking_status = np.fromiter((ship.docking_status.value for ship in ships),
+                                               dtype=np.int8, count=count)
+        self.ship_planet = np.fromiter((_id_of(ship.planet) for ship in ships), dtype=np.int32, count=count)
+        self.ship_cooldown = np.fromiter((ship._weapon_cooldown for ship in ships), dtype=np.int32, count=count)
+        self.ship_rows = {ship.id: row for row, ship in enumerate(ships)}
+
+        count = len(planets)
+        self.planet_ids = np.fromiter((planet.id for planet in planets), dtype=np.int32, count=count)
+        self.planet_x = np.fromiter((planet.x for planet in planets), dtype=np.float64, count=count)
+        self.planet_y = np.fromiter((planet.y for planet in planets), dtype=np.float64, count=count)
+        self.planet_radius = np.fromiter((planet.radius for planet in planets), dtype=np.float64, count=count)
+        self.planet_health = np.fromiter((planet.health for planet in planets), dtype=np.int32, count=count)
+        self.planet_owner = np.fromiter((_id_of(planet.owner) for planet in planets), dtype=np.int32, count=count)
+        self.planet_docking_spots = np.fromiter((planet.num_docking_spots for planet in planets),
+                                                dtype=np.int32, count=count)
+        self.planet_rows = {planet.id: row for row, planet in enumerate(planets)}
+
+    def ship_row(self, ship_id):
+        """
+        :param int ship_id: The id of the ship
+        :return: The row of the ship in the ship_* arrays, None if the ship does not exist
+        :rtype: int
+        """
+        return self.ship_rows.get(ship_id)
+
+    def planet_row(self, planet_id):
+        """
+        :param int planet_id: The id of the planet
+        :return: The row of the planet in the planet_* arrays, None if the planet does not exist
+        :rtype: int
+        """
+        return self.planet_rows.get(planet_id)
+
+    def ships_owned_by(self, player_id):
+        """
+        :param int player_id: The id of the player
+        :return: Boolean mask over the ship rows owned by the player
+        :rtype: numpy.ndarray
+        """
+        return self.ship_owner == player_id
+
+
+def _id_of(entity):
+    """
+    Once linked, owners and docked planets are objects; before linking (or when absent) they are ids or None.
+
+    :return: The id of the entity, NO_ID if there is none
+    :rtype: int
+    """
+    if entity is None:
+        return NO_ID
+    return getattr(entity, 'id', entity)
+
+
+class Diff:
+    """
+    The ship and planet ids that changed between two consecutive snapshots, so code that keeps state between
+    turns can update only what changed.
+
+    :ivar spawned: Ids of ships that did not exist last turn
+    :ivar destroyed: Ids of ships that no longer exist
+    :ivar moved: Ids of surviving ships whose position changed
+    :ivar docking_changed: Ids of surviving ships whose docking status changed
+    :ivar destroyed_planets: Ids of planets that no longer exist
+    :ivar owner_changed_planets: Ids of surviving planets whose owner changed
+    """
+
+    def __init__(self, previous, current):
+        """
+        :param Snapshot previous: Last turn's snapshot, None on the first turn
+        :param Snapshot current: This turn's snapshot
+        """
+        if previous is None:
+            self.spawned = set(current.ship_rows)
+            self.destroyed = set()
+            self.moved = set()
+            self.docking_changed = set()
+            self.destroyed_planets = set()
+            self.owner_changed_planets = set()
+            return
+
+        self.spawned = current.ship_rows.keys() - previous.ship_rows.keys()
+        self.destroyed = previous.ship_rows.keys() - current.ship_rows.keys()
+        self.destroyed_planets = previous.planet_rows.keys() - current.planet_rows.keys()
+
+        ids, old_rows, new_rows = np.intersect1d(previous.ship_ids, current.ship_ids,
+                                                 assume_unique=True, return_indices=True)
+        moved = (previous.ship_x[old_rows] != current.ship_x[new_rows]) | \
+                (previous.ship_y[old_rows] != current.ship_y[new_rows])
+        docking_changed = previous.ship_docking_status[old_rows] != current.ship_docking_status[new_rows]
+        self.moved = set(ids[moved].tolist())
+        self.docking_changed = set(ids[docking_changed].tolist())
+
+        ids, old_rows, new_rows = np.intersect1d(previous.planet_ids, current.planet_ids,
+                                                 assume_unique=True, return_indices=True)
+        owner_changed = previous.planet_owner[old_rows] != current.planet_owner[new_rows]
+        self.owner_changed_planets = set(ids[owner_changed].tolist())
@@ -0,0 +1,200 @@
+import math
+from types import MappingProxyType
+
+import numpy as np
+
+
+#: Width and height of a PlanetIndex grid cell
+PLANET_CELL_SIZE = 16
+
+
+class StaticWorld:
+    """
+    The parts of the game that never change once it has started, captured from the first frame. It is built
+    once by Game and shared by reference; the arrays are read-only and attributes cannot be reassigned.
+
+    :ivar width: Map width
+    :ivar height: Map height
+    :ivar planet_ids: Planet ids
+    :ivar planet_x: Planet x-coordinates
+    :ivar planet_y: Planet y-coordinates
+    :ivar planet_radius: Planet radii
+    :ivar planet_docking_spots: Max number of ships that can dock at each planet
+    :ivar planet_rows: Mapping of planet id to row in the planet_* arrays
+    :ivar spawn_positions: Mapping of player id to the (x, y) centre of that player's starting ships
+    """
+    __slots__ = ('width', 'height', 'planet_ids', 'planet_x', 'planet_y', 'planet_radius',
+                 'planet_docking_spots', 'planet_rows', 'spawn_positions')
+
+    def __init__(self, width, height, planet_ids, planet_x, planet_y, planet_radius, planet_docking_spots,
+                 spawn_positions):
+        _set = super().__setattr__
+        _set('width', width)
+        _set('height', height)
+        _set('planet_ids', _read_only(planet_ids, np.int32))
+        _set('planet_x', _read_only(planet_x, np.float64))
+        _set('planet_y', _read_only(planet_y, np.float64))
+        _set('planet_radius', _read_only(planet_radius, np.float64))
+        _set('planet_docking_spots', _read_only(planet_docking_spots, np.int32))
+        _set('planet_rows', MappingProxyType({int(planet_id): row for row, planet_id in enumerate(planet_ids)}))
+        _set('spawn_positions', MappingProxyType(dict(spawn_positions)))
+
+    @classmethod
+    def from_map(cls, game_map):
+        """
+        :param game_map.Map game_map: The map parsed from the first frame
+        :return: The static world of the game
+        :rtype: StaticWorld
+        """
+        snapshot = game_map.snapshot
+        spawn_positions = {}
+        for player in game_map.all_players():
+            mask = snapshot.ships_owned_by(player.id)
+            if mask.any():
+                spawn_positions[player.id] = (float(snapshot.ship_x[mask].mean()), float(snapshot.ship_y[mask].mean()))
+
+        return cls(game_map.width, game_map.height,
+                   snapshot.planet_ids, snapshot.planet_x, snapshot.planet_y,
+                   snapshot.planet_radius, snapshot.planet_docking_spots,
+                   spawn_positions)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('StaticWorld is immutable')
+
+    def __reduce__(self):
+        return (StaticWorld, (self.width, self.height,
+                              self.planet_ids, self.planet_x, self.planet_y,
+                              self.planet_radius, self.planet_docking_spots,
+                              dict(self.spawn_positions)))
+
+    def within_bounds(self, x, y):
+        """
+        :param float x: The x-coordinate
+        :param float y: The y-coordinate
+        :return: True if the point is on the map
+        :rtype: bool
+        """
+        return 0 <= x < self.width and 0 <= y < self.height
+
+
+def _read_only(values, dtype):
+    """
+    :return: A read-only copy of the values
+    :rtype: numpy.ndarray
+    """
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class PlanetIndex:
+    """
+    Uniform grid over the planets, built once from the StaticWorld since planets never move. Each cell lists the
+    planets whose bounding box overlaps it, so a query only looks at the planets in the cells it touches.
+    Destroyed planets are marked dead rather than removed.
+
+    Queries are conservative: they can return planets that turn out to be out of range, but never miss one, so
+    callers still do their exact test on what comes back.
+    """
+
+    def __init__(self, static_world, cell_size=PLANET_CELL_SIZE):
+        """
+        :param StaticWorld static_world: The planets to index
+        :param float cell_size: Width and height of a grid cell
+        """
+        self.cell_size = cell_size
+        self.columns = max(1, int(math.ceil(static_world.width / cell_size)))
+        self.rows = max(1, int(math.ceil(static_world.height / cell_size)))
+        self.planet_ids = static_world.planet_ids
+        self.alive = np.ones(len(self.planet_ids), dtype=bool)
+
+        self._planet_x = static_world.planet_x
+        self._planet_y = static_world.planet_y
+        self._planet_radius = static_world.planet_radius
+        # A dict rather than the world's read-only view, which can't be pickled with the map
+        self._planet_rows = dict(static_world.planet_rows)
+
+        self._cells = [[] for _ in range(self.columns * self.rows)]
+        self._cell_planets = np.zeros((self.columns * self.rows, len(self.planet_ids)), dtype=bool)
+        for row in range(len(self.planet_ids)):
+            x, y, radius = self._planet_x[row], self._planet_y[row], self._planet_radius[row]
+            for cell in self._cells_overlapping(x - radius, y - radius, x + radius, y + radius):
+                self._cells[cell].append(row)
+                self._cell_planets[cell, row] = True
+
+        self._cell_x = (np.arange(self.columns * self.rows) % self.columns + 0.5) * cell_size
+        self._cell_y = (np.arange(self.columns * self.rows) // self.columns + 0.5) * cell_size
+        self._cell_reach = math.sqrt(2) * cell_size / 2
+
+    def _cells_overlapping(self, min_x, min_y, max_x, max_y):
+        """
+        :return: The cells overlapping the box, clipped to the map
+        :rtype: list[int]
+        """
+        first_column = min(max(int(min_x // self.cell_size), 0), self.columns - 1)
+        last_column = min(max(int(max_x // self.cell_size), 0), self.columns - 1)
+        first_row = min(max(int(min_y // self.cell_size), 0), self.rows - 1)
+        last_row = min(max(int(max_y // self.cell_size), 0), self.rows - 1)
+        return [row * self.columns + column
+                for row in range(first_row, last_row + 1)
+                for column in range(first_column, last_column + 1)]
+
+    def mark_destroyed(self, planet_ids):
+        """
+        :param planet_ids: Ids of planets that have been destroyed
+        :return: nothing
+        """
+        for planet_id in planet_ids:
+            row = self._planet_rows.get(planet_id)
+            if row is not None:
+                self.alive[row] = False
+
+    def near(self, x, y, distance):
+        """
+        :param float x: The x-coordinate of the point
+        :param float y: The y-coordinate of the point
+        :param float distance: How far from the point to look, planet radii are added on top
+        :return: Ids of the living planets that may be within distance of the point, in index order
+        :rtype: list[int]
+        """
+        rows = set()
+        for cell in self._cells_overlapping(x - distance, y - distance, x + distance, y + distance):
+            rows.update(self._cells[cell])
+        return [int(self.planet_ids[row]) for row in sorted(rows) if self.alive[row]]
+
+    def along(self, start_x, start_y, end_x, end_y, fudge=0.5):
+        """
+        :param float start_x: The x-coordinate of the start of the segment
+        :param float start_y: The y-coordinate of the start of the segment
+        :param float end_x: The x-coordinate of the end of the segment
+        :param float end_y: The y-coordinate of the end of the segment
+        :param float fudge: How far from the segment to look, planet radii are added on top
+        :return: Ids of the living planets that may be within fudge of the segment, in index order
+        :rtype: list[int]
+        """
+        dx = end_x - start_x
+        dy = end_y - start_y
+        length_squared = dx * dx + dy * dy
+        if length_squared == 0.0:
+            t = 0.0
+        else:
+            t = np.clip(((self._cell_x - start_x) * dx + (self._cell_y - start_y) * dy) / length_squared, 0.0, 1.0)
+        distance = np.hypot(self._cell_x - (start_x + t * dx), self._cell_y - (start_y + t * dy))
+        cells = distance <= self._cell_reach + fudge
+        rows = np.flatnonzero(self._cell_planets[cells].any(axis=0) & self.alive)
+        return self.planet_ids[rows].tolist()
+
+    def nearest(self, x, y):
+        """
+        :param float x: The x-coordinate of the point
+        :param float y: The y-coordinate of the point
+        :return: The id of the living planet with the closest surface, and the distance to it (None, inf if
+            every planet is destroyed)
+        :rtype: (int, float)
+        """
+        if not self.alive.any():
+            return None, math.inf
+        distance = np.hypot(self._planet_x - x, self._planet_y - y) - self._planet_radius
+        distance[~self.alive] = math.inf
+        row = int(distance.argmin())
+        return int(self.planet_ids[row]), float(distance[row])
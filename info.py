@@ -1,7 +1,11 @@
-from collections import OrderedDict
 import logging
 import hlt
 
+
+# Enemy ships further than this from one of our ships are left out of its ship data
+NEARBY_ENEMY_DISTANCE = 50
+
+
 class Info:
     def __init__(self):
         self.turn = -1
@@ -12,7 +16,7 @@ class Info:
 
         self.team_ships = self.game_map.get_me().all_ships()
         self.all_ships = self.game_map._all_ships()
-        self.enemy_ships = [ship for ship in self.game_map._all_ships() if ship not in self.team_ships]
+        self.enemy_ships = [ship for ship in self.all_ships if ship.owner is not self.game_map.get_me()]
 
         self.my_ship_count = len(self.team_ships)
         self.enemy_ship_count = len(self.enemy_ships)
@@ -50,50 +54,21 @@ class Info:
 
         self.all_ship_data = []
 
-        for ship in self.game_map.get_me().all_ships():
+        neighbours = self.game_map.neighbours
+        Ship = hlt.entity.Ship
+        Planet = hlt.entity.Planet
+        team = [self.my_id]
+        self.enemy_ids = [player.id for player in self.game_map.all_players() if player.id != self.my_id]
+
+        for ship in self.team_ships:
             ship_data = {}
             ship_data['ship_id'] = ship.id
-            entities_by_distance = self.game_map.nearby_entities_by_distance(ship)
-            entities_by_distance = OrderedDict(sorted(entities_by_distance.items(), key=lambda t: t[0]))
-            #
-            # ship_data['closest_empty_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-            #                          isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and not
-            #                          entities_by_distance[distance][0].is_owned()]
-            # ship_data['closest_empty_planet_distances'] = [distance for distance in entities_by_distance if
-            #                                   isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and not
-            #                                   entities_by_distance[distance][0].is_owned()]
-            #
-            # ship_data['closest_my_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-            #                       isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-            #                       entities_by_distance[distance][0].is_owned() and (
-            #                       entities_by_distance[distance][0].owner.id == self.game_map.get_me().id)]
-            # ship_data['closest_my_planets_distances'] = [distance for distance in entities_by_distance if
-            #                                 isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-            #                                 entities_by_distance[distance][0].is_owned() and (
-            #                                 entities_by_distance[distance][0].owner.id == self.game_map.get_me().id)]
-            #
-            # ship_data['closest_enemy_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-            #                          isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-            #                          entities_by_distance[distance][0] not in ship_data['closest_my_planets'] and
-            #                          entities_by_distance[distance][0] not in ship_data['closest_empty_planets']]
-            # ship_data['closest_enemy_planets_distances'] = [distance for distance in entities_by_distance if
-            #                                    isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-            #                                    entities_by_distance[distance][0] not in ship_data['closest_my_planets'] and
-            #                                    entities_by_distance[distance][0] not in ship_data['closest_empty_planets']]
-            #
-            # ship_data['closest_team_ships'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-            #                       isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-            #                       entities_by_distance[distance][0] in self.team_ships]
-            # ship_data['closest_team_ships_distances'] = [distance for distance in entities_by_distance if
-            #                                 isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-            #                                 entities_by_distance[distance][0] in self.team_ships]
-            #
-            ship_data['closest_enemy_ships'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-                                                isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                                entities_by_distance[distance][0] not in self.team_ships]
-            ship_data['closest_enemy_ships_distances'] = [distance for distance in entities_by_distance if
-                                                          isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                                          entities_by_distance[distance][0] not in self.team_ships]
+            # Only the enemy ships close enough to threaten the ship are listed, but always at least the nearest one
+            enemy_ships, enemy_distances = neighbours.within(ship.x, ship.y, NEARBY_ENEMY_DISTANCE, Ship, self.enemy_ids)
+            if not enemy_ships:
+                enemy_ships, enemy_distances = neighbours.nearest(ship.x, ship.y, 1, Ship, self.enemy_ids)
+            ship_data['closest_enemy_ships'] = enemy_ships
+            ship_data['closest_enemy_ships_distances'] = enemy_distances
 
             self.all_ship_data.append(ship_data)
 
@@ -104,9 +79,6 @@ class Info:
             planet_data = {}
             planet_data['planet_id'] = planet.id
 
-            entities_by_distance = self.game_map.nearby_entities_by_distance(planet)
-            entities_by_distance = OrderedDict(sorted(entities_by_distance.items(), key=lambda t: t[0]))
-
             if not planet.is_owned():
                 planet_data['type'] = 'empty'
             elif planet.owner.id == self.game_map.get_me().id:
@@ -114,54 +86,16 @@ class Info:
             else:
                 planet_data['type'] = 'enemy'
 
-            planet_data['closest_team_ships'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-                                                 isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                                 entities_by_distance[distance][0] in self.team_ships]
-            planet_data['closest_team_ships_distances'] = [distance for distance in entities_by_distance if
-                                                           isinstance(entities_by_distance[distance][0],
-                                                                      hlt.entity.Ship) and
-                                                           entities_by_distance[distance][0] in self.team_ships]
-            planet_data['closest_enemy_ships'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-                                                  isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                                  entities_by_distance[distance][0] not in self.team_ships]
-            planet_data['closest_enemy_ships_distances'] = [distance for distance in entities_by_distance if
-                                                            isinstance(entities_by_distance[distance][0],
-                                                                       hlt.entity.Ship) and
-                                                            entities_by_distance[distance][0] not in self.team_ships]
-            planet_data['closest_empty_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance
-                                                    if
-                                                    isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and not
-                                                    entities_by_distance[distance][0].is_owned()]
-            planet_data['closest_empty_planet_distances'] = [distance for distance in entities_by_distance if
-                                                             isinstance(entities_by_distance[distance][0],
-                                                                        hlt.entity.Planet) and not
-                                                             entities_by_distance[distance][0].is_owned()]
-            planet_data['closest_my_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-                                                 isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-                                                 entities_by_distance[distance][0].is_owned() and (
-                                                     entities_by_distance[distance][
-                                                         0].owner.id == self.game_map.get_me().id)]
-            planet_data['closest_my_planets_distances'] = [distance for distance in entities_by_distance if
-                                                           isinstance(entities_by_distance[distance][0],
-                                                                      hlt.entity.Planet) and
-                                                           entities_by_distance[distance][0].is_owned() and (
-                                                               entities_by_distance[distance][
-                                                                   0].owner.id == self.game_map.get_me().id)]
-
-            planet_data['closest_enemy_planets'] = [entities_by_distance[distance][0] for distance in entities_by_distance
-                                                    if
-                                                    isinstance(entities_by_distance[distance][0], hlt.entity.Planet) and
-                                                    entities_by_distance[distance][0] not in planet_data[
-                                                        'closest_my_planets'] and
-                                                    entities_by_distance[distance][0] not in planet_data[
-                                                        'closest_empty_planets']]
-            planet_data['closest_enemy_planets_distances'] = [distance for distance in entities_by_distance if
-                                                              isinstance(entities_by_distance[distance][0],
-                                                                         hlt.entity.Planet) and
-                                                              entities_by_distance[distance][0] not in planet_data[
-                                                                  'closest_my_planets'] and
-                                                              entities_by_distance[distance][0] not in planet_data[
-                                                                  'closest_empty_planets']]
+            planet_data['closest_team_ships'], planet_data['closest_team_ships_distances'] = \
+                neighbours.nearest(planet.x, planet.y, kind=Ship, owners=team)
+            planet_data['closest_enemy_ships'], planet_data['closest_enemy_ships_distances'] = \
+                neighbours.nearest(planet.x, planet.y, kind=Ship, owners=self.enemy_ids)
+            planet_data['closest_empty_planets'], planet_data['closest_empty_planet_distances'] = \
+                neighbours.nearest(planet.x, planet.y, kind=Planet, owners=[hlt.snapshot.NO_ID], exclude=planet)
+            planet_data['closest_my_planets'], planet_data['closest_my_planets_distances'] = \
+                neighbours.nearest(planet.x, planet.y, kind=Planet, owners=team, exclude=planet)
+            planet_data['closest_enemy_planets'], planet_data['closest_enemy_planets_distances'] = \
+                neighbours.nearest(planet.x, planet.y, kind=Planet, owners=self.enemy_ids, exclude=planet)
 
             planet_data['enemies_within_50'] = sum(1 for x in planet_data['closest_enemy_ships_distances'] if x < 50)
             planet_data['enemies_within_100'] = sum(1 for x in planet_data['closest_enemy_ships_distances'] if x < 100)
@@ -182,26 +116,15 @@ class Info:
 
         self.all_planet_data = sorted(self.all_planet_data, key=lambda t: t['closest_team_ships_distances'][0])
 
-        all_ships = []
-        for player in self.game_map.all_players():
-            if player != self.game_map.get_me():
-                all_ships = all_ships + player.all_ships()
-
         self.all_enemy_ships = []
-        for ship in all_ships:
+        for ship in self.enemy_ships:
             ship_data = {}
             ship_data['ship_id'] = ship.id
             ship_data['owner'] = ship.owner
-            entities_by_distance = self.game_map.nearby_entities_by_distance(ship)
-            entities_by_distance = OrderedDict(sorted(entities_by_distance.items(), key=lambda t: t[0]))
-
-            ship_data['closest_team_ships'] = [entities_by_distance[distance][0] for distance in entities_by_distance if
-                                               isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                               entities_by_distance[distance][0] in self.team_ships]
-            ship_data['closest_team_ships_distances'] = [distance for distance in entities_by_distance if
-                                                         isinstance(entities_by_distance[distance][0], hlt.entity.Ship) and
-                                                         entities_by_distance[distance][0] in self.team_ships]
+            # Only the nearest of our ships, which is all the ordering below needs
+            ship_data['closest_team_ships'], ship_data['closest_team_ships_distances'] = \
+                neighbours.nearest(ship.x, ship.y, 1, Ship, team)
 
             self.all_enemy_ships.append(ship_data)
 
-        self.all_enemy_ships = sorted(self.all_enemy_ships, key=lambda t: t['closest_team_ships_distances'][0])
\ No newline at end of file
+        self.all_enemy_ships = sorted(self.all_enemy_ships, key=lambda t: t['closest_team_ships_distances'][0])
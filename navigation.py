@@ -0,0 +1,368 @@
+"""
+Routes around planets for ships whose straight path is blocked.
+
+A visibility graph is built once per game from the StaticWorld. Its nodes are waypoints just outside every planet,
+and its edges join the waypoints that can see each other. A route from a ship to its target is an A* search over
+that graph, with the ship and the target joined to the waypoints they can see.
+
+Targets that many ships head for at once get a flow field instead, shared by all of them.
+"""
+import heapq
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+import hlt
+
+
+#: Waypoints placed around each planet, the corners of a polygon around its inflated circle
+WAYPOINTS_PER_PLANET = 12
+#: Room kept between a ship's centre and a planet's surface, the ship radius plus the navigation fudge
+PLANET_CLEARANCE = hlt.constants.SHIP_RADIUS + 0.5
+#: Extra room between the waypoint polygon and the inflated planet, so a polygon side doesn't touch it
+WAYPOINT_MARGIN = 0.5
+#: Waypoints whose edges are tested together while building the graph
+EDGE_BLOCK = 32
+
+
+class PlanetGraph:
+    """
+    The visibility graph over the planets of one game. Planets are treated as circles inflated by
+    PLANET_CLEARANCE. Destroyed planets are still obstacles, so routes stay valid but can be longer than needed
+    late in the game.
+    """
+
+    def __init__(self, static_world):
+        """
+        :param hlt.world.StaticWorld static_world: The planets to route around
+        """
+        self.static_world = static_world
+        self._planet_x = static_world.planet_x
+        self._planet_y = static_world.planet_y
+        self._planet_radius = static_world.planet_radius
+        self._reach = self._planet_radius + PLANET_CLEARANCE
+
+        # Corners of a polygon whose sides stay WAYPOINT_MARGIN outside the inflated circle
+        angles = np.arange(WAYPOINTS_PER_PLANET) * (2 * math.pi / WAYPOINTS_PER_PLANET)
+        corner_distance = (self._reach + WAYPOINT_MARGIN) / math.cos(math.pi / WAYPOINTS_PER_PLANET)
+        node_x = (self._planet_x[:, np.newaxis] + corner_distance[:, np.newaxis] * np.cos(angles)).ravel()
+        node_y = (self._planet_y[:, np.newaxis] + corner_distance[:, np.newaxis] * np.sin(angles)).ravel()
+
+        # Drop the waypoints off the map or inside another planet
+        inside = np.hypot(node_x[:, np.newaxis] - self._planet_x, node_y[:, np.newaxis] - self._planet_y) <= self._reach
+        usable = ~inside.any(axis=1)
+        usable &= (node_x > 0) & (node_y > 0) & (node_x < static_world.width) & (node_y < static_world.height)
+        self.node_x = node_x[usable]
+        self.node_y = node_y[usable]
+
+        # Test the segments from a block of waypoints to every later waypoint at a time
+        count = len(self.node_x)
+        self.edges = [[] for _ in range(count)]
+        for first in range(0, count, EDGE_BLOCK):
+            nodes = np.arange(first, min(first + EDGE_BLOCK, count))
+            others = np.arange(first, count)
+            start_x = np.repeat(self.node_x[nodes], len(others))
+            start_y = np.repeat(self.node_y[nodes], len(others))
+            end_x = np.tile(self.node_x[others], len(nodes))
+            end_y = np.tile(self.node_y[others], len(nodes))
+            blocked = hlt.collision.intersect_segments_circles(start_x, start_y, end_x, end_y, self._planet_x,
+                                                               self._planet_y, self._planet_radius, PLANET_CLEARANCE)
+            visible = ~blocked.any(axis=1).reshape(len(nodes), len(others))
+            visible &= nodes[:, np.newaxis] < others
+            lengths = np.hypot(end_x - start_x, end_y - start_y).reshape(len(nodes), len(others))
+            for row, column in zip(*np.nonzero(visible)):
+                node, other, length = int(nodes[row]), int(others[column]), float(lengths[row, column])
+                self.edges[node].append((other, length))
+                self.edges[other].append((node, length))
+
+    def _visible_from(self, x, y, to_x, to_y, ignore=()):
+        """
+        :param float x: The x-coordinate of the point to look from
+        :param float y: The y-coordinate of the point to look from
+        :param numpy.ndarray to_x: The x-coordinates of the points to look at
+        :param numpy.ndarray to_y: The y-coordinates of the points to look at
+        :param ignore: Rows of planets that don't block the view
+        :return: Whether each point can be seen without passing a planet
+        :rtype: numpy.ndarray
+        """
+        count = len(to_x)
+        blocked = hlt.collision.intersect_segments_circles(
+            np.full(count, x), np.full(count, y), to_x, to_y,
+            self._planet_x, self._planet_y, self._planet_radius, PLANET_CLEARANCE)
+        if len(ignore):
+            blocked[:, list(ignore)] = False
+        return ~blocked.any(axis=1)
+
+    def _planets_around(self, x, y):
+        """
+        :return: Rows of the planets whose inflated circle holds the point (a ship just undocked, or a docked target)
+        :rtype: list[int]
+        """
+        return np.flatnonzero(np.hypot(self._planet_x - x, self._planet_y - y) <= self._reach).tolist()
+
+    def can_see(self, start, end, ignore=()):
+        """
+        :param start: The point to look from (needs x, y)
+        :param end: The point to look at (needs x, y)
+        :param ignore: Rows of planets that don't block the view
+        :return: True if the segment between them passes no planet
+        :rtype: bool
+        """
+        ignore = set(ignore) | set(self._planets_around(start.x, start.y)) | set(self._planets_around(end.x, end.y))
+        return bool(self._visible_from(start.x, start.y, np.array([end.x]), np.array([end.y]), ignore)[0])
+
+    def route(self, start, goal, ignore=()):
+        """
+        Find the shortest route from start to goal through the waypoints.
+
+        :param start: Where the route starts (needs x, y)
+        :param goal: Where the route ends (needs x, y)
+        :param ignore: Rows of planets that don't block the route, e.g. the planet being flown to
+        :return: The waypoints to pass through in order (not including the goal), empty if the goal can be seen
+            from the start, None if there is no route
+        :rtype: list[hlt.entity.Position]
+        """
+        if self.can_see(start, goal, ignore):
+            return []
+
+        start_ignore = set(ignore) | set(self._planets_around(start.x, start.y))
+        goal_ignore = set(ignore) | set(self._planets_around(goal.x, goal.y))
+        from_start = self._visible_from(start.x, start.y, self.node_x, self.node_y, start_ignore)
+        to_goal = self._visible_from(goal.x, goal.y, self.node_x, self.node_y, goal_ignore)
+        goal_distance = np.hypot(self.node_x - goal.x, self.node_y - goal.y)
+        last_legs = {node: goal_distance[node] for node in np.flatnonzero(to_goal).tolist()}
+        if not last_legs:
+            return None
+
+        # A* from every waypoint the start can see, finishing with a leg from a waypoint that can see the goal
+        heuristic = goal_distance.tolist()
+        best = {}
+        came_from = {}
+        queue = []
+        for node in np.flatnonzero(from_start).tolist():
+            cost = math.hypot(self.node_x[node] - start.x, self.node_y[node] - start.y)
+            best[node] = cost
+            came_from[node] = None
+            heapq.heappush(queue, (cost + heuristic[node], cost, node))
+
+        finish = None
+        finish_cost = math.inf
+        while queue:
+            estimate, cost, node = heapq.heappop(queue)
+            if estimate >= finish_cost:
+                break
+            if cost > best[node]:
+                continue
+            if node in last_legs and cost + last_legs[node] < finish_cost:
+                finish, finish_cost = node, cost + last_legs[node]
+            for other, length in self.edges[node]:
+                other_cost = cost + length
+                if other_cost < best.get(other, math.inf):
+                    best[other] = other_cost
+                    came_from[other] = node
+                    heapq.heappush(queue, (other_cost + heuristic[other], other_cost, other))
+
+        if finish is None:
+            return None
+        waypoints = []
+        while finish is not None:
+            waypoints.append(hlt.entity.Position(float(self.node_x[finish]), float(self.node_y[finish])))
+            finish = came_from[finish]
+        return waypoints[::-1]
+
+
+#: Width and height of a flow field cell
+FLOW_CELL_SIZE = 4
+#: Flow fields kept, the least recently used is dropped beyond this
+FLOW_FIELD_CAPACITY = 16
+#: How close to a target ship a cell has to be to count as reaching it
+FLOW_SHIP_REACH = 3 * FLOW_CELL_SIZE
+
+# Steps between cells: the 8 neighbours and the 8 knight moves, which give headings every 22.5 degrees or so
+_FLOW_STEPS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3)
+               if (dx, dy) != (0, 0) and max(abs(dx), abs(dy)) == 1 or {abs(dx), abs(dy)} == {1, 2}]
+
+
+class FlowField:
+    """
+    Distance to one target from every cell of the raster, and where to head from each cell.
+
+    :ivar distance: Path length from the centre of each cell to the target, inf where it can't be reached
+    :ivar aim: (x, y) of the centre of the next cell along the path from each cell, None where the cell is in
+        reach of the target or can't reach it
+    :ivar planet_id: The planet the target is, or is docked to
+    """
+
+    def __init__(self, distance, aim, planet_id):
+        self.distance = distance
+        self.aim = aim
+        self.planet_id = planet_id
+
+
+class FlowFields:
+    """
+    Flow fields towards the targets many of our ships head for at once (planets and docked ships, which don't
+    move). The map is rasterised once with the planets inflated like in PlanetGraph; each field is a wavefront out
+    from the cells in reach of its target, so a ship's heading is a single lookup however many ships share the
+    target. Fields are kept until they're pushed out by newer ones or their planet is destroyed.
+    """
+
+    def __init__(self, static_world, cell_size=FLOW_CELL_SIZE, capacity=FLOW_FIELD_CAPACITY):
+        """
+        :param hlt.world.StaticWorld static_world: The planets to route around
+        :param float cell_size: Width and height of a cell
+        :param int capacity: The most fields to keep
+        """
+        self.static_world = static_world
+        self.cell_size = cell_size
+        self.capacity = capacity
+        self.columns = max(1, int(math.ceil(static_world.width / cell_size)))
+        self.rows = max(1, int(math.ceil(static_world.height / cell_size)))
+        self._fields = OrderedDict()
+
+        # Paths avoid the cells where a ship anywhere in the cell could touch an inflated planet. Ships that end up
+        # in one anyway are still steered out of it, unless its centre is inside the inflated planet (solid)
+        self._cell_x = (np.arange(self.columns) + 0.5) * cell_size
+        self._cell_y = (np.arange(self.rows)[:, np.newaxis] + 0.5) * cell_size
+        reach = static_world.planet_radius + PLANET_CLEARANCE
+        self.blocked = np.zeros((self.rows, self.columns), dtype=bool)
+        self.solid = np.zeros((self.rows, self.columns), dtype=bool)
+        for row in range(len(static_world.planet_ids)):
+            x, y = static_world.planet_x[row], static_world.planet_y[row]
+            self.blocked |= self._within(x, y, reach[row] + cell_size * math.sqrt(2) / 2)
+            self.solid |= self._within(x, y, reach[row])
+
+    def _within(self, x, y, distance):
+        """
+        :return: Which cell centres are within distance of the point
+        :rtype: numpy.ndarray
+        """
+        return (self._cell_x - x) ** 2 + (self._cell_y - y) ** 2 <= distance ** 2
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def invalidate_planets(self, planet_ids):
+        """
+        Drop the fields towards the given planets and the ships docked to them.
+
+        :param planet_ids: Ids of planets that have been destroyed
+        :return: nothing
+        """
+        planet_ids = set(planet_ids)
+        for key in [key for key, field in self._fields.items() if field.planet_id in planet_ids]:
+            del self._fields[key]
+
+    def heading(self, ship, key, target):
+        """
+        :param ship: The ship to steer (needs x, y)
+        :param key: Names the target in the cache, e.g. ('planet', id)
+        :param target: The planet, or docked ship, the field leads to
+        :return: The point to aim for and the path length left, None if the ship is in reach of the target or in a
+            cell the field doesn't cover
+        :rtype: ((float, float), float)
+        """
+        field = self._fields.get(key)
+        if field is None:
+            field = self.build(self.goal(target))
+            self.add(key, field)
+        else:
+            self._fields.move_to_end(key)
+
+        column = min(max(int(ship.x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(ship.y // self.cell_size), 0), self.rows - 1)
+        aim = field.aim[row][column]
+        if aim is None:
+            return None
+        return aim, float(field.distance[row, column])
+
+    def add(self, key, field):
+        """
+        Cache a field, pushing out the least recently used one if there are too many.
+
+        :param key: Names the target in the cache, e.g. ('planet', id)
+        :param FlowField field: The field to the target
+        :return: nothing
+        """
+        self._fields[key] = field
+        self._fields.move_to_end(key)
+        if len(self._fields) > self.capacity:
+            self._fields.popitem(last=False)
+
+    def goal(self, target):
+        """
+        :param target: A planet or a docked ship
+        :return: x, y and reach of the target and the planet it is or is docked to, everything build() needs
+        :rtype: (float, float, float, int)
+        """
+        if isinstance(target, hlt.entity.Planet):
+            return target.x, target.y, target.radius + PLANET_CLEARANCE + 2 * self.cell_size, target.id
+        planet_id = target.planet.id if target.planet is not None else None
+        return target.x, target.y, FLOW_SHIP_REACH, planet_id
+
+    def build(self, goal):
+        """
+        Work out a field without caching it. Only the raster is read, which doesn't change during the game, so
+        fields can be built outside the turn (see Pathfinder.deferred_flow_fields).
+
+        :param goal: The target's goal()
+        :rtype: FlowField
+        """
+        x, y, reach, planet_id = goal
+        goal = self._within(x, y, reach) & ~self.blocked
+
+        distance = np.full((self.rows, self.columns), math.inf)
+        distance[goal] = 0.0
+        steps = [(dx, dy, math.hypot(dx, dy) * self.cell_size) for dx, dy in _FLOW_STEPS]
+        # Relax every free cell from its neighbours until nothing gets shorter
+        while True:
+            best = distance.copy()
+            for dx, dy, length in steps:
+                best = np.minimum(best, self._shifted(distance, dx, dy) + length)
+            best[self.blocked] = math.inf
+            if np.array_equal(best, distance):
+                break
+            distance = best
+
+        # Head for the neighbour the path runs through. Cells on the edge of the blocked area are steered back
+        # out onto the paths, but no path runs through them
+        best_step = np.full((self.rows, self.columns), -1)
+        best_distance = np.full((self.rows, self.columns), math.inf)
+        for index, (dx, dy, length) in enumerate(steps):
+            through = self._shifted(distance, dx, dy) + length
+            shorter = through < best_distance
+            best_step[shorter] = index
+            best_distance[shorter] = through[shorter]
+        edge = self.blocked & ~self.solid
+        distance = np.where(edge, best_distance, distance)
+        best_step[(distance == 0.0) | ~np.isfinite(distance) | self.solid] = -1
+
+        step_x = np.array([dx for dx, _, _ in steps] + [0])
+        step_y = np.array([dy for _, dy, _ in steps] + [0])
+        rows, columns = np.indices((self.rows, self.columns))
+        aim_x = ((columns + step_x[best_step] + 0.5) * self.cell_size).tolist()
+        aim_y = ((rows + step_y[best_step] + 0.5) * self.cell_size).tolist()
+        moving = (best_step >= 0).tolist()
+        aim = [[(x, y) if go else None for x, y, go in zip(*cells)] for cells in zip(aim_x, aim_y, moving)]
+        return FlowField(distance, aim, planet_id)
+
+    def build_all(self, goals):
+        """
+        :param dict goals: goal() of each target by cache key
+        :return: The field to each target by cache key
+        :rtype: dict
+        """
+        return {key: self.build(goal) for key, goal in goals.items()}
+
+    @staticmethod
+    def _shifted(values, dx, dy):
+        """
+        :return: values moved so each cell holds the value of the cell dx, dy from it, inf off the edge
+        :rtype: numpy.ndarray
+        """
+        rows, columns = values.shape
+        shifted = np.full_like(values, math.inf)
+        shifted[max(-dy, 0):rows - max(dy, 0), max(-dx, 0):columns - max(dx, 0)] = \
+            values[max(dy, 0):rows - max(-dy, 0), max(dx, 0):columns - max(-dx, 0)]
+        return shifted
@@ -1,13 +1,28 @@
+import concurrent.futures
 import hlt
-import logging
 import math
+import numpy as np
+import os
+import pickle
+import threading
+import time
+import tracer
 from hlt.entity import Position, Entity
-from collisionmap import process_events, CollisionMap, process_event_one_ship
+from collisionmap import process_events, CollisionMap, EventQueue, process_event_one_ship
+import collections
+from actionspace import ThrustEvaluator
+
+from navigation import PlanetGraph, FlowFields
 
 # PLANET_NAVIGATION_FUDGE = 0.5   # Ship radius
 PLANET_DOCK_DISTANCE = 2        # Radius are added
 SHIP_AVOID_DISTANCE = 2         # Radius are added
-VELOCITY_STEPS = 50
+FLOW_FIELD_MIN_SHIPS = 4        # Ships heading for a target in a turn before it gets a flow field
+FLOW_FIELDS_PER_TURN = 2        # New flow fields built in a turn, the rest wait for the next one
+POOL_COMPONENT_SHIPS = 16       # Ships in a group of conflicting ships before it's resolved in the process pool
+POOL_PARENT_CHECK = 1.0         # Seconds between pool processes checking the bot is still running
+
+trace = tracer.get_tracer('pathfinder')
 
 
 def make_angle_positive(angle):
@@ -15,15 +30,57 @@ def make_angle_positive(angle):
 
 
 class Pathfinder:
-    def __init__(self):
+    def __init__(self, broadphase=CollisionMap, processes=0):
+        """
+        :param broadphase: Builds the map of ship pairs that may collide from a game map, CollisionMap or SweepAndPrune
+        :param int processes: Size of the process pool large groups of colliding ships are resolved in, 0 for none
+        """
         self.turn = 0
+        self.broadphase = broadphase
+        self.pool = None
+        # The map pickled for the process pool this turn, and the thrust_state() of our ships when it was
+        self.pool_state = None
+        self.pool_thrusts = {}
+        # Pooled groups given up on that were already running, the pool isn't used again until they finish
+        self.abandoned = []
+        if processes:
+            self.pool = concurrent.futures.ProcessPoolExecutor(processes, initializer=exit_with_parent,
+                                                               initargs=(os.getpid(),))
         self.PLANET_NAVIGATION_FUDGE = 0.5      # This is dodgy
-        pass
 
-    def navigate(self, ship, target, game_map):
-        self.PLANET_NAVIGATION_FUDGE = ship.radius
+        # Built from the first map with a static world, see planet_graph()
+        self.graph = None
+        self.flow_fields = None
+        # Ship id -> (target key, waypoints left) of the routes being followed
+        self.routes = {}
+        # Ships that asked for a way to each target this turn, and the flow fields built this turn
+        self.target_requests = collections.Counter()
+        self.flow_fields_built = 0
+        # Goals of the targets that were due a flow field this turn but went over FLOW_FIELDS_PER_TURN
+        self.deferred_fields = {}
+        self._turn_diff = None
+        # Built with the collision map each turn, used by rotate_for_solution
+        self.thrust_evaluator = None
 
+    def navigate(self, ship, target, game_map):
         closest_planet, distance = self.detect_first_planet_in_path(game_map, ship, target)
+        self.navigate_past_planet(ship, target, closest_planet, distance, game_map)
+
+    def navigate_all(self, ships, targets, game_map):
+        """
+        Navigate each ship to its target, finding the planets in the way of every ship in one go.
+
+        :param list ships: The ships to move
+        :param list targets: The target of each ship
+        :param game_map: The map
+        :return: nothing
+        """
+        blocking = self.detect_first_planets_in_paths(game_map, ships, targets)
+        for ship, target, (closest_planet, distance) in zip(ships, targets, blocking):
+            self.navigate_past_planet(ship, target, closest_planet, distance, game_map)
+
+    def navigate_past_planet(self, ship, target, closest_planet, distance, game_map=None):
+        self.PLANET_NAVIGATION_FUDGE = ship.radius
         distance_to_target = self.calculate_safe_distance_from_entity(ship, target)
 
         if distance_to_target < distance:
@@ -36,20 +93,195 @@ class Pathfinder:
                 return self.navigate_to_point(ship, target)
         else:
             ship.initial_target = target
+            waypoint = None
+            if game_map is not None:
+                waypoint = self.flow_heading(ship, target, game_map) or self.next_waypoint(ship, target, game_map)
+            if waypoint is not None:
+                return self.navigate_to_point(ship, waypoint)
             self.navigate_around_planet(ship, target, closest_planet, distance)
             #self.navigate(ship, self.navigate_around_planet(ship, target, closest_planet, distance), game_map)
 
+    def planet_graph(self, game_map):
+        """
+        :return: The visibility graph of the game, None if the map has no static world to build it from
+        :rtype: PlanetGraph
+        """
+        if game_map.static_world is None:
+            return None
+        if self.graph is None or self.graph.static_world is not game_map.static_world:
+            self.graph = PlanetGraph(game_map.static_world)
+            self.flow_fields = FlowFields(game_map.static_world)
+            self.routes = {}
+        return self.graph
+
+    def start_navigation_turn(self, game_map):
+        """
+        Forget the routes of ships that died, the flow fields of planets that were destroyed and last turn's
+        request counts. Only does anything the first time it's called with a new frame.
+
+        :return: nothing
+        """
+        if game_map.diff is self._turn_diff:
+            return
+        self._turn_diff = game_map.diff
+        for ship_id in game_map.diff.destroyed:
+            self.routes.pop(ship_id, None)
+        if self.flow_fields is not None:
+            self.flow_fields.invalidate_planets(game_map.diff.destroyed_planets)
+        self.target_requests.clear()
+        self.flow_fields_built = 0
+        self.deferred_fields = {}
+
+    @staticmethod
+    def target_key(target):
+        if isinstance(target, hlt.entity.Planet):
+            return ('planet', target.id)
+        elif isinstance(target, hlt.entity.Ship):
+            return ('ship', target.id)
+        return ('point', target.x, target.y)
+
+    def flow_heading(self, ship, target, game_map):
+        """
+        The next point along a flow field to the target. Only planets and docked ships, which don't move, get a
+        field, and only once FLOW_FIELD_MIN_SHIPS of our ships have headed for them in the same turn.
+
+        :return: The point to head for, None if the target has no field (or the ship is in reach of it)
+        :rtype: hlt.entity.Position
+        """
+        if self.planet_graph(game_map) is None or ship.radius > hlt.constants.SHIP_RADIUS:
+            return None
+        if isinstance(target, hlt.entity.Ship) and target.docking_status == target.DockingStatus.UNDOCKED:
+            return None
+        if not isinstance(target, (hlt.entity.Planet, hlt.entity.Ship)):
+            return None
+        self.start_navigation_turn(game_map)
+
+        key = self.target_key(target)
+        self.target_requests[key] += 1
+        if key not in self.flow_fields:
+            if self.target_requests[key] < FLOW_FIELD_MIN_SHIPS:
+                return None
+            if self.flow_fields_built >= FLOW_FIELDS_PER_TURN:
+                if key not in self.deferred_fields:
+                    self.deferred_fields[key] = self.flow_fields.goal(target)
+                return None
+            self.flow_fields_built += 1
+            trace.debug('Building a flow field to {}', key)
+
+        heading = self.flow_fields.heading(ship, key, target)
+        if heading is None:
+            return None
+        (aim_x, aim_y), distance = heading
+        angle = math.degrees(math.atan2(aim_y - ship.y, aim_x - ship.x))
+        return self.get_position_for_x_y_angle_magnitude(ship.x, ship.y, min(distance, hlt.constants.MAX_SPEED), angle)
+
+    def deferred_flow_fields(self):
+        """
+        The flow fields this turn had no time for. They can be built while the bot waits for the next frame,
+        see precompute.IdleWorker, and handed back to add_flow_fields().
+
+        :return: A function building the fields and its argument, None if there are none
+        :rtype: (function, dict)
+        """
+        if not self.deferred_fields:
+            return None
+        return self.flow_fields.build_all, dict(self.deferred_fields)
+
+    def add_flow_fields(self, fields, game_map):
+        """
+        Cache flow fields built outside the turn. Call once the next frame has been parsed, before any ship
+        navigates, so the fields to planets destroyed in the meantime are dropped with the rest.
+
+        :param dict fields: Flow fields by target key
+        :return: nothing
+        """
+        for key, field in fields.items():
+            if key not in self.flow_fields:
+                self.flow_fields.add(key, field)
+        trace.debug('Added {} flow fields built while idle', len(fields))
+        self.start_navigation_turn(game_map)
+
+    def next_waypoint(self, ship, target, game_map):
+        """
+        The point to head for on a route around the planets to the target. The route is kept between turns while
+        the target stays the same and the ship can still see the waypoint it's heading for.
+
+        :return: The waypoint, None if there is no route (or the ship is too big for the graph's clearance)
+        :rtype: hlt.entity.Position
+        """
+        graph = self.planet_graph(game_map)
+        if graph is None or ship.radius > hlt.constants.SHIP_RADIUS:
+            return None
+
+        self.start_navigation_turn(game_map)
+
+        key = self.target_key(target)
+        ignore = [game_map.static_world.planet_rows[target.id]] if isinstance(target, hlt.entity.Planet) else []
+
+        waypoints = None
+        if ship.id in self.routes and self.routes[ship.id][0] == key:
+            waypoints = self.routes[ship.id][1]
+            # Skip ahead to the furthest waypoint in sight, replan if none of them are
+            for i in range(len(waypoints) - 1, -1, -1):
+                if graph.can_see(ship, waypoints[i], ignore):
+                    waypoints = waypoints[i:]
+                    break
+            else:
+                waypoints = None
+            if waypoints and not graph.can_see(waypoints[-1], target, ignore):
+                waypoints = None    # The target moved out of sight of the end of the route
+
+        if not waypoints:
+            waypoints = graph.route(ship, target, ignore)
+            trace.debug('Ship {}: routed to {} through {} waypoints', ship.id, key, waypoints and len(waypoints))
+        if not waypoints:
+            self.routes.pop(ship.id, None)
+            return None
+
+        self.routes[ship.id] = (key, waypoints)
+        return waypoints[0]
+
     def detect_first_planet_in_path(self, game_map, ship, target):
-        closest_distance = math.inf
-        closest_planet = False
-        for planet in game_map.all_planets():
-            if (self.intersect_segment_circle(ship, target, planet, fudge=self.PLANET_NAVIGATION_FUDGE)) or (planet == target):
-                distance = self.calculate_distance_between(ship, planet)
-                if distance < closest_distance:
-                    closest_planet = planet
-                    closest_distance = distance
+        return self.detect_first_planets_in_paths(game_map, [ship], [target])[0]
+
+    @staticmethod
+    def detect_first_planets_in_paths(game_map, ships, targets):
+        """
+        Find the nearest planet in the path of each ship (or the target itself when it is a planet).
 
-        return closest_planet, closest_distance
+        :param game_map: The map
+        :param list ships: The ships
+        :param list targets: The target of each ship
+        :return: The nearest planet and its distance for each ship, (False, inf) when nothing is in the way
+        :rtype: list[(hlt.entity.Planet, float)]
+        """
+        planets = game_map.all_planets()
+        if not planets:
+            return [(False, math.inf)] * len(ships)
+
+        snapshot = game_map.snapshot
+        start_x = np.array([ship.x for ship in ships], dtype=np.float64)
+        start_y = np.array([ship.y for ship in ships], dtype=np.float64)
+        fudge = np.array([ship.radius for ship in ships], dtype=np.float64)
+        target_ids = np.array([target.id if isinstance(target, hlt.entity.Planet) else hlt.snapshot.NO_ID
+                               for target in targets], dtype=np.int32)
+
+        blocked = hlt.collision.intersect_segments_circles(
+            start_x, start_y,
+            [target.x for target in targets], [target.y for target in targets],
+            snapshot.planet_x, snapshot.planet_y, snapshot.planet_radius, fudge)
+        blocked |= snapshot.planet_ids == target_ids[:, np.newaxis]
+
+        distances = np.sqrt((snapshot.planet_x - start_x[:, np.newaxis]) ** 2 +
+                            (snapshot.planet_y - start_y[:, np.newaxis]) ** 2)
+        distances[~blocked] = math.inf
+        nearest = distances.argmin(axis=1)
+
+        result = []
+        for row, column in enumerate(nearest.tolist()):
+            distance = distances[row, column]
+            result.append((planets[column], float(distance)) if distance < math.inf else (False, math.inf))
+        return result
 
     def navigate_around_planet(self, ship, target, closest_planet, distance):
         angle_to_planet = make_angle_positive(self.calculate_angle_between(ship, closest_planet))
@@ -104,7 +336,7 @@ class Pathfinder:
         speed = self.determine_speed(distance_to_point)
 
         ship.thrust(speed, angle_to_point, target)
-        logging.info('Setting ship.id={} to thrust to attack'.format(ship.id))
+        trace.debug('Setting ship.id={} to thrust to attack', ship.id)
 
     def determine_speed(self, distance_to_point):
         if distance_to_point < 0:
@@ -167,86 +399,80 @@ class Pathfinder:
 
     @staticmethod
     def intersect_segment_circle(start, end, circle, *, fudge=0.5):
-        """
-        Test whether a line segment and circle intersect.
-
-        :param Entity start: The start of the line segment. (Needs x, y attributes)
-        :param Entity end: The end of the line segment. (Needs x, y attributes)
-        :param Entity circle: The circle to test against. (Needs x, y, r attributes)
-        :param float fudge: A fudge factor; additional distance to leave between the segment and circle. (Probably set this to the ship radius, 0.5.)
-        :return: True if intersects, False otherwise
-        :rtype: bool
-        """
-        # Derived with SymPy
-        # Parameterize the segment as start + t * (end - start),
-        # and substitute into the equation of a circle
-        # Solve for t
-        dx = end.x - start.x
-        dy = end.y - start.y
-
-        a = dx ** 2 + dy ** 2
-        b = -2 * (start.x ** 2 - start.x * end.x - start.x * circle.x + end.x * circle.x +
-                  start.y ** 2 - start.y * end.y - start.y * circle.y + end.y * circle.y)
-        c = (start.x - circle.x) ** 2 + (start.y - circle.y) ** 2
-
-        if a == 0.0:
-            # Start and end are the same point
-            return start.calculate_distance_between(circle) <= circle.radius + fudge
+        return hlt.collision.intersect_segment_circle(start, end, circle, fudge=fudge)
 
-        # Time along segment when closest to the circle (vertex of the quadratic)
-        t = min(-b / (2 * a), 1.0)
-        if t < 0:
-            return False
+    ### Start Collision Avoidance ###
+    def resolve_collisions(self, game_map, scheduler=None):
+        self.turn += 1
+        # Before the broadphase, which hangs the collision map off every ship
+        self.pickle_pool_state(game_map)
+        collision_map = self.broadphase(game_map)
+        self.thrust_evaluator = ThrustEvaluator(game_map)
 
-        closest_x = start.x + dx * t
-        closest_y = start.y + dy * t
-        closest_distance = Position(closest_x, closest_y).calculate_distance_between(circle)
+        self.previous_collisions = {}
 
-        return closest_distance <= circle.radius + fudge
+        self.resolve_ships(game_map, collision_map, game_map.get_me().all_ships(), scheduler)
 
+    def resolve_ships(self, game_map, collision_map, ships, scheduler=None):
+        """
+        Re-thrust ships until none of them collide. Each loop splits the collisions into groups of ships that
+        only conflict with each other, and the next loop only checks the ships of those groups again. Any other
+        ship had no collision and kept its thrust, so it can only have gained one by being run into by a ship that
+        is checked. Pooled groups aren't checked again either, their process already looped until they were done.
 
-    ### Start Collision Avoidance ###
-    def resolve_collisions(self, game_map):
+        :param ships: The ships to check in the first loop
+        :return: nothing
+        """
         MAX_COLLISION_LOOPS=20
-        self.turn += 1
-        collision_map = CollisionMap(game_map)
-
-        logging.info(collision_map)
-
-        self.previous_collisions = {}
+        me = game_map.get_me()
 
         for i in range(MAX_COLLISION_LOOPS):
-            logging.info('Collision Resolution loop {}'.format(i))
-            events = process_events(game_map, collision_map)
-            unique_collisions = self.remove_event_duplicates(events)
+            trace.debug('Collision Resolution loop {} checking {} ships', i, len(ships))
+            queue = EventQueue(process_events(game_map, collision_map, ships))
 
-            # This will be the last loop
-            if i > MAX_COLLISION_LOOPS - 5:
-                for collision in unique_collisions:
-                    self.check_for_collision_map_errors(collision, collision_map, game_map)
+            if scheduler is not None and scheduler.out_of_time():
+                trace.info('Out of time in collision resolution loop {}', i)
+                self.stop_colliding_ships(queue.drain(), game_map)
+                return
 
-                    collision_2 = [collision[0], collision[2], collision[1], collision[3]]
-                    self.check_for_collision_map_errors(collision_2, collision_map, game_map)
-                    return
+            # This will be the last loop
+            if i > MAX_COLLISION_LOOPS - 5 and queue:
+                collision = queue.pop()
+                self.check_for_collision_map_errors(collision, collision_map, game_map)
+                self.check_for_collision_map_errors(collision.swapped(), collision_map, game_map)
+                return
 
-            if len(unique_collisions) == 0:
-                logging.info('No collisions')
+            if len(queue) == 0:
+                trace.debug('No collisions')
                 break
 
-            for collision in unique_collisions:
-                # self.rotate_ship(collision, collision_map, game_map)
-                ship = game_map.get_player(collision[1][0]).get_ship(collision[1][1])
-
-                if collision[2][0] is None:
-                    entity = game_map.get_planet(collision[2][1])
-                else:
-                    entity = game_map.get_player(collision[2][0]).get_ship(collision[2][1])
+            drained = queue.drain()
+            components = self.conflict_components(drained)
+            pooled = self.submit_components(game_map, components)
+            pooled_components = [component for _, component in pooled]
+            pooled_collisions = {collision for component in pooled_components for collision in component}
+
+            # Earliest first across all of the groups, so if time runs out partway through it's the later
+            # collisions that are left
+            collisions = [collision for collision in drained if collision not in pooled_collisions]
+            pairs = [self.collision_entities(collision, game_map) for collision in collisions]
+            approaches = self.closest_approaches(collisions, pairs)
+
+            for n, (collision, (ship, entity), approach) in enumerate(zip(collisions, pairs, approaches)):
+                if scheduler is not None and scheduler.out_of_time():
+                    trace.info('Out of time in collision resolution loop {} with {} collisions left', i,
+                               len(collisions) - n)
+                    self.abandon_components(pooled)
+                    self.stop_colliding_ships(collisions[n:] + [collision for component in pooled_components
+                                                                for collision in component], game_map)
+                    return
 
+                # self.rotate_ship(collision, collision_map, game_map)
                 try:
-                    self.determine_collision_avoidance(ship, entity, collision, collision_map, game_map)
+                    self.determine_collision_avoidance(ship, entity, collision, collision_map, game_map, approach)
                 except:
                     # There are some rare errors that I need to find....
-                    logging.info('An unknown error occured')
+                    trace.error('An unknown error occured resolving {}', collision)
                     ship.thrust(0, 0, hlt.entity.Position(ship.x, ship.y))
 
                 if isinstance(ship, hlt.entity.Ship) and ship.magnitude > 0:
@@ -260,7 +486,187 @@ class Pathfinder:
                     else:
                         self.previous_collisions[entity.id] = [[entity, ship, collision]]
 
-    def determine_collision_avoidance(self, ship, entity, collision, collision_map, game_map):
+            self.collect_components(pooled, game_map, scheduler)
+
+            ships = [me.get_ship(ship_id) for component in components if component not in pooled_components
+                     for ship_id in self.component_ship_ids(component)]
+
+    @staticmethod
+    def conflict_components(collisions):
+        """
+        Split collisions into groups that share no ship. A collision with a planet only involves its ship.
+
+        :param list collisions: Collision events, earliest first
+        :return: The collisions of each group, earliest first, with the group of the earliest collision first
+        :rtype: list[list]
+        """
+        parent = {}
+
+        def find(id):
+            while parent.setdefault(id, id) != id:
+                parent[id] = parent[parent[id]]
+                id = parent[id]
+            return id
+
+        for collision in collisions:
+            root = find(collision.id1)
+            if collision.id2[0] is not None:
+                other_root = find(collision.id2)
+                if other_root != root:
+                    parent[other_root] = root
+
+        components = {}
+        for collision in collisions:
+            components.setdefault(find(collision.id1), []).append(collision)
+        return list(components.values())
+
+    @staticmethod
+    def component_ship_ids(component):
+        """
+        :param list component: The collisions of a group from conflict_components()
+        :return: The ids of the ships in the group, in the order they first collide
+        :rtype: list[int]
+        """
+        ship_ids = []
+        for collision in component:
+            for id in (collision.id1, collision.id2):
+                if id[0] is not None and id[1] not in ship_ids:
+                    ship_ids.append(id[1])
+        return ship_ids
+
+    def pickle_pool_state(self, game_map):
+        """
+        Pickle the map for the process pool, once a turn. Each loop then only sends the thrusts that changed since,
+        see submit_components(). Skipped when there's no pool or too few ships for a group to be pooled.
+
+        :return: nothing
+        """
+        self.pool_state = None
+        self.pool_thrusts = {}
+        ships = game_map.get_me().all_ships()
+        if self.pool is None or len(ships) < POOL_COMPONENT_SHIPS:
+            return
+        try:
+            self.pool_state = pickle.dumps(game_map, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            trace.error('The map could not be pickled for the process pool, resolving every group here')
+            return
+        self.pool_thrusts = {ship.id: thrust_state(ship) for ship in ships}
+
+    def submit_components(self, game_map, components):
+        """
+        Hand the groups of at least POOL_COMPONENT_SHIPS ships to the process pool, if there is one. Each process
+        gets the map with the thrusts as they are now, so the groups resolved here in the meantime don't affect
+        the pooled ones.
+
+        :return: (future, component) of each group handed over
+        :rtype: list
+        """
+        if self.pool_state is None:
+            return []
+        large = [component for component in components
+                 if len(self.component_ship_ids(component)) >= POOL_COMPONENT_SHIPS]
+        if not large:
+            return []
+        self.abandoned = [future for future in self.abandoned if not future.done()]
+        if self.abandoned:
+            trace.info('{} abandoned groups still running in the process pool, resolving every group here',
+                       len(self.abandoned))
+            return []
+
+        changes = {}
+        for ship in game_map.get_me().all_ships():
+            state = thrust_state(ship)
+            if state != self.pool_thrusts.get(ship.id):
+                changes[ship.id] = state
+        trace.debug('Resolving {} groups of colliding ships in the process pool, {} thrusts changed', len(large),
+                    len(changes))
+        return [(self.pool.submit(resolve_component, self.pool_state, changes, self.component_ship_ids(component),
+                                  self.broadphase), component) for component in large]
+
+    def collect_components(self, pooled, game_map, scheduler=None):
+        """
+        Give the ships of the pooled groups the thrusts they were resolved to. A group that fails, or isn't done
+        before the turn runs out of time, has its colliding ships stopped instead.
+
+        :param pooled: The (future, component) pairs from submit_components()
+        :return: nothing
+        """
+        me = game_map.get_me()
+        for future, component in pooled:
+            try:
+                thrusts = future.result(None if scheduler is None else max(scheduler.remaining(), 0))
+            except concurrent.futures.TimeoutError:
+                trace.info('Out of time waiting for {} pooled collisions', len(component))
+                self.abandon_components([(future, component)])
+                self.stop_colliding_ships(component, game_map)
+                continue
+            except Exception:
+                trace.error('Resolving {} pooled collisions failed', len(component))
+                self.stop_colliding_ships(component, game_map)
+                continue
+
+            for ship_id, (magnitude, angle) in thrusts.items():
+                ship = me.get_ship(ship_id)
+                if (ship.magnitude, ship.angle) == (magnitude, angle):
+                    continue
+                # A ship stopped in the pool was given its own position as a target there
+                target = None if getattr(ship, 'target', None) is not None else hlt.entity.Position(ship.x, ship.y)
+                ship.thrust(magnitude, angle, target)
+
+    def abandon_components(self, pooled):
+        """
+        Give up on pooled groups. Those that haven't started are cancelled, the ones already running can't be
+        stopped and keep their process busy, so they are remembered and submit_components() waits for them.
+
+        :param pooled: The (future, component) pairs from submit_components()
+        :return: nothing
+        """
+        self.abandoned.extend(future for future, _ in pooled if not future.cancel())
+
+    @staticmethod
+    def collision_entities(collision, game_map):
+        ship = game_map.get_player(collision.id1[0]).get_ship(collision.id1[1])
+
+        if collision.id2[0] is None:
+            entity = game_map.get_planet(collision.id2[1])
+        else:
+            entity = game_map.get_player(collision.id2[0]).get_ship(collision.id2[1])
+        return ship, entity
+
+    @staticmethod
+    def closest_approaches(collisions, pairs):
+        """
+        Where each pair of entities gets closest in the turn after they first collide, worked out for all of the
+        collisions at once. The velocities are kept with each result so avoid_collision can tell when one of the
+        ships has been re-thrust since.
+
+        :param collisions: The collision events
+        :param pairs: The (ship, entity) of each collision
+        :return: (time, distance, velocities) for each collision
+        :rtype: list
+        """
+        if not collisions:
+            return []
+
+        velocities = [(ship.vel_x, ship.vel_y, entity.vel_x, entity.vel_y) for ship, entity in pairs]
+        ship_vel_x, ship_vel_y, entity_vel_x, entity_vel_y = zip(*velocities)
+        times, distances = hlt.collision.closest_approaches(
+            [ship.x for ship, _ in pairs], [ship.y for ship, _ in pairs], ship_vel_x, ship_vel_y,
+            [entity.x for _, entity in pairs], [entity.y for _, entity in pairs], entity_vel_x, entity_vel_y,
+            start=[collision.time for collision in collisions])
+        return list(zip(times.tolist(), distances.tolist(), velocities))
+
+    def stop_colliding_ships(self, collisions, game_map):
+        for collision in collisions:
+            for id in (collision.id1, collision.id2):
+                if id[0] is None:
+                    continue
+                ship = game_map.get_player(id[0]).get_ship(id[1])
+                if ship.magnitude > 0:
+                    ship.thrust(0, 0, hlt.entity.Position(ship.x, ship.y))
+
+    def determine_collision_avoidance(self, ship, entity, collision, collision_map, game_map, approach=None):
         if isinstance(ship, hlt.entity.Ship):
             if ship.id in self.previous_collisions:
                 if len(self.previous_collisions[ship.id]) > 1:
@@ -275,13 +681,12 @@ class Pathfinder:
                         if previous_collision[1].id == ship.id:
                             return self.resolve_multi_target_collision(entity, ship, collision, collision_map, game_map, swapped=True)
 
-        return self.avoid_collision(ship, entity, collision)
+        return self.avoid_collision(ship, entity, collision, approach)
 
-    def avoid_collision(self, ship, entity, collision):
-        logging.info('Avoid Collision')
-        logging.info(ship)
-        logging.info(entity)
-        logging.info(collision)
+    def avoid_collision(self, ship, entity, collision, approach=None):
+        trace.debug('Avoid Collision {}: ship {} at ({}, {}) velocity ({}, {}), entity {} at ({}, {}) velocity ({}, {})',
+                    collision, ship.id, ship.x, ship.y, ship.vel_x, ship.vel_y,
+                    entity.id, entity.x, entity.y, entity.vel_x, entity.vel_y)
 
         # We want to modifiy how much the ship moves based on
         #   If the ship is close to the target, deviate less
@@ -303,7 +708,7 @@ class Pathfinder:
         ship_modifier = init_ship_modifier / (init_ship_modifier + init_entity_modifier)
         entity_modifier = init_entity_modifier / (init_ship_modifier + init_entity_modifier)
 
-        logging.info('ship_modifer: {}   entity_modifer: {}'.format(ship_modifier, entity_modifier))
+        trace.debug('ship_modifer: {}   entity_modifer: {}', ship_modifier, entity_modifier)
 
         if ship.magnitude == 0 and entity.magnitude == 0:
             raise(Exception('Both ships are not moving...'))
@@ -313,66 +718,41 @@ class Pathfinder:
 
         # TODO: Check if the ships paths cross (below only works for co-liniar
 
-        # Find where the collision first happened
-        t = collision[3]
-        ship_position = Position(ship.x + ship.vel_x * t, ship.y + ship.vel_y * t)
-        entity_position = Position(entity.x + entity.vel_x * t, entity.y + entity.vel_y * t)
-
-        logging.info('collision happened at ship_position: {}   entity_position: {}'.format(ship_position, entity_position))
-
-        # Work out the closest point they meet
-        ship_velocity_step = Position(ship.vel_x/VELOCITY_STEPS, ship.vel_y/VELOCITY_STEPS)
-        entity_velocity_step = Position(entity.vel_x / VELOCITY_STEPS, entity.vel_y / VELOCITY_STEPS)
-
-        logging.info('velocity step ship: {}   entity: {}'.format(ship_velocity_step, entity_velocity_step))
-
-        min_distance = math.inf
-        velocity_step = None
-        min_ship_position = None
-        min_entity_position = None
-
-        for step in range(VELOCITY_STEPS):
-            current_ship_position = Position(ship_position.x + ship_velocity_step.x * step,
-                                             ship_position.y + ship_velocity_step.y * step)
-            current_entity_position = Position(entity_position.x + entity_velocity_step.x * step,
-                                               entity_position.y + entity_velocity_step.y * step)
+        # Work out the closest point they meet, in the turn from when the collision first happened
+        if approach is None or approach[2] != (ship.vel_x, ship.vel_y, entity.vel_x, entity.vel_y):
+            approach = hlt.collision.closest_approach(ship, entity, start=collision.time)
+        time, min_distance = approach[:2]
 
-            distance = current_ship_position.calculate_distance_between(current_entity_position)
-            if distance < min_distance:
-                min_distance = distance
-                velocity_step = step
-
-                min_ship_position = current_ship_position
-                min_entity_position = current_entity_position
-
-        logging.info('min distance {}'.format(min_distance))
+        trace.debug('closest approach at {}: ship_position: ({}, {})   entity_position: ({}, {})', time,
+                    ship.x + ship.vel_x * time, ship.y + ship.vel_y * time,
+                    entity.x + entity.vel_x * time, entity.y + entity.vel_y * time)
+        trace.debug('min distance {}', min_distance)
 
         # Required distance
         required_distance = ship.radius + entity.radius
         distance_to_deflect = required_distance - min_distance
 
-        logging.info('required_distance {}, distance_to_reflect'.format(required_distance, distance_to_deflect))
+        trace.debug('required_distance {}, distance_to_deflect {}', required_distance, distance_to_deflect)
 
         if ship.docking_status != ship.DockingStatus.UNDOCKED:
-            logging.info('Ship is docked')
+            trace.debug('Ship is docked')
         elif ship.magnitude == 0:
-            logging.info('Entity is not moving atm (it may have just started to dock)')
+            trace.debug('Ship is not moving atm (it may have just started to dock)')
         else:
             new_ship_angle = self.get_deflected_angle(ship, entity, distance_to_deflect * ship_modifier)
             ship.thrust(ship.magnitude, new_ship_angle)
-            #logging.info('new_ship_angle {}, ship.magnitude'.format(ship.magnitude, new_ship_angle))
 
         if isinstance(entity, hlt.entity.Planet):
-            logging.info('Entity is planet')
+            trace.debug('Entity is planet')
         elif entity.docking_status != entity.DockingStatus.UNDOCKED:
-            logging.info('Entity is docked')
+            trace.debug('Entity is docked')
         elif entity.magnitude == 0:
-            logging.info('Entity is not moving atm (it may have just started to dock)')
+            trace.debug('Entity is not moving atm (it may have just started to dock)')
         else:
             new_entity_angle = self.get_deflected_angle(entity, ship, distance_to_deflect * entity_modifier)
             entity.thrust(entity.magnitude, new_entity_angle)
 
-            logging.info('new_entity_angle {}, entity.magnitude'.format(new_entity_angle, entity.magnitude))
+            trace.debug('new_entity_angle {}, entity.magnitude {}', new_entity_angle, entity.magnitude)
 
     def resolve_multi_target_collision(self, ship, entity, collision, collision_map, game_map, swapped=False):
         if ship.magnitude == 0:
@@ -395,7 +775,7 @@ class Pathfinder:
                 fixed_entity_count += 1
 
         if fixed_entity_count < 2:
-            logging.info('Some tried to sneak through {}'.format(self.turn))
+            trace.info('Some tried to sneak through {}', self.turn)
             if swapped:
                 return self.avoid_collision(entity, ship, collision[2])
             else:
@@ -431,32 +811,30 @@ class Pathfinder:
 
         ship.thrust(ship.magnitude, new_angle)
 
-        self.rotate_for_solution(game_map, collision_map, ship, deflection_direction)
+        self.rotate_for_solution(game_map, collision_map, ship)
 
-        logging.info('collision new_entity_angle {}, entity.magnitude'.format(new_angle, ship.magnitude))
+        trace.debug('collision new_entity_angle {}, entity.magnitude {}', new_angle, ship.magnitude)
 
-    def rotate_for_solution(self, game_map, collision_map, ship, rotation):
+    def rotate_for_solution(self, game_map, collision_map, ship):
         collisions = process_event_one_ship(game_map, collision_map, ship)
         if len(collisions) == 0:
             return
 
-        original_angle = ship.angle
-
-        additional_angle = 10
-
-        for _ in range(20):
-            ship.thrust(ship.magnitude, ship.angle + (additional_angle * rotation))
-
-            collisions = process_event_one_ship(game_map, collision_map, ship)
-            if len(collisions) == 0:
+        # Out of every thrust that misses everything, take the one ending nearest the move the ship was given
+        angle = math.radians(ship._stored_angle)
+        thrust = self.thrust_evaluator.best_thrust(ship, ship.x + ship._stored_magnitude * math.cos(angle),
+                                                   ship.y + ship._stored_magnitude * math.sin(angle))
+        if thrust is not None:
+            ship.thrust(*thrust)
+            if len(process_event_one_ship(game_map, collision_map, ship)) == 0:
                 return
         ship.thrust(0, 0)
-        logging.info('Unable to rotate to find solution to collision, thrust set to 0')
+        trace.info('Unable to rotate to find solution to collision, thrust set to 0')
 
     def check_for_collision_map_errors(self, collision, collision_map, game_map):
-        logging.info("Checking for movememnt issues...")
+        trace.debug("Checking for movememnt issues...")
         try:
-            ship = game_map.get_player(collision[1][0]).get_ship(collision[1][1])
+            ship = game_map.get_player(collision.id1[0]).get_ship(collision.id1[1])
         except:
             # Not sure why just seems bad....
             return
@@ -465,17 +843,17 @@ class Pathfinder:
             # This ship don't care about this...
             return
 
-        if collision[3] < 0.1:
-            if collision[2][0] is None:
-                # entity = game_map.get_planet(collision[2][1])
-                self.rotate_for_solution(game_map, collision_map, ship, -1)
-                logging.info('There is no possible solution for this collision (iter 10 + planet), magnitude set to 0')
+        if collision.time < 0.1:
+            if collision.id2[0] is None:
+                # entity = game_map.get_planet(collision.id2[1])
+                self.rotate_for_solution(game_map, collision_map, ship)
+                trace.info('There is no possible solution for this collision (iter 10 + planet), magnitude set to 0')
                 return
             else:
-                entity = game_map.get_player(collision[2][0]).get_ship(collision[2][1])
+                entity = game_map.get_player(collision.id2[0]).get_ship(collision.id2[1])
                 distance = ship.calculate_distance_between(entity)
                 if distance > (ship.radius + entity.radius):
-                    logging.info('Map error found')
+                    trace.info('Map error found')
                     angle_to_target = ship.calculate_angle_between(ship.target)
                     angle_to_entity = ship.calculate_angle_between(entity)
 
@@ -491,17 +869,17 @@ class Pathfinder:
 
                     for thrust in range(7, 0, -1):
                         ship.thrust(ship.magnitude, angle_to_target)
-                        logging.info('Call to process_event_one_ship')
+                        trace.debug('Call to process_event_one_ship')
                         collisions = process_event_one_ship(game_map, collision_map, ship)
                         collision_found = False
                         for collision in collisions:
-                            if collision[1][1] != ship.id or collision[2][1] != ship.id or \
-                                            collision[1][1] != entity.id or collision[2][1] != entity.id:
+                            if collision.id1[1] != ship.id or collision.id2[1] != ship.id or \
+                                            collision.id1[1] != entity.id or collision.id2[1] != entity.id:
                                 collision_found = True
                         if not collision_found:
                             return
-        logging.info('There is no possible solution for this collision (iter 10 + end), magnitude set to 0')
-        self.rotate_for_solution(game_map, collision_map, ship, -1)
+        trace.info('There is no possible solution for this collision (iter 10 + end), magnitude set to 0')
+        self.rotate_for_solution(game_map, collision_map, ship)
 
     def direction_to_deflect(self, entity1, entity2):
         entity1.angle = make_angle_positive(entity1.angle)
@@ -521,16 +899,13 @@ class Pathfinder:
 
         deflection_direction = self.direction_to_deflect(entity1, entity2)
 
-        logging.info('Deflection angle args: deflection_distance: {}, entity1.magnitude: {}'.format(deflection_distance, entity1.magnitude))
+        trace.debug('Deflection angle args: deflection_distance: {}, entity1.magnitude: {}', deflection_distance, entity1.magnitude)
 
         # Solve for isosceles triangle
         # https://math.stackexchange.com/questions/541824/how-do-i-find-the-base-angles-without-a-vertex-angle-in-a-isosceles-triangle
         #print(deflection_distance, entity1.magnitude)
 
-        #try:
         deflection_angle = math.degrees(math.asin((deflection_distance/2) / entity1.magnitude))*2
-        #except:
-        logging.info('Error with deflection_angle: math.asin(({}/2) / {})'.format(deflection_distance, entity1.magnitude))
 
         new_angle = make_angle_positive(entity1.angle + (deflection_angle * deflection_direction))
 
@@ -543,40 +918,62 @@ class Pathfinder:
 
         return new_angle
 
-    def remove_event_duplicates(self, events):
-        unique_events = []
-
-        for event in events:
-            if event[0] != 'Collision':
-                continue
-
-            if event[1][0] is None:
-                key = [event[2], event[1]]
-            elif  event[2][0] is None:
-                key = [event[1], event[2]]
-            elif event[1][0] != event[2][0]:
-                if event[1][0] > event[2][0]:
-                    key = [event[2], event[1]]
-                else:
-                    key = [event[1], event[2]]
-            else:
-                if event[1][1] > event[2][1]:
-                    key = [event[2], event[1]]
-                else:
-                    key = [event[1], event[2]]
-
-            reformatted_event = ['Collision'] + key + [event[3]]
-
-            if reformatted_event not in unique_events:
-                unique_events.append(reformatted_event)
-
-        return unique_events
-
-
-if __name__ == "__main__":
-    import pickle
-
-    pathfinder = pickle.load(open("objects/pathfinder-82.p", "rb"))
-    game_map = pickle.load(open("objects/game_map-82.p", "rb"))
 
-    pathfinder.resolve_collisions(game_map)
\ No newline at end of file
+def exit_with_parent(parent_pid):
+    """
+    Process pool initializer. The engine kills the bot at the end of the game rather than letting it shut the pool
+    down, so each pool process watches for that and exits too.
+
+    :param int parent_pid: The bot's process id
+    :return: nothing
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(POOL_PARENT_CHECK)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def thrust_state(ship):
+    """
+    :param hlt.entity.Ship ship: One of our ships
+    :return: What collision resolution changes about the ship's thrust: magnitude, angle, the move it was
+        given with its target, the distance it ends from the target and, if the target is a point (a stopped
+        ship's own position), where it is
+    :rtype: tuple
+    """
+    target = getattr(ship, 'target', None)
+    point = (target.x, target.y) if isinstance(target, Position) else None
+    return ship.magnitude, ship.angle, getattr(ship, '_stored_magnitude', None), \
+        getattr(ship, '_stored_angle', None), ship.distance_to_target, point
+
+
+def resolve_component(state, changes, ship_ids, broadphase):
+    """
+    Resolve the collisions of one group of our ships in a pool process, see Pathfinder.submit_components().
+
+    :param bytes state: The map pickled at the start of collision resolution
+    :param dict changes: The thrust_state() of the ships whose thrust has changed since, by ship id
+    :param list[int] ship_ids: The ships of the group
+    :param broadphase: The broadphase the Pathfinder uses
+    :return: The (magnitude, angle) each ship of the group ends up with, by ship id
+    :rtype: dict
+    """
+    game_map = pickle.loads(state)
+    me = game_map.get_me()
+    for ship_id, (magnitude, angle, stored_magnitude, stored_angle, distance, point) in changes.items():
+        ship = me.get_ship(ship_id)
+        ship.thrust(magnitude, angle, None if point is None else Position(*point))
+        if stored_magnitude is not None:
+            ship._stored_magnitude = stored_magnitude
+            ship._stored_angle = stored_angle
+        ship.distance_to_target = distance
+
+    pathfinder = Pathfinder(broadphase)
+    pathfinder.thrust_evaluator = ThrustEvaluator(game_map)
+    pathfinder.previous_collisions = {}
+
+    ships = [game_map.get_me().get_ship(ship_id) for ship_id in ship_ids]
+    pathfinder.resolve_ships(game_map, broadphase(game_map), ships)
+    return {ship.id: (ship.magnitude, ship.angle) for ship in ships}
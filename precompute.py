@@ -0,0 +1,60 @@
+import logging
+import threading
+
+
+class IdleWorker:
+    """
+    Runs work that does not depend on the next frame in a background thread, in the window between sending our
+    commands and the engine sending the next frame (the main thread is blocked in readline then, so the GIL is
+    free).
+
+    Tasks must only use data captured before start() is called (tuples, the StaticWorld, the FlowFields raster)
+    and never the live Ship/Planet objects, which are updated in place when the next frame is parsed.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._results = {}
+        self._thread = None
+
+    def submit(self, name, function, *args):
+        """
+        Queue a task for the next idle window.
+
+        :param str name: The key the result is returned under by collect()
+        :param function: The function to run
+        :param args: Arguments for the function
+        :return: nothing
+        """
+        self._tasks.append((name, function, args))
+
+    def start(self):
+        """
+        Run the queued tasks in the background.
+
+        :return: nothing
+        """
+        tasks, self._tasks = self._tasks, []
+        self._thread = threading.Thread(target=self._run, args=(tasks,), daemon=True)
+        self._thread.start()
+
+    def collect(self):
+        """
+        Wait for the idle work to finish.
+
+        :return: The results of the tasks keyed by name, failed tasks are left out
+        :rtype: dict
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        results, self._results = self._results, {}
+        return results
+
+    def _run(self, tasks):
+        for name, function, args in tasks:
+            try:
+                self._results[name] = function(*args)
+            except Exception:
+                logging.exception('Idle task {} failed'.format(name))
+
@@ -0,0 +1,161 @@
+"""
+Record a game as the raw lines exchanged with the engine, and replay it offline.
+
+Every line read from the engine (id, map size, frames) and every line sent back (name, commands) is appended
+to one file as an individually zlib compressed record, so any record can be read without decompressing the
+rest. Replaying feeds the recorded frames back to a fresh bot through an in-memory transport, which rebuilds
+the Info/AI/Pathfinder state turn by turn exactly as it was in the game.
+"""
+import io
+import logging
+import struct
+import zlib
+
+import hlt
+
+
+#: Record kinds
+FRAME = 0       # A line read from the engine
+COMMANDS = 1    # A line sent to the engine
+
+#: Lines the engine sends before the first turn (player id, map size, initial frame)
+PRE_GAME_LINES = 3
+
+COMPRESSION_LEVEL = 6
+
+# Record header: kind, compressed length
+_HEADER = struct.Struct('<BI')
+
+
+class Recorder:
+    """
+    Appends records to a replay file.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+
+    def record(self, kind, line):
+        """
+        :param int kind: FRAME or COMMANDS
+        :param bytes line: The line without its newline
+        :return: nothing
+        """
+        data = zlib.compress(line, COMPRESSION_LEVEL)
+        self._file.write(_HEADER.pack(kind, len(data)))
+        self._file.write(data)
+        # The engine kills bots that time out, so don't leave records sitting in the buffer
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class RecordingTransport:
+    """
+    Wraps a hlt.networking.Transport and records everything that passes through it.
+    """
+
+    def __init__(self, transport, recorder):
+        """
+        :param hlt.networking.Transport transport: The transport to the engine
+        :param Recorder recorder: Where to record the lines
+        """
+        self._transport = transport
+        self._recorder = recorder
+
+    def read_line(self):
+        line = self._transport.read_line()
+        self._recorder.record(FRAME, line)
+        return line
+
+    def send_line(self, commands):
+        self._transport.send_line(commands)
+        self._recorder.record(COMMANDS, ' '.join(commands).encode())
+
+
+class Replay:
+    """
+    Random access to a recorded game. Records are only decompressed when they are asked for.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as replay_file:
+            self._data = replay_file.read()
+
+        self._index = {FRAME: [], COMMANDS: []}
+        offset = 0
+        while offset + _HEADER.size <= len(self._data):
+            kind, length = _HEADER.unpack_from(self._data, offset)
+            offset += _HEADER.size
+            if offset + length > len(self._data):
+                break   # The game was cut off part way through a record
+            self._index[kind].append((offset, length))
+            offset += length
+
+    def _line(self, kind, i):
+        offset, length = self._index[kind][i]
+        return zlib.decompress(self._data[offset:offset + length])
+
+    def num_turns(self):
+        return max(0, len(self._index[FRAME]) - PRE_GAME_LINES)
+
+    def num_commands(self):
+        return max(0, len(self._index[COMMANDS]) - 1)
+
+    def frame(self, turn):
+        """
+        :param int turn: The turn number (0 is the first turn)
+        :return: The engine frame of the turn
+        :rtype: bytes
+        """
+        return self._line(FRAME, PRE_GAME_LINES + turn)
+
+    def commands(self, turn):
+        """
+        :param int turn: The turn number (0 is the first turn)
+        :return: The command line we sent that turn
+        :rtype: bytes
+        """
+        return self._line(COMMANDS, turn + 1)   # The first line sent is the bot name
+
+    def engine_lines(self, last_turn):
+        """
+        :param int last_turn: The last turn to include
+        :return: Everything the engine sent up to and including last_turn, one line each
+        :rtype: bytes
+        """
+        lines = [self._line(FRAME, i) for i in range(PRE_GAME_LINES + last_turn + 1)]
+        return b'\n'.join(lines) + b'\n'
+
+
+def replay(path, make_bot, turn):
+    """
+    Re-run a recorded game up to and including the given turn.
+
+    :param str path: The replay file
+    :param make_bot: Called with a transport, returns a bot with a play_turn() method
+    :param int turn: The turn to stop after
+    :return: The bot as it was at the end of the turn, and the turns where it sent different commands
+    :rtype: (object, list[int])
+    """
+    recording = Replay(path)
+    sent = io.BytesIO()
+    bot = make_bot(hlt.networking.Transport(io.BytesIO(recording.engine_lines(turn)), sent))
+
+    mismatched_turns = []
+    for current_turn in range(turn + 1):
+        start = len(sent.getvalue())
+        bot.play_turn()
+        # The last line the turn wrote, which is empty on a turn without commands. The first turn also sends
+        # the bot name before it
+        commands = sent.getvalue()[start:]
+        if commands.endswith(b'\n'):
+            commands = commands[:-1]
+        commands = commands.rsplit(b'\n', 1)[-1]
+        if current_turn < recording.num_commands() and commands != recording.commands(current_turn):
+            mismatched_turns.append(current_turn)
+
+    if mismatched_turns:
+        logging.info('Replay sent different commands on turns {}'.format(mismatched_turns))
+    return bot, mismatched_turns
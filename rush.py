@@ -1,55 +1,65 @@
 import hlt
 import logging
 import time
+import tracer
+import replay
 
 from pathfinder import Pathfinder
 from info import Info
 from angularai import AI
 
 class HaliteBot:
-    def __init__(self):
+    def __init__(self, transport=None, record_to=None):
         bot_name = "Rush"
         logging.info("Starting bot {}".format(bot_name))
 
-        self.game = hlt.Game(bot_name)
+        if record_to is not None:
+            transport = replay.RecordingTransport(transport or hlt.networking.Transport(), replay.Recorder(record_to))
+        self.game = hlt.Game(bot_name, transport)
 
         self.pathfinder = Pathfinder()
+        # The engine is still waiting for our name, so the route graph doesn't cost the first turn anything
+        self.pathfinder.planet_graph(self.game.map)
         self.info = Info()
         self.ai = AI(self.info, self.pathfinder)
 
         self.game_map = None
 
-    def run(self, debug=False, setup_debug=False):
-        while True:
-            logging.info('---TURN {}---'.format(self.info.turn+1))
+    def run(self):
+        try:
+            while True:
+                self.play_turn()
+        except Exception:
+            logging.exception('Bot crashed')
+            tracer.flush(wait=True)
+            raise
+
+    def play_turn(self):
+        logging.info('---TURN {}---'.format(self.info.turn+1))
 
-            if not debug:
-                self.ai.pre_update_actions()
-                self.game_map = self.game.update_map()
-                if setup_debug:
-                    import pickle
-                    pickle.dump(self, open("objects/game_map-{}.p".format(self.info.turn+1), "wb"))
+        self.ai.pre_update_actions()
+        self.game_map = self.game.update_map()
 
-            self.ai.post_update_actions(self.game_map)
-            self.start_turn_timer()
-            self.info.update_info(self.game_map)
+        self.ai.post_update_actions(self.game_map)
+        self.start_turn_timer()
+        self.info.update_info(self.game_map)
 
-            ship_data = self.info.all_enemy_ships[0]
-            enemy_ship = self.ai.get_ship(ship_data['ship_id'])
-            for my_ship in self.game_map.get_me().all_ships():
-                self.pathfinder.navigate(my_ship, enemy_ship, self.game_map)
+        ship_data = self.info.all_enemy_ships[0]
+        enemy_ship = self.ai.get_ship(ship_data['ship_id'])
+        my_ships = self.game_map.get_me().all_ships()
+        self.pathfinder.navigate_all(my_ships, [enemy_ship] * len(my_ships), self.game_map)
 
-            self.pathfinder.resolve_collisions(self.game_map)
-            self.log_all_commands()
+        self.pathfinder.resolve_collisions(self.game_map)
+        self.log_all_commands()
 
-            self.log_turn_time_info()
+        self.log_turn_time_info()
 
     def log_all_commands(self):
         command_queue = []
         for ship in self.game_map.get_me().all_ships():
             command = ship.get_event()
-            if command and command is not None:
-                command_queue += command
+            if command:
+                command_queue.append(command)
         logging.info(command_queue)
         self.game.send_command_queue(command_queue)
 
@@ -72,27 +82,18 @@ class HaliteBot:
         if self.info.turn > 10:
             if total_turn_time > self.longest_turn:
                 self.longest_turn = total_turn_time
+        tracer.end_turn(total_turn_time)
         logging.info('Total turn time: {}'.format(total_turn_time))
         logging.info('Longest turn time: {}'.format(self.longest_turn))
 
 if __name__ == "__main__":
-    setup_debug = False
-    debug = False
+    setup_debug = False     # Record the game to replay_file
+    debug = False           # Replay replay_file up to turn
+    replay_file = 'Rush.replay'
     turn = 7
 
-    if setup_debug and not debug:
-        import shutil
-        import os
-        try:
-            shutil.rmtree('/Users/skippy/Programming/halite2/objects')
-        except:
-            pass
-        os.mkdir('objects')
-
     if not debug:
-        bot = HaliteBot()
-        bot.run(debug=debug, setup_debug=setup_debug)
+        bot = HaliteBot(record_to=replay_file if setup_debug else None)
+        bot.run()
     else:
-        import pickle
-        game_map = pickle.load(open("objects/game_map-{}.p".format(turn), "rb"))
-        game_map.run(True)
+        bot, mismatched_turns = replay.replay(replay_file, lambda transport: HaliteBot(transport=transport), turn)
@@ -0,0 +1,79 @@
+import logging
+import math
+import time
+
+
+# The engine allows 2 seconds a turn, leave room for parsing the frame and sending the commands
+TURN_BUDGET = 1.6
+# Time kept back for collision resolution when deciding whether to run an AI phase
+RESOLUTION_RESERVE = 0.3
+# Weight of the latest measurement in a phase's running cost estimate
+COST_SMOOTHING = 0.5
+
+
+class TurnScheduler:
+    """
+    Keeps each turn inside a hard time budget. The AI runs its stages as named phases through run(), which
+    skips a phase when its usual cost no longer fits in the time left (keeping RESOLUTION_RESERVE for collision
+    resolution), and the pathfinder checks out_of_time() to cut its own work short.
+
+    Ships only get a command when a phase gives them one, so the command set is valid whenever we stop.
+    """
+
+    def __init__(self, budget=TURN_BUDGET):
+        """
+        :param float budget: Seconds available each turn, math.inf to never skip anything
+        """
+        self.budget = budget
+        self.costs = {}
+        self.skipped = []
+        self.start()
+
+    def start(self):
+        """
+        Start the clock for a new turn.
+
+        :return: nothing
+        """
+        self._start = time.perf_counter()
+        self.skipped = []
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def remaining(self):
+        return self.budget - self.elapsed()
+
+    def out_of_time(self):
+        return self.remaining() <= 0
+
+    def run(self, name, function, *args):
+        """
+        Run a phase if its expected cost fits in the remaining time.
+
+        :param str name: The name of the phase, used to track its cost between turns
+        :param function: The phase
+        :param args: Arguments for the phase
+        :return: True if the phase ran, False if it was skipped
+        :rtype: bool
+        """
+        if self.remaining() < self.costs.get(name, 0) + RESOLUTION_RESERVE:
+            logging.info('Skipping {}, {:.3f}s left'.format(name, self.remaining()))
+            self.skipped.append(name)
+            return False
+
+        start = time.perf_counter()
+        function(*args)
+        cost = time.perf_counter() - start
+
+        previous_cost = self.costs.get(name, cost)
+        self.costs[name] = previous_cost + COST_SMOOTHING * (cost - previous_cost)
+        return True
+
+
+def unlimited():
+    """
+    :return: A scheduler that never runs out of time
+    :rtype: TurnScheduler
+    """
+    return TurnScheduler(budget=math.inf)
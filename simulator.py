@@ -0,0 +1,588 @@
+"""
+Local stand-in for the Halite II engine, for timing and regression testing whole games without the engine binary.
+
+Bots are started as subprocesses and spoken to over stdin/stdout with the same protocol hlt.networking.Game
+expects. Movement, collisions and desertion use the event model from collisionmap.py; docking, production and
+weapon combat follow the engine rules using hlt.constants. It is close to the real engine rather than exact
+(planet explosions and spawn placement are simplified), so use it to compare bots and versions of a bot against
+each other, not to predict ladder results.
+
+    python simulator.py "python3 MyBot.py" "python3 rush.py" --width 240 --height 160 --seed 3
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import math
+import random
+import shlex
+import subprocess
+import time
+
+import hlt
+from collisionmap import collision_time, desertion_time
+
+
+#: Production needed to build a ship
+SHIP_COST = 72
+#: Ships each player starts with
+START_SHIPS = 3
+#: Planet health for each unit of radius
+PLANET_HEALTH_PER_RADIUS = 255
+#: Minimum space between planets, and between planets and spawns, when generating a map
+PLANET_SPACING = 6
+#: Decimal places events are rounded to when grouping simultaneous events
+EVENT_TIME_PRECISION = 6
+#: Size of the cells ship pairs are searched in, big enough for two ships moving at full speed to meet
+PAIR_CELL_SIZE = 2 * hlt.constants.MAX_SPEED + 2 * hlt.constants.SHIP_RADIUS + hlt.constants.WEAPON_RADIUS
+
+UNDOCKED = hlt.entity.Ship.DockingStatus.UNDOCKED.value
+DOCKING = hlt.entity.Ship.DockingStatus.DOCKING.value
+DOCKED = hlt.entity.Ship.DockingStatus.DOCKED.value
+UNDOCKING = hlt.entity.Ship.DockingStatus.UNDOCKING.value
+
+
+class SimShip:
+    def __init__(self, ship_id, owner, x, y):
+        self.id = ship_id
+        self.owner = owner
+        self.x = x
+        self.y = y
+        self.radius = hlt.constants.SHIP_RADIUS
+        self.health = hlt.constants.BASE_SHIP_HEALTH
+        self.vel_x = 0.0
+        self.vel_y = 0.0
+        self.magnitude = 0
+        self.docking_status = UNDOCKED
+        self.planet = None
+        self.progress = 0
+        self.cooldown = 0
+
+
+class SimPlanet:
+    def __init__(self, planet_id, x, y, radius):
+        self.id = planet_id
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.health = int(radius * PLANET_HEALTH_PER_RADIUS)
+        self.docking_spots = max(2, int(radius / 3))
+        self.current_production = 0
+        self.remaining_production = int(radius * 100)
+        self.owner = None
+        self.docked = []
+        self.vel_x = 0.0
+        self.vel_y = 0.0
+        self.magnitude = 0
+
+
+class Simulation:
+    """
+    The state of one game and the rules that advance it a turn at a time.
+
+    :ivar width: Map width
+    :ivar height: Map height
+    :ivar turn: Number of turns played
+    :ivar max_turns: The game ends after this many turns
+    :ivar ships: Living ships by id
+    :ivar planets: Surviving planets by id
+    """
+
+    def __init__(self, num_players, width=240, height=160, seed=0):
+        """
+        :param int num_players: 2 or 4
+        :param int width: Map width
+        :param int height: Map height
+        :param int seed: Map seed, the same seed always generates the same map
+        """
+        self.num_players = num_players
+        self.width = width
+        self.height = height
+        self.turn = 0
+        self.max_turns = 100 + int(math.sqrt(width * height))
+        self.ships = {}
+        self.planets = {}
+        self._next_ship_id = 0
+        self._generate(random.Random(seed))
+
+    def _spawn_points(self):
+        if self.num_players == 2:
+            return [(self.width / 4, self.height / 2), (3 * self.width / 4, self.height / 2)]
+        return [(self.width / 4, self.height / 4), (3 * self.width / 4, self.height / 4),
+                (self.width / 4, 3 * self.height / 4), (3 * self.width / 4, 3 * self.height / 4)]
+
+    def _mirror(self, x, y):
+        """
+        :return: The positions matching (x, y) for every player, so the map is fair
+        :rtype: list[(float, float)]
+        """
+        if self.num_players == 2:
+            return [(x, y), (self.width - x, self.height - y)]
+        return [(x, y), (self.width - x, y), (x, self.height - y), (self.width - x, self.height - y)]
+
+    def _generate(self, rng):
+        spawns = self._spawn_points()
+        for player_id, (x, y) in enumerate(spawns):
+            for i in range(START_SHIPS):
+                self._add_ship(player_id, x, y + 2 * (i - START_SHIPS // 2))
+
+        num_groups = 6 if self.num_players == 2 else 5
+        placed = []
+        for _ in range(num_groups):
+            for _ in range(100):
+                radius = rng.uniform(3, 10)
+                x = rng.uniform(radius + PLANET_SPACING, self.width - radius - PLANET_SPACING)
+                y = rng.uniform(radius + PLANET_SPACING, self.height - radius - PLANET_SPACING)
+                group = self._mirror(x, y)
+                if self._fits(group, radius, placed, spawns):
+                    placed += [(px, py, radius) for px, py in group]
+                    break
+
+        for planet_id, (x, y, radius) in enumerate(placed):
+            self.planets[planet_id] = SimPlanet(planet_id, x, y, radius)
+
+    @staticmethod
+    def _fits(group, radius, placed, spawns):
+        for i, (x, y) in enumerate(group):
+            if any(math.hypot(x - sx, y - sy) < radius + 2 * PLANET_SPACING for sx, sy in spawns):
+                return False
+            if any(math.hypot(x - px, y - py) < radius + pr + PLANET_SPACING for px, py, pr in placed):
+                return False
+            if any(math.hypot(x - ox, y - oy) < 2 * radius + PLANET_SPACING for ox, oy in group[i + 1:]):
+                return False
+        return True
+
+    def _add_ship(self, owner, x, y):
+        ship = SimShip(self._next_ship_id, owner, x, y)
+        self.ships[ship.id] = ship
+        self._next_ship_id += 1
+        return ship
+
+    def alive_players(self):
+        """
+        :return: Ids of the players that still have a ship
+        :rtype: set[int]
+        """
+        return {ship.owner for ship in self.ships.values()}
+
+    def is_over(self):
+        return self.turn >= self.max_turns or len(self.alive_players()) <= 1
+
+    def frame(self):
+        """
+        :return: The game state in the format the engine sends each turn
+        :rtype: str
+        """
+        ships_by_owner = collections.defaultdict(list)
+        for ship in self.ships.values():
+            ships_by_owner[ship.owner].append(ship)
+
+        tokens = [str(self.num_players)]
+        for player_id in range(self.num_players):
+            ships = ships_by_owner[player_id]
+            tokens += [str(player_id), str(len(ships))]
+            for ship in ships:
+                tokens += [str(ship.id), '{:.4f}'.format(ship.x), '{:.4f}'.format(ship.y), str(int(ship.health)),
+                           '0.0', '0.0', str(ship.docking_status),
+                           str(ship.planet if ship.planet is not None else 0),
+                           str(ship.progress), str(ship.cooldown)]
+
+        tokens.append(str(len(self.planets)))
+        for planet in self.planets.values():
+            tokens += [str(planet.id), '{:.4f}'.format(planet.x), '{:.4f}'.format(planet.y), str(int(planet.health)),
+                       '{:.4f}'.format(planet.radius), str(planet.docking_spots),
+                       str(planet.current_production), str(planet.remaining_production),
+                       '1' if planet.owner is not None else '0', str(planet.owner or 0), str(len(planet.docked))]
+            tokens += [str(ship_id) for ship_id in planet.docked]
+        return ' '.join(tokens)
+
+    def apply_commands(self, player_id, line):
+        """
+        Apply one player's commands for the turn. Commands for ships the player does not own, malformed commands,
+        repeated commands and commands that are not allowed (thrusting while docked, docking out of range) are
+        ignored.
+
+        :param int player_id: The player who sent the commands
+        :param bytes line: The command line the bot sent
+        :return: nothing
+        """
+        tokens = line.split()
+        commanded = set()
+        i = 0
+        while i < len(tokens):
+            command = tokens[i]
+            length = 4 if command == b't' else 3 if command == b'd' else 2
+            args = tokens[i + 1:i + length]
+            i += length
+            try:
+                ship = self.ships.get(int(args[0]))
+                values = [int(arg) for arg in args[1:]]
+            except (IndexError, ValueError):
+                continue
+            if ship is None or ship.owner != player_id or ship.id in commanded:
+                continue
+            commanded.add(ship.id)
+
+            if command == b't' and len(args) == 3 and ship.docking_status == UNDOCKED:
+                magnitude = min(values[0], hlt.constants.MAX_SPEED)
+                angle = math.radians(values[1])
+                ship.magnitude = magnitude
+                ship.vel_x = magnitude * math.cos(angle)
+                ship.vel_y = magnitude * math.sin(angle)
+            elif command == b'd' and len(args) == 2 and ship.docking_status == UNDOCKED:
+                self._dock(ship, self.planets.get(values[0]))
+            elif command == b'u' and ship.docking_status == DOCKED:
+                ship.docking_status = UNDOCKING
+                ship.progress = hlt.constants.DOCK_TURNS
+
+    def eliminate(self, player_id):
+        """
+        Take a player out of the game, as the engine does with a bot that crashes or exits. Its ships are removed
+        and the planets they were docked to are freed.
+
+        :param int player_id: The player to take out
+        :return: nothing
+        """
+        for ship in [ship for ship in self.ships.values() if ship.owner == player_id]:
+            self._destroy_ship(ship)
+
+    def _dock(self, ship, planet):
+        if planet is None or len(planet.docked) >= planet.docking_spots:
+            return
+        if planet.owner is not None and planet.owner != ship.owner:
+            return
+        distance = math.hypot(ship.x - planet.x, ship.y - planet.y)
+        if distance > planet.radius + hlt.constants.DOCK_RADIUS + ship.radius:
+            return
+        ship.docking_status = DOCKING
+        ship.planet = planet.id
+        ship.progress = hlt.constants.DOCK_TURNS
+        planet.owner = ship.owner
+        planet.docked.append(ship.id)
+
+    def step(self):
+        """
+        Advance the game a turn, once every player's commands have been applied.
+
+        :return: nothing
+        """
+        self._resolve_events()
+        for ship in self.ships.values():
+            ship.x += ship.vel_x
+            ship.y += ship.vel_y
+            ship.vel_x = ship.vel_y = 0.0
+            ship.magnitude = 0
+            ship.cooldown = max(0, ship.cooldown - 1)
+
+        self._update_docking()
+        self._produce()
+        self.turn += 1
+
+    def _update_docking(self):
+        for ship in list(self.ships.values()):
+            if ship.docking_status not in (DOCKING, UNDOCKING):
+                continue
+            ship.progress -= 1
+            if ship.progress > 0:
+                continue
+            if ship.docking_status == DOCKING:
+                ship.docking_status = DOCKED
+            else:
+                self._leave_planet(ship)
+                ship.docking_status = UNDOCKED
+
+    def _leave_planet(self, ship):
+        planet = self.planets.get(ship.planet)
+        ship.planet = None
+        if planet is None:
+            return
+        planet.docked.remove(ship.id)
+        if not planet.docked:
+            planet.owner = None
+
+    def _produce(self):
+        for planet in list(self.planets.values()):
+            docked = sum(1 for ship_id in planet.docked if self.ships[ship_id].docking_status == DOCKED)
+            planet.current_production += docked * hlt.constants.BASE_PRODUCTIVITY
+            while planet.current_production >= SHIP_COST and planet.owner is not None:
+                planet.current_production -= SHIP_COST
+                x, y = self._spawn_position(planet)
+                self._add_ship(planet.owner, x, y)
+
+    def _spawn_position(self, planet):
+        """
+        :return: A free spot just off the surface of the planet, on the side facing the centre of the map
+        :rtype: (float, float)
+        """
+        towards_centre = math.atan2(self.height / 2 - planet.y, self.width / 2 - planet.x)
+        distance = planet.radius + hlt.constants.SPAWN_RADIUS
+        for offset in range(0, 180, 15):
+            for sign in (1, -1):
+                angle = towards_centre + sign * math.radians(offset)
+                x = planet.x + distance * math.cos(angle)
+                y = planet.y + distance * math.sin(angle)
+                if all(math.hypot(x - ship.x, y - ship.y) > 2 * ship.radius for ship in self.ships.values()):
+                    return x, y
+        return planet.x + distance * math.cos(towards_centre), planet.y + distance * math.sin(towards_centre)
+
+    def _ship_pairs(self):
+        """
+        :return: Every pair of ships close enough to meet this turn (plus some that aren't)
+        :rtype: iterator
+        """
+        cells = collections.defaultdict(list)
+        for ship in self.ships.values():
+            cells[(int(ship.x // PAIR_CELL_SIZE), int(ship.y // PAIR_CELL_SIZE))].append(ship)
+
+        for (cell_x, cell_y), ships in cells.items():
+            yield from itertools.combinations(ships, 2)
+            for neighbour in ((cell_x + 1, cell_y - 1), (cell_x + 1, cell_y), (cell_x + 1, cell_y + 1),
+                              (cell_x, cell_y + 1)):
+                if neighbour in cells:
+                    yield from itertools.product(ships, cells[neighbour])
+
+    def _find_events(self):
+        events = []
+        for ship1, ship2 in self._ship_pairs():
+            distance = math.hypot(ship1.x - ship2.x, ship1.y - ship2.y)
+            reach = ship1.magnitude + ship2.magnitude + ship1.radius + ship2.radius
+            if ship1.owner != ship2.owner and distance <= reach + hlt.constants.WEAPON_RADIUS:
+                attack_radius = ship1.radius + ship2.radius + hlt.constants.WEAPON_RADIUS
+                t = collision_time(attack_radius, ship1, ship2)
+                if t[0] and 0 <= t[1] <= 1:
+                    events.append((t[1], 'Attack', ship1, ship2))
+                elif distance < attack_radius:
+                    events.append((0.0, 'Attack', ship1, ship2))
+            if distance <= reach:
+                t = collision_time(ship1.radius + ship2.radius, ship1, ship2)
+                if t[0] and 0 <= t[1] <= 1:
+                    events.append((t[1], 'Collision', ship1, ship2))
+
+        for ship in self.ships.values():
+            if ship.magnitude == 0:
+                continue
+            for planet in self.planets.values():
+                distance = math.hypot(ship.x - planet.x, ship.y - planet.y)
+                if distance <= ship.magnitude + ship.radius + planet.radius:
+                    t = collision_time(ship.radius + planet.radius, ship, planet)
+                    if t[0] and 0 <= t[1] <= 1:
+                        events.append((t[1], 'Collision', ship, planet))
+
+            final_x = ship.x + ship.vel_x
+            final_y = ship.y + ship.vel_y
+            if not (0 <= final_x < self.width and 0 <= final_y < self.height):
+                events.append((desertion_time(ship, self.width, self.height), 'Desertion', ship, ship))
+        return events
+
+    def _resolve_events(self):
+        """
+        Process the turn's events in time order. Events at the same time happen simultaneously: damage is added
+        up before anything is destroyed.
+
+        :return: nothing
+        """
+        events = sorted(self._find_events(), key=lambda event: event[0])
+        for _, group in itertools.groupby(events, key=lambda event: round(event[0], EVENT_TIME_PRECISION)):
+            damage = collections.defaultdict(float)
+            targets = collections.defaultdict(list)
+            for _, kind, entity1, entity2 in group:
+                if not (self._alive(entity1) and self._alive(entity2)):
+                    continue
+                if kind == 'Attack':
+                    targets[entity1].append(entity2)
+                    targets[entity2].append(entity1)
+                elif kind == 'Collision':
+                    damage[entity1] += entity2.health
+                    damage[entity2] += entity1.health
+                else:
+                    damage[entity1] += entity1.health
+
+            for attacker, attacked in targets.items():
+                if attacker.cooldown > 0 or attacker.docking_status != UNDOCKED:
+                    continue
+                attacker.cooldown = hlt.constants.WEAPON_COOLDOWN
+                for target in attacked:
+                    damage[target] += hlt.constants.WEAPON_DAMAGE / len(attacked)
+
+            self._apply_damage(damage)
+
+    def _alive(self, entity):
+        if isinstance(entity, SimPlanet):
+            return entity.id in self.planets
+        return entity.id in self.ships
+
+    def _apply_damage(self, damage):
+        exploded = []
+        for entity, amount in damage.items():
+            if not self._alive(entity):
+                continue
+            entity.health -= amount
+            if entity.health > 0:
+                continue
+            if isinstance(entity, SimPlanet):
+                exploded.append(entity)
+            else:
+                self._destroy_ship(entity)
+
+        for planet in exploded:
+            self._explode(planet)
+
+    def _destroy_ship(self, ship):
+        if ship.planet is not None:
+            self._leave_planet(ship)
+        del self.ships[ship.id]
+
+    def _explode(self, planet):
+        """
+        Destroy a planet with the ships docked to it, damaging ships within EXPLOSION_RADIUS of its surface
+        (less the further away they are).
+
+        :return: nothing
+        """
+        del self.planets[planet.id]
+        for ship_id in list(planet.docked):
+            self._destroy_ship(self.ships[ship_id])
+
+        for ship in list(self.ships.values()):
+            distance = math.hypot(ship.x - planet.x, ship.y - planet.y) - planet.radius
+            if distance < hlt.constants.EXPLOSION_RADIUS:
+                falloff = max(0.0, distance) / hlt.constants.EXPLOSION_RADIUS
+                ship.health -= hlt.constants.MAX_SHIP_HEALTH * (1 - falloff)
+                if ship.health <= 0:
+                    self._destroy_ship(ship)
+
+
+class BotProcess:
+    """
+    A bot running as a subprocess, spoken to over its stdin/stdout.
+    """
+
+    def __init__(self, player_id, command, cwd=None):
+        self.player_id = player_id
+        self.command = command
+        self.name = None
+        self.exited = False
+        self.turn_times = []
+        self._process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         cwd=cwd)
+        self._transport = hlt.networking.Transport(self._process.stdout, self._process.stdin)
+
+    def start(self, simulation):
+        """
+        Send the player id, map size and first frame, then wait for the bot's name.
+
+        :param Simulation simulation: The game
+        :return: Whether the bot is still running
+        :rtype: bool
+        """
+        name = self._exchange([str(self.player_id)], [str(simulation.width), str(simulation.height)],
+                              [simulation.frame()])
+        if name is not None:
+            self.name = name.decode()
+        return name is not None
+
+    def play_turn(self, frame):
+        """
+        :param str frame: This turn's frame
+        :return: The bot's commands, None if it has exited
+        :rtype: bytes
+        """
+        start = time.perf_counter()
+        line = self._exchange([frame])
+        self.turn_times.append(time.perf_counter() - start)
+        return line
+
+    def _exchange(self, *lines):
+        """
+        Send lines to the bot and read its reply. A bot that has exited, or crashed, closes its end of the pipes,
+        which tells it apart from one sending an empty line.
+
+        :param lines: The lines to send, each a list of tokens
+        :return: The reply without its newline, None if the bot has exited
+        :rtype: bytes
+        """
+        if self.exited:
+            return None
+        try:
+            for line in lines:
+                self._transport.send_line(line)
+            reply = self._process.stdout.readline()
+        except (BrokenPipeError, ValueError):
+            reply = b''
+        if not reply.endswith(b'\n'):
+            self.exited = True
+            return None
+        return reply[:-1]
+
+    def stop(self):
+        self._process.kill()
+        self._process.wait()
+
+
+def run_game(commands, width=240, height=160, seed=0, max_turns=None, cwd=None):
+    """
+    Play a game between bots.
+
+    :param list[str] commands: The command line of each bot, 2 or 4 of them
+    :param int width: Map width
+    :param int height: Map height
+    :param int seed: Map seed
+    :param int max_turns: Stop after this many turns instead of the engine's limit
+    :param str cwd: Directory to run the bots in (they write their logs there)
+    :return: The finished game and the bots, which hold their names and turn times
+    :rtype: (Simulation, list[BotProcess])
+    """
+    simulation = Simulation(len(commands), width, height, seed)
+    if max_turns is not None:
+        simulation.max_turns = max_turns
+
+    bots = [BotProcess(player_id, command, cwd) for player_id, command in enumerate(commands)]
+    try:
+        with concurrent.futures.ThreadPoolExecutor(len(bots)) as executor:
+            for bot, running in zip(bots, executor.map(lambda bot: bot.start(simulation), bots)):
+                if not running:
+                    simulation.eliminate(bot.player_id)
+            while not simulation.is_over():
+                # The bots think in parallel, as they do with the real engine
+                playing = [bot for bot in bots if bot.player_id in simulation.alive_players()]
+                frame = simulation.frame()
+                lines = list(executor.map(lambda bot: bot.play_turn(frame), playing))
+                for bot, line in zip(playing, lines):
+                    if line is None:
+                        simulation.eliminate(bot.player_id)
+                    else:
+                        simulation.apply_commands(bot.player_id, line)
+                simulation.step()
+    finally:
+        for bot in bots:
+            bot.stop()
+
+    return simulation, bots
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a game between bots without the Halite engine.')
+    parser.add_argument('bots', nargs='+', help='Command line of each bot (2 or 4)')
+    parser.add_argument('--width', type=int, default=240)
+    parser.add_argument('--height', type=int, default=160)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--turns', type=int, default=None, help='Stop after this many turns')
+    args = parser.parse_args()
+    if len(args.bots) not in (2, 4):
+        parser.error('Halite II is played by 2 or 4 bots')
+
+    start = time.perf_counter()
+    simulation, bots = run_game(args.bots, args.width, args.height, args.seed, args.turns)
+    elapsed = time.perf_counter() - start
+
+    ships = collections.Counter(ship.owner for ship in simulation.ships.values())
+    print('{} turns in {:.1f}s'.format(simulation.turn, elapsed))
+    for bot in sorted(bots, key=lambda bot: -ships[bot.player_id]):
+        turn_times = bot.turn_times or [0.0]
+        print('  {:>2} {:<12} ships {:>4}  turn mean {:.3f}s  max {:.3f}s{}'.format(
+            bot.player_id, bot.name or '?', ships[bot.player_id],
+            sum(turn_times) / len(turn_times), max(turn_times), '  exited' if bot.exited else ''))
+
+
+if __name__ == '__main__':
+    main()
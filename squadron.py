@@ -1,6 +1,6 @@
 import math
 import hlt
-import logging
+import tracer
 
 from pathfinder import Pathfinder
 
@@ -8,6 +8,8 @@ from pathfinder import Pathfinder
 SQUADRON_SPREAD = 0.1
 TARGET_FUDGE = 2
 
+trace = tracer.get_tracer('squadron')
+
 class Squadron:
     def __init__(self, game_map, ships):
         self.game_map = game_map
@@ -121,7 +123,7 @@ class Squadron:
             distance = round(raw_distance)
 
             # There are often small differences but we don't really want to move at 6 every turn because of this.
-            logging.info('Distance to formation position: {}'.format(distance))
+            trace.info('Distance to formation position: {}', distance)
 
             if distance > 7:
                 out_of_position += 1
@@ -132,7 +134,7 @@ class Squadron:
             ship.thrust(thrust, angle, target_position)
 
         if out_of_position / len(self.ships) > 0.5 and self.calculate_distance_between(self.target):
-            logging.info('Out of Position')
+            trace.info('Out of Position')
             new_magintude = self.magnitude - 1
             if new_magintude >= 0:
                 self.thrust(self.magnitude-1, self.angle, self.target, self.focus, self.heading)
@@ -146,7 +148,7 @@ class Squadron:
             distance = round(raw_distance)
 
             # There are often small differences but we don't really want to move at 6 every turn because of this.
-            logging.info('Distance to formation position: {}'.format(distance))
+            trace.info('Distance to formation position: {}', distance)
 
             if distance > 7:
                 out_of_position += 1
@@ -158,7 +160,7 @@ class Squadron:
             ship.thrust(thrust, angle, target_position)
 
         if out_of_position / len(self.ships) > 0.5 and self.calculate_distance_between(self.target):
-            logging.info('Out of Position')
+            trace.info('Out of Position')
             new_magintude = self.magnitude - 1
             if new_magintude >= 0:
                 self.thrust(self.magnitude-1, self.angle, self.target, self.focus, self.heading)
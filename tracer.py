@@ -0,0 +1,130 @@
+"""
+Cheap tracing for the hot paths (pathfinding, AI), in place of logging.info calls.
+
+A trace call only appends the message template and its arguments to an in-memory ring buffer; nothing is
+formatted or written until the buffer is flushed. That happens in a background thread after a slow turn (or
+every turn if FLUSH_EVERY_TURN is set), and straight away after an error so the lead up to it is on disk.
+
+Arguments are formatted when they are flushed, so pass values (ids, coordinates) rather than ships or
+planets, which are updated in place every turn.
+"""
+import collections
+import logging
+import threading
+import time
+
+
+#: Number of trace records kept in memory
+BUFFER_SIZE = 20000
+#: Turns taking longer than this (seconds) have their trace written out
+SLOW_TURN = 1.0
+#: Write the trace out after every turn, not just slow ones
+FLUSH_EVERY_TURN = False
+
+
+class TraceBuffer:
+    """
+    Ring buffer of unformatted trace records shared by every Tracer.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        self.records = collections.deque(maxlen=size)
+        self.error = False
+        self._writer = None
+
+    def end_turn(self, turn_time):
+        """
+        Write the trace out if the turn was slow or had an error.
+
+        :param float turn_time: How long the turn took in seconds
+        :return: nothing
+        """
+        if self.error:
+            self.flush(wait=True)
+        elif FLUSH_EVERY_TURN or turn_time > SLOW_TURN:
+            self.flush()
+
+    def flush(self, wait=False):
+        """
+        Format and log every buffered record.
+
+        :param bool wait: Write before returning instead of in the background
+        :return: nothing
+        """
+        records = list(self.records)
+        self.records.clear()
+        self.error = False
+
+        if self._writer is not None:
+            self._writer.join()
+        self._writer = threading.Thread(target=_write, args=(records,), daemon=True)
+        self._writer.start()
+        if wait:
+            self._writer.join()
+
+
+class Tracer:
+    """
+    Handle used by one subsystem to add to the trace, with its own level.
+    """
+
+    def __init__(self, name, buffer, level=logging.DEBUG):
+        self.name = name
+        self.level = level
+        self._buffer = buffer
+
+    def debug(self, message, *args):
+        if self.level <= logging.DEBUG:
+            self._buffer.records.append((time.time(), self.name, logging.DEBUG, message, args))
+
+    def info(self, message, *args):
+        if self.level <= logging.INFO:
+            self._buffer.records.append((time.time(), self.name, logging.INFO, message, args))
+
+    def error(self, message, *args):
+        """
+        Record an error; the trace is written out at the end of the turn.
+        """
+        self._buffer.records.append((time.time(), self.name, logging.ERROR, message, args))
+        self._buffer.error = True
+
+
+def _write(records):
+    for created, name, level, message, args in records:
+        try:
+            message = message.format(*args)
+        except Exception:
+            message = '{} {}'.format(message, args)
+        logging.getLogger(name).log(level, '[{:.3f}] {}'.format(created, message))
+
+
+_buffer = TraceBuffer()
+_tracers = {}
+
+
+def get_tracer(name):
+    """
+    :param str name: The subsystem name
+    :return: The subsystem's tracer
+    :rtype: Tracer
+    """
+    if name not in _tracers:
+        _tracers[name] = Tracer(name, _buffer)
+    return _tracers[name]
+
+
+def set_level(name, level):
+    """
+    :param str name: The subsystem name
+    :param int level: Records below this logging level are dropped
+    :return: nothing
+    """
+    get_tracer(name).level = level
+
+
+def end_turn(turn_time):
+    _buffer.end_turn(turn_time)
+
+
+def flush(wait=False):
+    _buffer.flush(wait)